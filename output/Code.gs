@@ -57,6 +57,31 @@ function getOrCreateSheet(ss, name, rows, cols) {
   return sheet;
 }
 
+function columnLetter(index) {
+  // 1 -> A, 27 -> AA
+  let letters = '';
+  for (; index > 0; index = Math.floor((index - 1) / 26)) {
+    letters = String.fromCharCode(65 + (index - 1) % 26) + letters;
+  }
+  return letters;
+}
+
+/**
+ * Intervalli con nome <ENTITA>_<COLONNA> sui mesi di <ENTITA>_Dashboard,
+ * come formule.py (caratteri non alfanumerici tolti: F&B -> FB).
+ * Restituisce il numero di mesi (righe dati) del dashboard.
+ */
+function defineNamedRanges(ss, entity) {
+  const sheet = ss.getSheetByName(`${entity}_Dashboard`);
+  const months = sheet.getLastRow() - 1;
+  const headers = sheet.getRange(1, 1, 1, sheet.getLastColumn()).getValues()[0];
+  headers.forEach((header, i) => {
+    if (header === 'Mese' || header === 'NOTE') return;
+    ss.setNamedRange(`${entity}_${header}`.replace(/\W/g, ''), sheet.getRange(2, i + 1, months, 1));
+  });
+  return months;
+}
+
 function setHeader(sheet, range, text, bgColor) {
   const cell = sheet.getRange(range);
   cell.setValue(text);
@@ -143,73 +168,41 @@ function createKPIDashboard() {
 // ============================================================
 function createTrendsDashboard() {
   const ss = SpreadsheetApp.getActiveSpreadsheet();
-  const sheet = getOrCreateSheet(ss, '📈 Trends', 15, 15);
+  const months = defineNamedRanges(ss, 'CONSOLIDATO');
+  const sheet = getOrCreateSheet(ss, '📈 Trends', 15, months + 3);
 
   sheet.getRange('A1').setValue('📈 TREND MENSILI CONSOLIDATO 2025').setFontSize(16).setFontWeight('bold');
 
   // Headers
-  const months = ['', 'Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic', 'TOTALE'];
-  sheet.getRange('A3:N3').setValues([months]).setFontWeight('bold').setBackground('#3366cc').setFontColor('white');
-
-  // Revenue row
-  const ricaviFormulas = ['Ricavi'];
-  for (let i = 2; i <= 13; i++) {
-    ricaviFormulas.push(`=ORTI_Dashboard!H${i}+INTUR_Dashboard!H${i}`);
-  }
-  ricaviFormulas.push('=SUM(B4:M4)');
-  sheet.getRange('A4:N4').setValues([ricaviFormulas]);
-
-  // Costs row
-  const costiFormulas = ['Costi'];
-  for (let i = 2; i <= 13; i++) {
-    costiFormulas.push(`=ORTI_Dashboard!L${i}+INTUR_Dashboard!L${i}`);
-  }
-  costiFormulas.push('=SUM(B5:M5)');
-  sheet.getRange('A5:N5').setValues([costiFormulas]);
-
-  // EBITDA row
-  const ebitdaFormulas = ['EBITDA'];
-  for (let col = 'B'.charCodeAt(0); col <= 'N'.charCodeAt(0); col++) {
-    const c = String.fromCharCode(col);
-    ebitdaFormulas.push(`=${c}4-${c}5`);
-  }
-  sheet.getRange('A6:N6').setValues([ebitdaFormulas]);
-
-  // Margin row
-  const marginFormulas = ['Margine %'];
-  for (let col = 'B'.charCodeAt(0); col <= 'N'.charCodeAt(0); col++) {
-    const c = String.fromCharCode(col);
-    marginFormulas.push(`=IF(${c}4=0,0,${c}6/${c}4)`);
-  }
-  sheet.getRange('A7:N7').setValues([marginFormulas]);
+  const labels = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic'].slice(0, months);
+  const last = columnLetter(months + 1);       // ultimo mese
+  const total = columnLetter(months + 2);      // TOTALE
+  sheet.getRange(3, 1, 1, months + 2).setValues([['', ...labels, 'TOTALE']])
+    .setFontWeight('bold').setBackground('#3366cc').setFontColor('white');
+
+  // Una formula per riga: Sheets distribuisce i mesi (e il totale) sulle colonne
+  sheet.getRange('A4:B7').setValues([
+    ['Ricavi', '={TRANSPOSE(CONSOLIDATO_TOT_RICAVI),SUM(CONSOLIDATO_TOT_RICAVI)}'],
+    ['Costi', '={TRANSPOSE(CONSOLIDATO_TOT_COSTI),SUM(CONSOLIDATO_TOT_COSTI)}'],
+    ['EBITDA', `=ARRAYFORMULA(B4:${total}4-B5:${total}5)`],
+    ['Margine %', `=ARRAYFORMULA(IF(B4:${total}4=0,0,B6:${total}6/B4:${total}4))`]
+  ]);
 
   // YTD Cumulative
-  sheet.getRange('A9:M9').setValues([['YTD CUMULATO', 'Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic']]);
-  sheet.getRange('A9:M9').setFontWeight('bold').setBackground('#f3f3f3');
-
-  const ricaviCum = ['Ricavi Cum.', '=B4'];
-  for (let i = 3; i <= 13; i++) {
-    const prev = String.fromCharCode(64 + i - 1);
-    const curr = String.fromCharCode(64 + i);
-    ricaviCum.push(`=${prev}10+${curr}4`);
-  }
-  sheet.getRange('A10:M10').setValues([ricaviCum]);
-
-  const ebitdaCum = ['EBITDA Cum.', '=B6'];
-  for (let i = 3; i <= 13; i++) {
-    const prev = String.fromCharCode(64 + i - 1);
-    const curr = String.fromCharCode(64 + i);
-    ebitdaCum.push(`=${prev}11+${curr}6`);
-  }
-  sheet.getRange('A11:M11').setValues([ebitdaCum]);
+  sheet.getRange(9, 1, 1, months + 1).setValues([['YTD CUMULATO', ...labels]])
+    .setFontWeight('bold').setBackground('#f3f3f3');
+  sheet.getRange('A10:B11').setValues([
+    ['Ricavi Cum.', `=SCAN(0,B4:${last}4,LAMBDA(a,x,a+x))`],
+    ['EBITDA Cum.', `=SCAN(0,B6:${last}6,LAMBDA(a,x,a+x))`]
+  ]);
 
   // Formatting
-  sheet.getRange('B4:N6').setNumberFormat('€#,##0');
-  sheet.getRange('B7:N7').setNumberFormat('0.0%');
-  sheet.getRange('B10:M11').setNumberFormat('€#,##0');
+  sheet.getRange(`B4:${total}6`).setNumberFormat('€#,##0');
+  sheet.getRange(`B7:${total}7`).setNumberFormat('0.0%');
+  sheet.getRange(`B10:${last}11`).setNumberFormat('€#,##0');
 
   // Conditional formatting for EBITDA
-  const ebitdaRange = sheet.getRange('B6:M6');
+  const ebitdaRange = sheet.getRange(`B6:${last}6`);
   const positiveRule = SpreadsheetApp.newConditionalFormatRule()
     .whenNumberGreaterThan(0)
     .setBackground('#c6efce')
@@ -222,7 +215,7 @@ function createTrendsDashboard() {
     .build();
   sheet.setConditionalFormatRules([positiveRule, negativeRule]);
 
-  sheet.autoResizeColumns(1, 14);
+  sheet.autoResizeColumns(1, months + 2);
 }
 
 // ============================================================
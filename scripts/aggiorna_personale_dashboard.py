@@ -2,11 +2,25 @@
 """
 Aggiorna i dashboard CSV con i dati personale corretti dai Prospetti Contabili.
 Mette i valori estratti dove disponibili, segna come mancanti dove non ci sono dati.
+I mesi con PC si ricavano dall'archivio personale: prima del primo PC di una
+società il mese è 'Non operativo', dopo è 'MANCA PC'.
+I conti si fanno in centesimi interi (importi.py); i CSV restano in euro.
+
+USAGE:
+    python scripts/aggiorna_personale_dashboard.py              # ultimo anno disponibile
+    python scripts/aggiorna_personale_dashboard.py --anno 2025
 """
 
+import argparse
+import sys
 import pandas as pd
 from pathlib import Path
 
+import archivio
+import personale_store
+from importi import centesimi, euro, in_euro
+from mesepermese import SOCIETA
+
 OUTPUT_DIR = Path('output')
 
 MESI_NOME = {
@@ -14,118 +28,137 @@ MESI_NOME = {
     5: 'Maggio', 6: 'Giugno', 7: 'Luglio', 8: 'Agosto',
     9: 'Settembre', 10: 'Ottobre', 11: 'Novembre', 12: 'Dicembre'
 }
+MESI_NUMERO = {v: k for k, v in MESI_NOME.items()}
+
+# Voci dell'archivio personale -> colonne del dashboard
+COLONNE_PERSONALE = {'retribuzioni': 'RETRIBUZIONI', 'oneri': 'ONERI', 'totale': 'PERSONALE'}
+
+COLONNE_DASHBOARD = ['Mese', 'HOTEL', 'ANGELINA', 'CVM', 'F&B', 'SPIAGGIA', 'ALTRI_RICAVI', 'TOT_RICAVI',
+                     'COSTI_FISSI', 'COSTI_VARIABILI', 'RETRIBUZIONI', 'ONERI', 'PERSONALE', 'TOT_COSTI',
+                     'EBITDA', 'NOTE']
+IMPORTI_DASHBOARD = [c for c in COLONNE_DASHBOARD if c not in ('Mese', 'NOTE')]
+
+
+def carica_personale(anno: int) -> pd.DataFrame:
+    """
+    Totali mensili dell'anno in centesimi, indicizzati per (societa, mese):
+    RETRIBUZIONI, ONERI, PERSONALE. Solo i mesi con almeno un PC.
+    """
+    mensile = personale_store.mensile(anni=[anno])
+    return mensile.set_index(['societa', 'mese'])[list(COLONNE_PERSONALE)].rename(columns=COLONNE_PERSONALE)
+
+
+def leggi_dashboard(path: Path) -> pd.DataFrame:
+    """Dashboard CSV con gli importi in centesimi"""
+    df = pd.read_csv(path)
+    importi = [c for c in IMPORTI_DASHBOARD if c in df.columns]
+    df[importi] = centesimi(df[importi])
+    return df
+
+
+def scrivi_dashboard(df: pd.DataFrame, path: Path):
+    """Scrive il dashboard in CSV con gli importi in euro"""
+    in_euro(df, IMPORTI_DASHBOARD).to_csv(path, index=False)
+
+
+def ricalcola_totali(df: pd.DataFrame) -> pd.DataFrame:
+    """TOT_COSTI ed EBITDA dalle colonne del dashboard"""
+    tot_costi = df['COSTI_FISSI'] + df['COSTI_VARIABILI'] + df['PERSONALE']
+    return df.assign(TOT_COSTI=tot_costi, EBITDA=df['TOT_RICAVI'] - tot_costi)
+
+
+def aggiorna_dashboard(df: pd.DataFrame, societa: str, personale: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mette nel dashboard di una società retribuzioni/oneri dai PC (join per
+    mese con carica_personale()), la nota per mese e ricalcola i totali.
+    Importi in centesimi, sia in ingresso sia in uscita.
+    """
+    pc = personale[personale.index.get_level_values('societa') == societa].droplevel('societa')
+    mese = df['Mese'].map(MESI_NUMERO)
+
+    df = df.drop(columns=list(COLONNE_PERSONALE.values()) + ['NOTE'], errors='ignore')
+    df = df.join(pc, on=mese)
+    df[pc.columns] = df[pc.columns].fillna(0).astype('int64')
+
+    # PC se il mese ha dati; prima del primo PC la società non era operativa
+    con_pc = mese.isin(pc.index)
+    primo = pc.index.min() if len(pc) else 13
+    df['NOTE'] = 'MANCA PC'
+    df.loc[mese < primo, 'NOTE'] = 'Non operativo'
+    df.loc[con_pc, 'NOTE'] = 'PC'
+
+    return ricalcola_totali(df)[COLONNE_DASHBOARD]
+
+
+def archivia_dashboard(dashboard: dict, anno: int):
+    """Salva i dashboard {societa: DataFrame} nell'archivio colonnare, partizionato per societa/anno"""
+    if not dashboard:
+        return
+    df = pd.concat([
+        d.assign(societa=soc, anno=anno, mese=d['Mese'].map(MESI_NUMERO))
+        for soc, d in dashboard.items()
+    ], ignore_index=True)
+    archivio.scrivi(df, 'dashboard', ['societa', 'anno'], importi=IMPORTI_DASHBOARD)
 
-# Mesi con dati PC disponibili
-ORTI_MESI_DISPONIBILI = [3, 4, 5, 6, 7, 8]  # Mar-Ago
-INTUR_MESI_DISPONIBILI = [1, 2, 3, 4, 5, 6, 7, 8]  # Gen-Ago
 
 def main():
-    # Carica personale estratto
-    personale = pd.read_csv(OUTPUT_DIR / 'personale_mensile.csv')
-
-    # === ORTI ===
-    print("Aggiornamento ORTI_dashboard...")
-    orti_df = pd.read_csv(OUTPUT_DIR / 'ORTI_dashboard_semplificato.csv')
-
-    # Reset colonne personale
-    orti_df['RETRIBUZIONI'] = 0.0
-    orti_df['ONERI'] = 0.0
-    orti_df['PERSONALE'] = 0.0
-    orti_df['NOTE'] = ''
-
-    for idx, row in orti_df.iterrows():
-        mese_nome = row['Mese']
-        mese_num = [k for k, v in MESI_NOME.items() if v == mese_nome]
-        if not mese_num:
-            continue
-        mese_num = mese_num[0]
-
-        if mese_num in ORTI_MESI_DISPONIBILI:
-            pers_row = personale[personale['mese'] == mese_num]
-            if not pers_row.empty:
-                orti_df.loc[idx, 'RETRIBUZIONI'] = pers_row['ORTI_RETRIB'].values[0]
-                orti_df.loc[idx, 'ONERI'] = pers_row['ORTI_ONERI'].values[0]
-                orti_df.loc[idx, 'PERSONALE'] = pers_row['ORTI_TOTALE'].values[0]
-                orti_df.loc[idx, 'NOTE'] = 'PC'
-        elif mese_num < 3:
-            # Gen-Feb ORTI non operativo
-            orti_df.loc[idx, 'NOTE'] = 'Non operativo'
-        else:
-            # Set-Dic mancanti
-            orti_df.loc[idx, 'NOTE'] = 'MANCA PC'
-
-    # Ricalcola TOT_COSTI e EBITDA
-    orti_df['TOT_COSTI'] = orti_df['COSTI_FISSI'] + orti_df['COSTI_VARIABILI'] + orti_df['PERSONALE']
-    orti_df['EBITDA'] = orti_df['TOT_RICAVI'] - orti_df['TOT_COSTI']
-
-    # Riordina colonne
-    cols = ['Mese', 'HOTEL', 'ANGELINA', 'CVM', 'F&B', 'SPIAGGIA', 'ALTRI_RICAVI', 'TOT_RICAVI',
-            'COSTI_FISSI', 'COSTI_VARIABILI', 'RETRIBUZIONI', 'ONERI', 'PERSONALE', 'TOT_COSTI', 'EBITDA', 'NOTE']
-    orti_df = orti_df[cols]
-    orti_df.to_csv(OUTPUT_DIR / 'ORTI_dashboard_semplificato.csv', index=False)
-    print(f"  Salvato: ORTI_dashboard_semplificato.csv")
-
-    # === INTUR ===
-    print("\nAggiornamento INTUR_dashboard...")
-    intur_df = pd.read_csv(OUTPUT_DIR / 'INTUR_dashboard_semplificato.csv')
-
-    # Reset colonne personale
-    intur_df['RETRIBUZIONI'] = 0.0
-    intur_df['ONERI'] = 0.0
-    intur_df['PERSONALE'] = 0.0
-    intur_df['NOTE'] = ''
-
-    for idx, row in intur_df.iterrows():
-        mese_nome = row['Mese']
-        mese_num = [k for k, v in MESI_NOME.items() if v == mese_nome]
-        if not mese_num:
+    parser = argparse.ArgumentParser(description="Aggiorna i dashboard con il personale dai prospetti PC")
+    parser.add_argument("--anno", type=int, help="Anno dei dashboard (default: ultimo anno con dati)")
+    args = parser.parse_args()
+
+    # Carica personale estratto dall'archivio: l'anno si ricava dalle partizioni,
+    # poi si leggono solo le colonne e la partizione che servono
+    anni = [anno for _, anno in personale_store.partizioni()]
+    if not anni:
+        sys.exit(f"ERROR: personale non trovato in {archivio.ARCHIVIO_DIR / personale_store.TABELLA}: "
+                 "esegui prima estrai_personale.py")
+    anno = args.anno or max(anni)
+    personale = carica_personale(anno)
+    print(f"Anno: {anno}")
+
+    dashboard = {}
+    for societa in SOCIETA:
+        nome = f'{societa}_dashboard_semplificato.csv'
+        if not (OUTPUT_DIR / nome).exists():
+            print(f"\nSKIP {societa}: {nome} non trovato (crea_dashboard.py)")
             continue
-        mese_num = mese_num[0]
-
-        if mese_num in INTUR_MESI_DISPONIBILI:
-            pers_row = personale[personale['mese'] == mese_num]
-            if not pers_row.empty:
-                intur_df.loc[idx, 'RETRIBUZIONI'] = pers_row['INTUR_RETRIB'].values[0]
-                intur_df.loc[idx, 'ONERI'] = pers_row['INTUR_ONERI'].values[0]
-                intur_df.loc[idx, 'PERSONALE'] = pers_row['INTUR_TOTALE'].values[0]
-                intur_df.loc[idx, 'NOTE'] = 'PC'
-        else:
-            # Set-Dic mancanti
-            intur_df.loc[idx, 'NOTE'] = 'MANCA PC'
-
-    # Ricalcola TOT_COSTI e EBITDA
-    intur_df['TOT_COSTI'] = intur_df['COSTI_FISSI'] + intur_df['COSTI_VARIABILI'] + intur_df['PERSONALE']
-    intur_df['EBITDA'] = intur_df['TOT_RICAVI'] - intur_df['TOT_COSTI']
-
-    # Riordina colonne
-    intur_df = intur_df[cols]
-    intur_df.to_csv(OUTPUT_DIR / 'INTUR_dashboard_semplificato.csv', index=False)
-    print(f"  Salvato: INTUR_dashboard_semplificato.csv")
+        print(f"\nAggiornamento {societa}_dashboard...")
+        df = aggiorna_dashboard(leggi_dashboard(OUTPUT_DIR / nome), societa, personale)
+        scrivi_dashboard(df, OUTPUT_DIR / nome)
+        print(f"  Salvato: {nome}")
+        dashboard[societa] = df
+
+    if not dashboard:
+        print("\nNessun dashboard da aggiornare: esegui prima crea_dashboard.py")
+        return
+
+    archivia_dashboard(dashboard, anno)
+    print(f"  Archiviato: {archivio.ARCHIVIO_DIR / 'dashboard'}")
 
     # === STAMPA RIEPILOGO ===
     print("\n" + "="*80)
     print("RIEPILOGO PERSONALE NEI DASHBOARD")
     print("="*80)
 
-    print("\nORTI:")
-    print(orti_df[['Mese', 'RETRIBUZIONI', 'ONERI', 'PERSONALE', 'NOTE']].to_string(index=False))
-    tot_orti = orti_df[orti_df['NOTE'] == 'PC']['PERSONALE'].sum()
-    print(f"\nTotale Personale ORTI (con dati PC): €{tot_orti:,.2f}")
-
-    print("\n" + "-"*80)
-    print("\nINTUR:")
-    print(intur_df[['Mese', 'RETRIBUZIONI', 'ONERI', 'PERSONALE', 'NOTE']].to_string(index=False))
-    tot_intur = intur_df[intur_df['NOTE'] == 'PC']['PERSONALE'].sum()
-    print(f"\nTotale Personale INTUR (con dati PC): €{tot_intur:,.2f}")
+    totale = 0
+    for i, (societa, df) in enumerate(dashboard.items()):
+        if i:
+            print("\n" + "-"*80)
+        print(f"\n{societa}:")
+        print(in_euro(df, IMPORTI_DASHBOARD)[['Mese', 'RETRIBUZIONI', 'ONERI', 'PERSONALE', 'NOTE']].to_string(index=False))
+        tot = int(df[df['NOTE'] == 'PC']['PERSONALE'].sum())
+        print(f"\nTotale Personale {societa} (con dati PC): €{euro(tot):,.2f}")
+        totale += tot
 
     print("\n" + "="*80)
-    print(f"TOTALE PERSONALE CONSOLIDATO (con dati PC): €{tot_orti + tot_intur:,.2f}")
+    print(f"TOTALE PERSONALE CONSOLIDATO (con dati PC): €{euro(totale):,.2f}")
     print("="*80)
 
     # Elenca mancanti
     print("\n⚠️  FILE PC MANCANTI:")
-    print("   ORTI: Settembre, Ottobre, Novembre, Dicembre")
-    print("   INTUR: Settembre, Ottobre, Novembre, Dicembre")
+    for societa, df in dashboard.items():
+        mancanti = df.loc[df['NOTE'] == 'MANCA PC', 'Mese']
+        print(f"   {societa}: {', '.join(mancanti) if len(mancanti) else 'nessuno'}")
 
 
 if __name__ == '__main__':
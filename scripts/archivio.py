@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Archivio colonnare (Parquet, compressione zstd) delle tabelle intermedie.
+
+Ogni tabella è una cartella partizionata in stile hive sotto output/archivio/,
+un file Parquet per partizione:
+
+    output/archivio/mastrino/societa=ORTI/anno=2025/mese=3/part-0.parquet
+
+Le colonne di partizione stanno nel percorso, non nel file. Chi legge apre
+solo le partizioni che passano i filtri e, di ogni file, solo le colonne
+richieste, con accesso memory-mapped; i tipi sono quelli salvati, niente
+re-inferenza da testo. I CSV in output/ restano come formato di scambio
+(esporta_csv).
+
+Gli importi sono salvati come centesimi interi (int64, vedi importi.py);
+le colonne importo di una tabella sono elencate nei metadati dello schema
+Parquet e esporta_csv le scrive in euro.
+
+USAGE:
+    python scripts/archivio.py info
+    python scripts/archivio.py esporta mastrino output/mastrino.csv --filtro societa=ORTI anno=2025
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from importi import in_euro
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ARCHIVIO_DIR = Path('output') / 'archivio'
+NOME_FILE = 'part-0.parquet'
+CHIAVE_IMPORTI = b'hotelops.importi'
+
+
+def _richiedi_pyarrow():
+    if pa is None:
+        raise ImportError("L'archivio richiede pyarrow: pip install pyarrow")
+
+
+def _valore_chiave(testo: str):
+    return int(testo) if testo.lstrip('-').isdigit() else testo
+
+
+def _path_partizione(tabella: str, chiavi: dict) -> Path:
+    path = ARCHIVIO_DIR / tabella
+    for col, valore in chiavi.items():
+        path = path / f'{col}={valore}'
+    return path / NOME_FILE
+
+
+def partizioni(tabella: str) -> list:
+    """Partizioni presenti come [(chiavi, path)], ordinate per valore delle chiavi"""
+    base = ARCHIVIO_DIR / tabella
+    if not base.exists():
+        raise FileNotFoundError(f"Tabella non trovata in archivio: {base}")
+    trovate = []
+    for path in base.rglob(NOME_FILE):
+        chiavi = {}
+        for segmento in path.parent.relative_to(base).parts:
+            col, valore = segmento.split('=', 1)
+            chiavi[col] = _valore_chiave(valore)
+        trovate.append((chiavi, path))
+    return sorted(trovate, key=lambda cp: [(isinstance(v, str), v) for v in cp[0].values()])
+
+
+def scrivi(df: pd.DataFrame, tabella: str, colonne_partizione: list, importi: list = None) -> list:
+    """
+    Scrive df nella tabella, un file per combinazione delle colonne di partizione.
+    Vengono riscritte solo le partizioni presenti in df e con contenuto cambiato;
+    le altre restano come sono. `importi` sono le colonne in centesimi, annotate
+    nello schema. Restituisce i path riscritti.
+    """
+    _richiedi_pyarrow()
+    scritte = []
+    for valori, part in df.groupby(colonne_partizione, sort=False):
+        chiavi = dict(zip(colonne_partizione, valori))
+        path = _path_partizione(tabella, chiavi)
+        part = part.drop(columns=colonne_partizione)
+        # Nel file va solo il dizionario delle categorie usate dalla partizione
+        categorie = part.select_dtypes('category').columns
+        part = part.assign(**{c: part[c].cat.remove_unused_categories() for c in categorie})
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        if importi:
+            metadati = {**(table.schema.metadata or {}), CHIAVE_IMPORTI: json.dumps(list(importi)).encode()}
+            table = table.replace_schema_metadata(metadati)
+        if path.exists() and pq.read_table(path).equals(table, check_metadata=True):
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        pq.write_table(table, tmp, compression='zstd')
+        tmp.replace(path)
+        scritte.append(path)
+    return scritte
+
+
+def _ammessi(valore) -> list:
+    return list(valore) if isinstance(valore, (list, tuple, set)) else [valore]
+
+
+def leggi(tabella: str, colonne: list = None, filtri: dict = None) -> pd.DataFrame:
+    """
+    Legge la tabella. `colonne` limita le colonne lette; `filtri` è un dict
+    {colonna: valore | lista valori}: sulle colonne di partizione esclude i
+    file senza aprirli, sulle altre colonne filtra le righe lette.
+    """
+    _richiedi_pyarrow()
+    filtri = filtri or {}
+    frames = []
+    for chiavi, path in partizioni(tabella):
+        if any(c in chiavi and chiavi[c] not in _ammessi(v) for c, v in filtri.items()):
+            continue
+        da_file = None
+        if colonne is not None:
+            da_file = [c for c in dict.fromkeys(list(colonne) + list(filtri)) if c not in chiavi]
+        df = pq.ParquetFile(path, memory_map=True).read(columns=da_file).to_pandas()
+        for col, valore in chiavi.items():
+            df[col] = valore
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(columns=colonne)
+    df = pd.concat(frames, ignore_index=True)
+    # Partizioni con categorie diverse si concatenano come object: si ricompone la categoria
+    for col in frames[0].select_dtypes('category').columns:
+        if df[col].dtype != 'category':
+            df[col] = df[col].astype('category')
+
+    for col, valore in filtri.items():
+        df = df[df[col].isin(_ammessi(valore))]
+    if colonne is not None:
+        df = df[colonne]
+    return df.reset_index(drop=True)
+
+
+def colonne_importi(tabella: str) -> list:
+    """Colonne in centesimi della tabella, dai metadati dello schema"""
+    parti = partizioni(tabella)
+    if not parti:
+        return []
+    metadati = pq.read_schema(parti[0][1]).metadata or {}
+    return json.loads(metadati.get(CHIAVE_IMPORTI, b'[]'))
+
+
+def esporta_csv(tabella: str, output_path: Path, colonne: list = None, filtri: dict = None) -> Path:
+    """Esporta (parte di) una tabella in CSV, per i consumatori che leggono testo (importi in euro)"""
+    df = leggi(tabella, colonne, filtri)
+    in_euro(df, colonne_importi(tabella)).to_csv(output_path, index=False)
+    return output_path
+
+
+def tabelle() -> list:
+    if not ARCHIVIO_DIR.exists():
+        return []
+    return sorted(p.name for p in ARCHIVIO_DIR.iterdir() if p.is_dir())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivio colonnare HotelOPS")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    sub.add_parser('info', help="Elenca tabelle, righe e partizioni")
+
+    p = sub.add_parser('esporta', help="Esporta una tabella in CSV")
+    p.add_argument('tabella')
+    p.add_argument('output', type=Path)
+    p.add_argument('--colonne', nargs='+')
+    p.add_argument('--filtro', nargs='+', default=[], metavar='COLONNA=VALORE')
+
+    args = parser.parse_args()
+
+    if args.comando == 'info':
+        _richiedi_pyarrow()
+        for nome in tabelle():
+            parti = partizioni(nome)
+            if not parti:
+                continue
+            righe = sum(pq.ParquetFile(path).metadata.num_rows for _, path in parti)
+            chiavi = '/'.join(parti[0][0])
+            print(f"{nome}: {righe} righe, {len(parti)} partizioni ({chiavi})")
+            print(f"  colonne: {', '.join(pq.read_schema(parti[0][1]).names)}")
+            importi = colonne_importi(nome)
+            if importi:
+                print(f"  importi in centesimi: {', '.join(importi)}")
+    elif args.comando == 'esporta':
+        filtri = {}
+        for f in args.filtro:
+            col, valore = f.split('=', 1)
+            filtri[col] = _valore_chiave(valore)
+        path = esporta_csv(args.tabella, args.output, args.colonne, filtri)
+        print(f"Esportato: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Benchmark delle parti critiche della pipeline su dati sintetici.
+
+USAGE:
+    python scripts/benchmark.py classificazione [--righe 50000]
+    python scripts/benchmark.py lettura [--righe 5000] [--colonne-extra 60]
+    python scripts/benchmark.py mastrino [--conti 400] [--partitari 20]
+    python scripts/benchmark.py foglie [--codici 5000]
+    python scripts/benchmark.py regole [--righe 500000] [--conti 3000]
+    python scripts/benchmark.py ledger [--righe 200000] [--conti 400]
+    python scripts/benchmark.py master [--file "data/ORTI_Master Indices 2025.xlsx"]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from openpyxl import Workbook, load_workbook
+
+import classificazione as cl
+import crea_dashboard as cd
+import crea_mastrino_intur as cm
+import estrai_personale as ep
+from importi import centesimi, euro
+import master_indices as mi
+import mesepermese
+from piano_conti import PianoConti
+
+
+def _foglio_dati_sintetico(righe: int, seed: int = 0) -> pd.DataFrame:
+    """FoglioDati sintetico con voci reali, voci escluse e voci sconosciute"""
+    rng = np.random.default_rng(seed)
+    voci = ep.VOCI_RETRIBUZIONI + ep.VOCI_ONERI + ep.VOCI_ESCLUSE + [
+        'Oneri previd. Accant. Ferie', 'Debito v/dipendenti', 'Irpef c/ritenute',
+    ]
+    desc = rng.choice([f'{v:<30}' for v in voci], size=righe)
+    dare = rng.integers(0, 500_000, size=righe) / 100
+    avere = np.where(rng.random(righe) < 0.1, rng.integers(0, 10_000, size=righe) / 100, 0.0)
+    return pd.DataFrame({
+        'Anno': 2025,
+        'Mese': 1,
+        'Descrizione': desc,
+        'Dare': dare,
+        'Avere': avere,
+        'Tipo conto': rng.choice(['E', 'P'], size=righe),
+    })
+
+
+def _calcola_costi_iterrows(df_eco: pd.DataFrame) -> tuple:
+    """Implementazione originale riga per riga, tenuta come riferimento"""
+    retribuzioni = 0.0
+    oneri = 0.0
+    dettaglio = {}
+
+    for _, row in df_eco.iterrows():
+        desc = str(row['Descrizione']).strip()
+        dare = float(row['Dare']) if pd.notna(row['Dare']) else 0.0
+        avere = float(row['Avere']) if pd.notna(row['Avere']) else 0.0
+        saldo = dare - avere
+
+        if any(desc.startswith(v) for v in ep.VOCI_ESCLUSE):
+            continue
+
+        for voce in ep.VOCI_RETRIBUZIONI:
+            if desc.startswith(voce) or desc == voce:
+                retribuzioni += saldo
+                dettaglio[desc] = {'categoria': 'RETRIBUZIONI', 'importo': saldo}
+                break
+        else:
+            for voce in ep.VOCI_ONERI:
+                if desc.startswith(voce) or desc == voce:
+                    oneri += saldo
+                    dettaglio[desc] = {'categoria': 'ONERI', 'importo': saldo}
+                    break
+
+    return retribuzioni, oneri, dettaglio
+
+
+def _scrivi_foglio_dati(path: Path, righe: int, colonne_extra: int):
+    """Salva un FoglioDati sintetico 'largo', come gli export paghe più ricchi"""
+    df = _foglio_dati_sintetico(righe)
+    for i in range(colonne_extra):
+        df[f'Campo {i}'] = f'valore {i}'
+    df.to_excel(path, sheet_name='FoglioDati', index=False)
+
+
+def _lettura_completa(path: Path) -> pd.DataFrame:
+    """Percorso originale: foglio intero in memoria, poi filtro con copia"""
+    df = pd.read_excel(path, sheet_name='FoglioDati')
+    return df[df['Tipo conto'] == 'E'].copy()
+
+
+def _lettura_streaming(path: Path) -> pd.DataFrame:
+    df_eco, _, _ = ep.leggi_foglio_dati(path)
+    return df_eco
+
+
+LETTORI = {
+    'completa': _lettura_completa,
+    'streaming': _lettura_streaming,
+}
+
+
+def _memoria_kb(campo: str) -> int:
+    """Legge VmRSS/VmHWM (KB) da /proc/self/status"""
+    with open('/proc/self/status') as f:
+        for riga in f:
+            if riga.startswith(campo + ':'):
+                return int(riga.split()[1])
+    raise KeyError(campo)
+
+
+def _esegui_lettura(lettore: str, path: str):
+    """Corpo del processo di misura: azzera il picco RSS, legge, stampa il risultato in JSON"""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')  # azzera VmHWM (Linux >= 4.0)
+    rss = _memoria_kb('VmRSS')
+    t0 = time.perf_counter()
+    df = LETTORI[lettore](Path(path))
+    tempo = time.perf_counter() - t0
+    picco = _memoria_kb('VmHWM') - rss
+    r, o, _ = ep.calcola_costi(df)
+    print(json.dumps({'tempo': tempo, 'picco': picco * 1024, 'righe': len(df),
+                      'totali': [r, o]}))
+
+
+def _misura_lettura(lettore: str, path: Path, esegui: str = '_esegui_lettura') -> dict:
+    """Tempo e picco di memoria di una lettura, in un processo nuovo perché le misure non si influenzino"""
+    codice = f"import benchmark; benchmark.{esegui}({lettore!r}, {str(path)!r})"
+    out = subprocess.run([sys.executable, '-c', codice], cwd=Path(__file__).parent,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def _scrivi_mesepermese(path: Path, righe: int, conti: int, seed: int = 0):
+    """
+    Mesepermese sintetico con un foglio mese di `righe` righe: ogni conto
+    foglia ripetuto su più righe partitari, come gli export di dettaglio
+    """
+    rng = np.random.default_rng(seed)
+    foglie = [f'{47 + i % 30}.{i // 30 % 90 + 10:02d}.{i % 97 + 1:02d}' for i in range(conti)]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('01_GENNAIO')
+    ws.append(['Tipo conto e sezione', 'Conto', 'Partitari', 'Descrizione', 'Importo'])
+    for c in foglie:
+        ws.append(['Conto Economico', c[:5], '', f'Mastro {c[:5]}', None])
+    conto = rng.integers(0, conti, righe)
+    importo = np.round(rng.uniform(-500, 5000, righe), 2)
+    for i in range(righe):
+        ws.append(['Conto Economico', foglie[conto[i]], f'P{i % 5000:05d}', 'Movimento', float(importo[i])])
+    wb.save(path)
+
+
+def _ledger_completo(path: Path) -> pd.DataFrame:
+    """Percorso precedente: fogli interi in memoria, poi aggregazione"""
+    return cd.carica_ledger(mesepermese.leggi_fogli_mensili(path))
+
+
+def _ledger_streaming(path: Path) -> pd.DataFrame:
+    return cd.leggi_ledger({'bench': path})['bench']
+
+
+LETTORI_LEDGER = {
+    'completa': _ledger_completo,
+    'streaming': _ledger_streaming,
+}
+
+
+def _esegui_ledger(lettore: str, path: str):
+    """Come _esegui_lettura, per il ledger dei mesepermese"""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    rss = _memoria_kb('VmRSS')
+    t0 = time.perf_counter()
+    df = LETTORI_LEDGER[lettore](Path(path))
+    tempo = time.perf_counter() - t0
+    picco = _memoria_kb('VmHWM') - rss
+    print(json.dumps({'tempo': tempo, 'picco': picco * 1024, 'righe': len(df),
+                      'totale': int(df['importo'].sum())}))
+
+
+def _master_dom(path: Path) -> pd.DataFrame:
+    """Workbook intero in memoria con openpyxl, poi la stessa normalizzazione"""
+    wb = load_workbook(path, data_only=True)
+    frames = [pd.DataFrame(list(mi.normalizza_foglio(mi.righe(wb[foglio]), layout, 2025)))
+              for foglio, layout in mi.FOGLI.items()]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _master_streaming(path: Path) -> pd.DataFrame:
+    return mi.leggi_master_indices(path, 'bench', 2025)
+
+
+LETTORI_MASTER = {
+    'completa': _master_dom,
+    'streaming': _master_streaming,
+}
+
+
+def _esegui_master(lettore: str, path: str):
+    """Come _esegui_lettura, per i Master Indices"""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    rss = _memoria_kb('VmRSS')
+    t0 = time.perf_counter()
+    df = LETTORI_MASTER[lettore](Path(path))
+    tempo = time.perf_counter() - t0
+    picco = _memoria_kb('VmHWM') - rss
+    valori = df['valore'] if 'valore' in df else df[7]
+    print(json.dumps({'tempo': tempo, 'picco': picco * 1024, 'righe': len(df),
+                      'totale': round(float(valori.sum()), 2)}))
+
+
+def _fogli_mastrino_sintetici(conti: int, partitari: int, seed: int = 0) -> list:
+    """
+    Fogli mese sintetici con piano dei conti a tre livelli e colonne Dare/Avere
+    in parte vuote, come negli export che producono colonne object miste.
+    """
+    rng = np.random.default_rng(seed)
+    codici = sorted({
+        f'{rng.integers(11, 90):02d}.{rng.integers(1, 20):02d}.{rng.integers(1, 99):02d}'
+        for _ in range(conti)
+    })
+    righe = []
+    for codice in codici:
+        l1, l2, _ = codice.split('.')
+        righe += [l1, f'{l1}.{l2}', codice] + [codice] * partitari
+    n = len(righe)
+
+    fogli = []
+    for mese in range(1, 13):
+        dare, avere = (rng.integers(0, 1_000_000, size=(2, n)) / 100).astype(object)
+        dare[rng.random(n) < 0.3] = None
+        avere[rng.random(n) < 0.3] = ''
+        fogli.append((mese, cm.MESI_NOMI[mese], pd.DataFrame({
+            'Conto': righe,
+            'Partitari': rng.choice(['', 'C', 'F'], size=n),
+            'Descrizione': [f'Descrizione conto {c}' for c in righe],
+            'Dare': dare,
+            'Avere': avere,
+        })))
+    return fogli
+
+
+def _mastrino_originale(fogli: list) -> pd.DataFrame:
+    """Frame come prima dello schema compatto: stringhe object, mese int64, importi object"""
+    frames = [cm.costruisci_foglio(df, mese, cm.mappa_colonne(df.columns)) for mese, _, df in fogli]
+    df = cm.aggiungi_livelli(pd.concat(frames, ignore_index=True))
+    return df.sort_values(['mese', 'Conto'])[cm.COLONNE_MASTRINO]
+
+
+def _aggregazioni_mastrino(df: pd.DataFrame) -> tuple:
+    """Le aggregazioni tipiche dei report: saldo per mese/conto di 2° livello e dare/avere per conto"""
+    per_mese = df.groupby(['mese', 'conto_l2'], observed=True)['saldo'].sum()
+    per_conto = df.groupby('Conto', observed=True)[['dare', 'avere']].sum()
+    return per_mese, per_conto
+
+
+def _piano_sintetico(codici: int, seed: int = 0) -> list:
+    """Codici puntati da 1 a 4 livelli, con livelli intermedi a volte assenti"""
+    rng = np.random.default_rng(seed)
+    risultato = set()
+    while len(risultato) < codici:
+        parti = [f'{rng.integers(11, 90):02d}'] + [f'{x:02d}' for x in rng.integers(1, 30, size=rng.integers(0, 4))]
+        risultato.add('.'.join(parti))
+    return sorted(risultato)
+
+
+def _foglie_scansione(codici: list) -> set:
+    """Regola originale del notebook (is_true_leaf): per ogni codice si scandiscono tutti gli altri"""
+    return {c for c in codici if not any(o.startswith(c + '.') for o in codici)}
+
+
+def _classify_ricavo_bu_catena(conto):
+    """Catena if/startswith originale del notebook, tenuta come riferimento"""
+    if not (conto.startswith('47.') or conto.startswith('53.')):
+        return None
+    if conto.startswith('47.91.01'):
+        return 'HOTEL'
+    if conto.startswith('47.92.01'):
+        return 'ANGELINA'
+    if conto.startswith('47.93.01'):
+        return 'CVM'
+    if (conto.startswith('47.91.07') or conto.startswith('47.92.02') or
+        conto.startswith('47.93.02') or conto.startswith('47.94.07')):
+        return 'F&B'
+    if conto.startswith('47.94.') and not conto.startswith('47.94.07'):
+        return 'SPIAGGIA'
+    return 'ALTRI_RICAVI'
+
+
+def _classify_costo_catena(conto):
+    """Catena originale di classify_costo / is_costo_fisso"""
+    if conto.startswith('47.') or conto.startswith('53.'):
+        return None
+    if conto.startswith('67.') or conto.startswith('61.'):
+        return 'PERSONALE'
+    for prefix in cl.COSTI_FISSI_CODES:
+        if conto.startswith(prefix):
+            return 'COSTI_FISSI'
+    return 'COSTI_VARIABILI'
+
+
+def _classifica_catena(conti: pd.Series) -> pd.DataFrame:
+    return pd.DataFrame({
+        'bu': [_classify_ricavo_bu_catena(c) for c in conti],
+        'categoria': [_classify_costo_catena(c) for c in conti],
+    }, index=conti.index, dtype=object)
+
+
+def _conti_da_classificare(conti: int, seed: int = 0) -> list:
+    """Codici che toccano tutte le regole: prefissi delle tabelle più sotto-conti casuali"""
+    rng = np.random.default_rng(seed)
+    prefissi = list(cl.REGOLE_RICAVI) + list(cl.REGOLE_COSTI) + ['55.', '57.01.', '59.', '65.11.', '47.9']
+    codici = set(p.rstrip('.') for p in prefissi)
+    while len(codici) < conti:
+        base = rng.choice(prefissi).rstrip('.')
+        codici.add(base + ''.join(f'.{x:02d}' for x in rng.integers(1, 40, size=rng.integers(1, 3))))
+    return sorted(codici)
+
+
+def _cronometra(fn, *args, ripetizioni: int = 3):
+    """Miglior tempo su N ripetizioni, con il risultato dell'ultima"""
+    tempi = []
+    for _ in range(ripetizioni):
+        t0 = time.perf_counter()
+        risultato = fn(*args)
+        tempi.append(time.perf_counter() - t0)
+    return min(tempi), risultato
+
+
+def bench_classificazione(righe: int):
+    df = _foglio_dati_sintetico(righe)
+    df_eco = df[df['Tipo conto'] == 'E']
+    print(f"FoglioDati sintetico: {righe} righe ({len(df_eco)} economiche)")
+
+    t_old, (r_old, o_old, d_old) = _cronometra(_calcola_costi_iterrows, df_eco, ripetizioni=1)
+    t_new, (r_new, o_new, d_new) = _cronometra(ep.calcola_costi, df_eco)
+
+    # Il riferimento somma float in euro, calcola_costi centesimi interi
+    assert centesimi(r_old) == r_new, (r_old, r_new)
+    assert centesimi(o_old) == o_new, (o_old, o_new)
+    assert list(d_old) == list(d_new)
+    assert all(d_old[k]['categoria'] == d_new[k]['categoria'] and
+               centesimi(d_old[k]['importo']) == d_new[k]['importo'] for k in d_old)
+
+    print(f"  iterrows:     {t_old * 1000:>10.1f} ms")
+    print(f"  vettoriale:   {t_new * 1000:>10.1f} ms")
+    print(f"  speedup:      {t_old / t_new:>10.1f}x")
+
+
+def bench_lettura(righe: int, colonne_extra: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'PC_sintetico.xlsx'
+        _scrivi_foglio_dati(path, righe, colonne_extra)
+        print(f"FoglioDati sintetico: {righe} righe x {6 + colonne_extra} colonne "
+              f"({path.stat().st_size / 1e6:.1f} MB)")
+
+        old = _misura_lettura('completa', path)
+        new = _misura_lettura('streaming', path)
+
+    assert old['righe'] == new['righe'] and old['totali'] == new['totali']
+
+    print(f"  {'':<22} {'tempo':>10} {'picco memoria':>15}")
+    print(f"  {'read_excel + filtro':<22} {old['tempo']:>9.2f}s {old['picco'] / 1e6:>12.1f} MB")
+    print(f"  {'streaming read-only':<22} {new['tempo']:>9.2f}s {new['picco'] / 1e6:>12.1f} MB")
+
+
+def bench_ledger(righe: int, conti: int):
+    print(f"Mesepermese sintetico: 1 foglio, {conti} conti foglia, righe partitari crescenti")
+    print(f"  {'righe':>9} {'':<22} {'tempo':>10} {'picco memoria':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (righe // 4, righe):
+            path = Path(tmp) / f'mesepermese_{n}.xlsx'
+            _scrivi_mesepermese(path, n, conti)
+            old = _misura_lettura('completa', path, '_esegui_ledger')
+            new = _misura_lettura('streaming', path, '_esegui_ledger')
+            assert old['righe'] == new['righe'] == conti and old['totale'] == new['totale']
+            print(f"  {n:>9} {'read_excel + pivot':<22} {old['tempo']:>9.2f}s {old['picco'] / 1e6:>12.1f} MB")
+            print(f"  {'':>9} {'blocchi aggregati':<22} {new['tempo']:>9.2f}s {new['picco'] / 1e6:>12.1f} MB")
+
+
+def bench_master(path: Path):
+    print(f"{path.name}: {len(mi.FOGLI)} fogli ({path.stat().st_size / 1e6:.1f} MB)")
+    old = _misura_lettura('completa', path.resolve(), '_esegui_master')
+    new = _misura_lettura('streaming', path.resolve(), '_esegui_master')
+    assert old['righe'] == new['righe'] and old['totale'] == new['totale'], (old, new)
+
+    print(f"  {'':<22} {'tempo':>10} {'picco memoria':>15} {'valori':>8}")
+    print(f"  {'openpyxl DOM':<22} {old['tempo']:>9.2f}s {old['picco'] / 1e6:>12.1f} MB {old['righe']:>8}")
+    print(f"  {'streaming read-only':<22} {new['tempo']:>9.2f}s {new['picco'] / 1e6:>12.1f} MB {new['righe']:>8}")
+
+
+def bench_mastrino(conti: int, partitari: int):
+    fogli = _fogli_mastrino_sintetici(conti, partitari)
+    originale = _mastrino_originale(fogli)
+    compatto = cm.compatta_mastrino(originale)
+    print(f"Mastrino sintetico: {len(originale)} righe, {originale['Conto'].nunique()} conti, 12 mesi")
+
+    mem_old = originale.memory_usage(deep=True).sum()
+    mem_new = compatto.memory_usage(deep=True).sum()
+    t_old, (m_old, c_old) = _cronometra(_aggregazioni_mastrino, originale)
+    t_new, (m_new, c_new) = _cronometra(_aggregazioni_mastrino, compatto)
+
+    assert np.allclose(m_old.to_numpy(dtype=float), euro(m_new).to_numpy())
+    assert np.allclose(c_old.to_numpy(dtype=float), euro(c_new).to_numpy())
+    assert list(c_old.index) == list(c_new.index.astype(str))
+
+    print(f"  {'':<22} {'memoria':>12} {'groupby':>12}")
+    print(f"  {'object / int64':<22} {mem_old / 1e6:>9.1f} MB {t_old * 1000:>9.1f} ms")
+    print(f"  {'schema compatto':<22} {mem_new / 1e6:>9.1f} MB {t_new * 1000:>9.1f} ms")
+    print(f"  {'rapporto':<22} {mem_old / mem_new:>11.1f}x {t_old / t_new:>11.1f}x")
+
+
+def bench_foglie(codici: int):
+    piano = _piano_sintetico(codici)
+    print(f"Piano dei conti sintetico: {len(piano)} codici")
+
+    t_old, foglie_old = _cronometra(_foglie_scansione, piano, ripetizioni=1)
+    t_new, foglie_new = _cronometra(lambda c: set(PianoConti(c).foglie()), piano)
+    assert foglie_old == foglie_new
+
+    print(f"  scansione O(n²):  {t_old * 1000:>10.1f} ms")
+    print(f"  PianoConti:       {t_new * 1000:>10.1f} ms")
+    print(f"  speedup:          {t_old / t_new:>10.1f}x")
+
+
+def bench_regole(righe: int, conti: int):
+    codici = _conti_da_classificare(conti)
+    rng = np.random.default_rng(1)
+    ledger = pd.Series(rng.choice(codici, size=righe), dtype=object)
+    print(f"Mastrino sintetico: {righe} righe, {len(codici)} conti distinti")
+
+    # Stesse assegnazioni su ogni codice
+    attese = _classifica_catena(pd.Series(codici))
+    ottenute = cl.classifica(codici)
+    assert attese.equals(ottenute), attese.compare(ottenute)
+
+    t_old, old = _cronometra(_classifica_catena, ledger, ripetizioni=1)
+    # Tabelle ricompilate a ogni giro: memo vuota, come dopo una modifica alle regole
+    def riclassifica(s):
+        cl.BU_RICAVI = cl.Classificatore(cl.REGOLE_RICAVI)
+        cl.CATEGORIA_COSTI = cl.Classificatore(cl.REGOLE_COSTI, default=cl.DEFAULT_COSTI)
+        return cl.classifica(s)
+    t_new, new = _cronometra(riclassifica, ledger)
+    assert old.equals(new)
+
+    print(f"  catena startswith per riga: {t_old * 1000:>10.1f} ms")
+    print(f"  regole compilate:           {t_new * 1000:>10.1f} ms")
+    print(f"  speedup:                    {t_old / t_new:>10.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline HotelOPS")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('classificazione', help="Classificazione voci di estrai_personale")
+    p.add_argument('--righe', type=int, default=50_000)
+
+    p = sub.add_parser('lettura', help="Lettura di FoglioDati: pandas completo vs streaming")
+    p.add_argument('--righe', type=int, default=5_000)
+    p.add_argument('--colonne-extra', type=int, default=60)
+
+    p = sub.add_parser('mastrino', help="Mastrino: frame object/int64 vs schema compatto")
+    p.add_argument('--conti', type=int, default=400)
+    p.add_argument('--partitari', type=int, default=20)
+
+    p = sub.add_parser('foglie', help="Conti foglia: scansione a coppie vs PianoConti")
+    p.add_argument('--codici', type=int, default=5_000)
+
+    p = sub.add_parser('regole', help="Classificazione BU/costi: catene startswith vs regole compilate")
+    p.add_argument('--righe', type=int, default=500_000)
+    p.add_argument('--conti', type=int, default=3_000)
+
+    p = sub.add_parser('ledger', help="Ledger mesepermese: fogli interi vs blocchi aggregati")
+    p.add_argument('--righe', type=int, default=200_000)
+    p.add_argument('--conti', type=int, default=400)
+
+    p = sub.add_parser('master', help="Master Indices: openpyxl DOM vs streaming read-only")
+    p.add_argument('--file', type=Path, default=mi.path_master_indices('ORTI', 2025))
+
+    args = parser.parse_args()
+
+    if args.comando == 'classificazione':
+        bench_classificazione(args.righe)
+    elif args.comando == 'lettura':
+        bench_lettura(args.righe, args.colonne_extra)
+    elif args.comando == 'mastrino':
+        bench_mastrino(args.conti, args.partitari)
+    elif args.comando == 'foglie':
+        bench_foglie(args.codici)
+    elif args.comando == 'regole':
+        bench_regole(args.righe, args.conti)
+    elif args.comando == 'ledger':
+        bench_ledger(args.righe, args.conti)
+    elif args.comando == 'master':
+        bench_master(args.file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Utility per le cache persistenti della pipeline.
+
+Le cache sono indicizzate dal contenuto dei file sorgente (sha256), non dalla
+data di modifica: un file ricopiato identico resta in cache, un file
+modificato con lo stesso nome viene riletto.
+
+I risultati piccoli stanno nel manifest JSON; le tabelle (DataFrame) in file
+Parquet accanto al manifest, un file per hash (salva_frame / carica_frame).
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+CACHE_DIR = Path('output') / 'cache'
+
+
+def hash_file(path: Path) -> str:
+    """sha256 del contenuto di un file, letto a blocchi"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for blocco in iter(lambda: f.read(1 << 20), b''):
+            h.update(blocco)
+    return h.hexdigest()
+
+
+def hash_valore(valore) -> str:
+    """sha256 di un valore serializzabile in JSON (liste voci, regole, versioni)"""
+    testo = json.dumps(valore, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(testo.encode('utf-8')).hexdigest()
+
+
+def carica_manifest(nome: str, versione: str) -> dict:
+    """
+    Carica il manifest {hash_file: risultato}. Se la versione salvata è
+    diversa (logica o regole cambiate) il manifest viene scartato.
+    """
+    path = CACHE_DIR / f'{nome}.json'
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('versione') != versione:
+        return {}
+    return manifest.get('file', {})
+
+
+def salva_manifest(nome: str, versione: str, voci: dict):
+    """Scrive il manifest in modo atomico (file temporaneo + rename)"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = CACHE_DIR / f'{nome}.json'
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'versione': versione, 'file': voci}, f, ensure_ascii=False)
+    tmp.replace(path)
+
+
+def _path_frame(nome: str, chiave: str) -> Path:
+    return CACHE_DIR / nome / f'{chiave}.parquet'
+
+
+def carica_frame(nome: str, chiave: str):
+    """DataFrame salvato con salva_frame, None se non c'è o non è leggibile"""
+    path = _path_frame(nome, chiave)
+    if not path.exists():
+        return None
+    try:
+        return pd.read_parquet(path)
+    except (OSError, ValueError):
+        return None
+
+
+def salva_frame(nome: str, chiave: str, df: pd.DataFrame) -> Path:
+    """Scrive df in Parquet in modo atomico; restituisce il path"""
+    path = _path_frame(nome, chiave)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    df.to_parquet(tmp, index=False, compression='zstd')
+    tmp.replace(path)
+    return path
+
+
+def elimina_frame(nome: str, chiave: str):
+    _path_frame(nome, chiave).unlink(missing_ok=True)
@@ -3,22 +3,10 @@
 Verifica lo stato dei fogli - mostra VALORI CALCOLATI
 """
 
-import gspread
-from google.oauth2.service_account import Credentials
-from pathlib import Path
-
-SPREADSHEET_ID = "1CAT_EN6DOXyT3vEbYmnwRQh1pWrdnrCXHFWR--JtFmQ"
-CREDS_PATH = Path("config/hotelHops.json")
-
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
+from sheets_client import apri
 
 def main():
-    credentials = Credentials.from_service_account_file(str(CREDS_PATH), scopes=SCOPES)
-    gc = gspread.authorize(credentials)
-    spreadsheet = gc.open_by_key(SPREADSHEET_ID)
+    spreadsheet = apri()
 
     # Check Riepilogo - valori calcolati
     print("="*70)
@@ -0,0 +1,120 @@
+"""
+Classificazione dei conti per il dashboard semplificato: BU dei ricavi e
+categoria dei costi (FISSI / VARIABILI / PERSONALE).
+
+Le regole sono tabelle dichiarative {prefisso: classe}; vince il prefisso
+più lungo che corrisponde all'inizio del codice (es. '47.94.07' F&B prima di
+'47.94.' SPIAGGIA prima di '47.' ALTRI_RICAVI). Ogni tabella è compilata in
+un dizionario per lunghezza di prefisso, il risultato è memorizzato per
+codice e le colonne si classificano per codici distinti (factorize), quindi
+riclassificare un mastrino intero costa quanto i suoi conti distinti.
+
+Esempio:
+    from classificazione import classifica
+    classifica(df['Conto'])      # DataFrame con colonne bu, categoria
+"""
+
+import numpy as np
+import pandas as pd
+
+# COSTI FISSI - lista esatta
+COSTI_FISSI_CODES = [
+    '65.11.01',       # Affitto azienda (ORTI->INTUR)
+    '65.01.05',       # Canoni (tutti i sottocodi)
+    '65.03.05',       # Leasing
+    '65.05.',         # Noleggi
+    '65.90.',         # Software/licenze
+    '57.11.',         # Manutenzioni
+    '57.09.',         # Utenze (telefono, reti, energia)
+    '57.01.31',       # Energia elettrica
+    '57.01.33',       # Gas
+    '57.01.35',       # Acqua
+    '63.',            # Ammortamenti
+    '71.',            # Oneri diversi gestione
+]
+
+# RICAVI per BU (47.* e 53.*; gli altri conti non sono ricavi)
+REGOLE_RICAVI = {
+    '47.': 'ALTRI_RICAVI',
+    '53.': 'ALTRI_RICAVI',
+    '47.91.01': 'HOTEL',
+    '47.92.01': 'ANGELINA',
+    '47.93.01': 'CVM',
+    '47.91.07': 'F&B',        # ristorazione
+    '47.92.02': 'F&B',
+    '47.93.02': 'F&B',
+    '47.94.07': 'F&B',
+    '47.94.': 'SPIAGGIA',     # escluso F&B
+}
+
+# COSTI: ricavi esclusi, personale 67.* + 61.*, fissi da lista, variabili tutto il resto
+REGOLE_COSTI = {
+    '47.': None,
+    '53.': None,
+    '67.': 'PERSONALE',
+    '61.': 'PERSONALE',
+    **{prefisso: 'COSTI_FISSI' for prefisso in COSTI_FISSI_CODES},
+}
+DEFAULT_COSTI = 'COSTI_VARIABILI'
+
+_NESSUNA = object()
+
+
+class Classificatore:
+    """Tabella {prefisso: classe} compilata per il match del prefisso più lungo"""
+
+    def __init__(self, regole: dict, default=None):
+        self.default = default
+        self._per_lunghezza = {}
+        for prefisso, classe in regole.items():
+            self._per_lunghezza.setdefault(len(prefisso), {})[prefisso] = classe
+        self._lunghezze = sorted(self._per_lunghezza, reverse=True)
+        self._memo = {}
+
+    def __call__(self, conto: str):
+        classe = self._memo.get(conto, _NESSUNA)
+        if classe is _NESSUNA:
+            classe = self.default
+            for lunghezza in self._lunghezze:
+                trovata = self._per_lunghezza[lunghezza].get(conto[:lunghezza], _NESSUNA)
+                if trovata is not _NESSUNA:
+                    classe = trovata
+                    break
+            self._memo[conto] = classe
+        return classe
+
+    def applica(self, conti) -> pd.Series:
+        """Classe per ogni elemento di una colonna di codici, calcolata una volta per codice distinto"""
+        conti = pd.Series(conti)
+        codici, distinti = pd.factorize(conti)
+        classi = np.array([self(c) for c in distinti] + [None], dtype=object)
+        return pd.Series(classi[codici], index=conti.index, dtype=object)
+
+
+BU_RICAVI = Classificatore(REGOLE_RICAVI)
+CATEGORIA_COSTI = Classificatore(REGOLE_COSTI, default=DEFAULT_COSTI)
+FISSI = Classificatore({prefisso: True for prefisso in COSTI_FISSI_CODES}, default=False)
+
+
+def classify_ricavo_bu(conto):
+    """Classifica ricavo per BU (None se non è un ricavo)"""
+    return BU_RICAVI(conto)
+
+
+def is_costo_fisso(conto):
+    """Verifica se conto è costo fisso"""
+    return FISSI(conto)
+
+
+def classify_costo(conto):
+    """Classifica costo: COSTI_FISSI, COSTI_VARIABILI, PERSONALE (None se è un ricavo)"""
+    return CATEGORIA_COSTI(conto)
+
+
+def classifica(conti) -> pd.DataFrame:
+    """BU e categoria di costo per una colonna di codici conto"""
+    conti = pd.Series(conti)
+    return pd.DataFrame({
+        'bu': BU_RICAVI.applica(conti),
+        'categoria': CATEGORIA_COSTI.applica(conti),
+    }, index=conti.index)
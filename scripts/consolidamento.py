@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Consolidamento del conto economico mensile su N società, con elisione delle
+partite intercompany.
+
+Il consolidato si calcola in una passata sui dashboard delle società
+(crea_dashboard.py, importi in centesimi): somma per mese di tutte le
+colonne, meno le partite intercompany trovate nei ledger. Le partite si
+riconoscono con REGOLE_ELISIONE, una tabella (regola, società, prefisso
+conto) come quelle di classificazione.py: per ogni regola e mese si elimina
+la parte comune ai due lati, min(|costo|, |ricavo|), sia dal costo di chi
+paga sia dal ricavo di chi incassa, ciascuno nella colonna in cui la
+classificazione lo aveva messo. Se i due lati non coincidono (es. fattura
+registrata in mesi diversi, o un lato solo) la differenza resta nel
+consolidato ed è segnalata come squadratura.
+
+Aggiungere una società = aggiungerla a mesepermese.SOCIETA (e le sue
+partite a REGOLE_ELISIONE); nessuno script o formula per società.
+
+Output: output/CONSOLIDATO_dashboard_semplificato.csv,
+        output/elisioni_intercompany.csv
+
+USAGE:
+    python scripts/consolidamento.py
+    python scripts/consolidamento.py --anno 2025 --workers 4
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aggiorna_personale_dashboard import (
+    COLONNE_DASHBOARD, IMPORTI_DASHBOARD, MESI_NOME, ricalcola_totali, scrivi_dashboard,
+)
+from classificazione import Classificatore, classifica
+from crea_dashboard import BU, CATEGORIE_COSTO, carica_ledger_con_cache, crea_dashboard
+from importi import euro, in_euro
+from mesepermese import ANNO, SOCIETA, path_mesepermese
+
+OUTPUT_DIR = Path('output')
+
+CONSOLIDATO = 'CONSOLIDATO'
+
+# Partite intercompany: (regola, società, prefisso conto). Tutti i conti di
+# una regola, su tutte le società indicate, escono dal consolidato.
+REGOLE_ELISIONE = [
+    ('Affitto azienda ORTI->INTUR', 'ORTI', '65.11.01'),    # canoni passivi affitto d'azienda
+    ('Affitto azienda ORTI->INTUR', 'INTUR', '53.01.33'),   # canoni attivi affitto ramo d'azienda
+]
+
+
+def _compila_regole(regole: list) -> dict:
+    """{societa: Classificatore {prefisso: regola}}"""
+    per_societa = {}
+    for regola, societa, prefisso in regole:
+        per_societa.setdefault(societa, {})[prefisso] = regola
+    return {societa: Classificatore(tabella) for societa, tabella in per_societa.items()}
+
+
+def _da_eliminare(df: pd.DataFrame) -> pd.Series:
+    """
+    Centesimi da eliminare per ogni riga intercompany: per regola e mese la
+    parte comune ai due lati, min(|costo|, |ricavo|), ripartita sulle righe di
+    ciascun lato in proporzione all'importo; l'ultima riga del lato prende il
+    resto dell'arrotondamento.
+    """
+    gruppo = [df['regola'], df['mese']]
+    lato = df.groupby([*gruppo, df['lato']])['importo'].transform('sum')
+    costo = lato.where(df['lato'] == 'costo', 0).abs().groupby(gruppo).transform('max')
+    ricavo = lato.where(df['lato'] == 'ricavo', 0).abs().groupby(gruppo).transform('max')
+    comune = np.minimum(costo, ricavo)
+
+    quota = (df['importo'] * comune / lato.abs().replace(0, 1)).round().astype('int64')
+    resto = np.sign(lato) * comune - quota.groupby([*gruppo, df['lato']]).transform('sum')
+    ultima = ~df.duplicated(['regola', 'mese', 'lato'], keep='last')
+    return quota + resto.where(ultima, 0)
+
+
+def elisioni(ledger: dict, regole: list = None) -> pd.DataFrame:
+    """
+    Righe intercompany dei ledger {societa: ledger}: regola, societa, mese,
+    conto, importo (centesimi), la parte eliminata nel consolidato e la
+    colonna del dashboard in cui sono contate.
+    """
+    regole = _compila_regole(REGOLE_ELISIONE if regole is None else regole)
+    frames = []
+    for societa, df in ledger.items():
+        if societa not in regole:
+            continue
+        df = df.assign(regola=regole[societa].applica(df['conto']))
+        frames.append(df[df['regola'].notna()].assign(societa=societa))
+
+    colonne = ['regola', 'societa', 'mese', 'conto', 'colonna', 'lato', 'importo', 'eliminato']
+    if not frames:
+        return pd.DataFrame(columns=colonne)
+
+    df = pd.concat(frames, ignore_index=True)
+    classi = classifica(df['conto'])
+    df['colonna'] = classi['bu'].fillna(classi['categoria'])
+    df['lato'] = classi['bu'].notna().map({True: 'ricavo', False: 'costo'})
+    df['eliminato'] = _da_eliminare(df)
+    return df[colonne].sort_values(['regola', 'mese', 'societa'], ignore_index=True)
+
+
+def squadrature(elise: pd.DataFrame) -> pd.DataFrame:
+    """Per regola e mese: costi e ricavi intercompany e differenza rimasta nel consolidato, dove non coincidono"""
+    if elise.empty:
+        return pd.DataFrame(columns=['regola', 'mese', 'costo', 'ricavo', 'differenza'])
+    df = (
+        elise.pivot_table(index=['regola', 'mese'], columns='lato', values='importo', aggfunc='sum')
+        .reindex(columns=['costo', 'ricavo'])
+        .fillna(0)
+        .astype('int64')
+    )
+    df['differenza'] = df['ricavo'] - df['costo']
+    return df[df['differenza'] != 0].reset_index()
+
+
+def _note_gruppo(note: pd.Series) -> str:
+    """Nota del consolidato per un mese: 'PC' se tutte le società hanno il PC, altrimenti le eccezioni"""
+    eccezioni = [f"{societa} {nota}" for (societa, *_), nota in note.items() if nota != 'PC']
+    return '; '.join(eccezioni) if eccezioni else 'PC'
+
+
+def consolida(dashboard: dict, elise: pd.DataFrame) -> pd.DataFrame:
+    """
+    Dashboard consolidato (centesimi) da {societa: dashboard} e dalle righe di
+    elisioni(): somma per mese meno la parte eliminata delle partite
+    intercompany, totali ricalcolati.
+    """
+    gruppo = pd.concat(dashboard, names=['societa', None])
+    mesi = list(MESI_NOME.values())
+    df = gruppo.groupby('Mese')[IMPORTI_DASHBOARD].sum().reindex(mesi, fill_value=0)
+
+    if not elise.empty:
+        rettifiche = (
+            elise.assign(Mese=elise['mese'].map(MESI_NOME))
+            .pivot_table(index='Mese', columns='colonna', values='eliminato', aggfunc='sum')
+            .reindex(index=mesi, columns=BU + CATEGORIE_COSTO)
+            .fillna(0)
+            .astype('int64')
+        )
+        df[BU + CATEGORIE_COSTO] -= rettifiche
+
+    df['TOT_RICAVI'] = df[BU].sum(axis=1)
+    df = ricalcola_totali(df)
+    df['NOTE'] = gruppo.set_index('Mese', append=True)['NOTE'].groupby(level='Mese').agg(_note_gruppo)
+    return df.rename_axis('Mese').reset_index()[COLONNE_DASHBOARD]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conto economico consolidato con elisioni intercompany")
+    parser.add_argument("--anno", type=int, default=ANNO, help=f"Anno dei file mesepermese e dei PC (default: {ANNO})")
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Processi paralleli per la lettura dei fogli mese (default: 1, seriale)"
+    )
+    parser.add_argument("--force", "-f", action="store_true", help="Rilegge tutti i workbook ignorando la cache")
+    args = parser.parse_args()
+
+    files = {societa: path_mesepermese(societa) for societa in SOCIETA}
+    ledger = carica_ledger_con_cache(files, workers=args.workers, force=args.force)
+    dashboard = crea_dashboard(ledger, args.anno)
+    elise = elisioni(ledger)
+    df = consolida(dashboard, elise)
+
+    path = OUTPUT_DIR / f'{CONSOLIDATO}_dashboard_semplificato.csv'
+    scrivi_dashboard(df, path)
+    print(f"Salvato: {path}")
+    path = OUTPUT_DIR / 'elisioni_intercompany.csv'
+    in_euro(elise, ['importo', 'eliminato']).to_csv(path, index=False)
+    print(f"Salvato: {path}")
+
+    print("\n" + "="*70)
+    print(f"CONSOLIDATO {args.anno} ({', '.join(dashboard)})")
+    print("="*70)
+    print(f"  {'':<22} {'Ricavi':>16} {'Costi':>16} {'EBITDA':>16}")
+    righe = [(s, d) for s, d in dashboard.items()] + [(CONSOLIDATO, df)]
+    for nome, d in righe:
+        if nome == CONSOLIDATO:
+            eliminati = elise.groupby('lato')['eliminato'].sum()
+            print(f"  {'Elisioni':<22} {-euro(eliminati.get('ricavo', 0)):>16,.2f} "
+                  f"{-euro(eliminati.get('costo', 0)):>16,.2f}")
+        tot = euro(d[['TOT_RICAVI', 'TOT_COSTI', 'EBITDA']].sum())
+        print(f"  {nome:<22} {tot['TOT_RICAVI']:>16,.2f} {tot['TOT_COSTI']:>16,.2f} {tot['EBITDA']:>16,.2f}")
+
+    sq = squadrature(elise)
+    if len(sq):
+        print("\n⚠️  SQUADRATURE INTERCOMPANY (ricavo - costo, restano nel consolidato):")
+        for r in sq.itertuples():
+            print(f"   {r.regola} - {MESI_NOME[r.mese]}: costo €{euro(r.costo):,.2f}, "
+                  f"ricavo €{euro(r.ricavo):,.2f}, differenza €{euro(r.differenza):,.2f}")
+    print("="*70)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Crea <SOCIETA>_dashboard_semplificato.csv dai file mesepermese, senza notebook.
+
+Stessa logica di notebooks/dashboard_semplificato.ipynb, per colonne:
+- conti del Conto Economico, solo foglie del piano dei conti di ogni mese
+- ricavi per BU e costi FISSI/VARIABILI/PERSONALE da classificazione.py,
+  sommati con una pivot per mese
+- personale dai prospetti PC (archivio 'personale'), note per mese e
+  totali come in aggiorna_personale_dashboard.py
+- importi in centesimi interi (importi.py) dal parsing fino al CSV
+
+I workbook si leggono a blocchi (mesepermese.leggi_a_blocchi) e ogni blocco
+è aggregato per conto appena letto, quindi la memoria non cresce con le
+righe dei fogli. Il ledger di ogni workbook è in cache (output/cache/ledger/,
+Parquet) indicizzato dallo sha256 del file e da VERSIONE_LEDGER: si
+rileggono solo i workbook modificati.
+
+USAGE:
+    python scripts/crea_dashboard.py                     # ORTI + INTUR, anno mesepermese.ANNO
+    python scripts/crea_dashboard.py --societa ORTI --anno 2025
+    python scripts/crea_dashboard.py --workers 4
+    python scripts/crea_dashboard.py --force        # ignora la cache
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import archivio
+from aggiorna_personale_dashboard import (
+    MESI_NOME, aggiorna_dashboard, archivia_dashboard, carica_personale, scrivi_dashboard,
+)
+from cache import (
+    carica_frame, carica_manifest, elimina_frame, hash_file, hash_valore,
+    salva_frame, salva_manifest,
+)
+from classificazione import classifica
+from importi import centesimi_da_testo
+from mesepermese import ANNO, SOCIETA, fogli_mese, leggi_a_blocchi, path_mesepermese
+from piano_conti import PianoConti
+
+OUTPUT_DIR = Path('output')
+
+# Da incrementare quando cambia la logica di carica_ledger (invalida la cache)
+VERSIONE_LEDGER = 2
+
+# Colonne dei fogli mese usate dal ledger (le altre non si leggono)
+COLONNE_LEDGER = ['Tipo conto e sezione', 'Conto', 'Importo']
+
+BU = ['HOTEL', 'ANGELINA', 'CVM', 'F&B', 'SPIAGGIA', 'ALTRI_RICAVI']
+CATEGORIE_COSTO = ['COSTI_FISSI', 'COSTI_VARIABILI', 'PERSONALE']
+
+
+def pulisci_conti(col: pd.Series) -> pd.Series:
+    """Codici conto puliti ('' se la cella non è un codice puntato), come clean_conto del notebook"""
+    col = col.astype(object)
+    durate = col.map(lambda v: isinstance(v, datetime.timedelta))
+    testo = col.where(col.notna() & ~durate).astype(str).str.replace('\xa0', '', regex=False).str.strip()
+    valido = col.notna() & ~durate & testo.str.match(r'\d', na=False) & testo.str.contains('.', regex=False, na=False)
+    return testo.where(valido, '').astype(object)
+
+
+def carica_ledger(fogli) -> pd.DataFrame:
+    """
+    Conto Economico in forma lunga: una riga per (mese, conto foglia) con
+    l'importo sommato, in centesimi. `fogli` sono (mese, nome_foglio, DataFrame):
+    i fogli interi di leggi_fogli_paralleli o i blocchi di leggi_a_blocchi.
+    Ogni blocco è aggregato appena letto; dei fogli si tengono solo le somme
+    per conto e i codici visti, che servono per riconoscere le foglie.
+    """
+    parziali = []
+    codici = {}  # (mese, foglio) -> codici conto visti
+    for mese_num, sheet_name, df in fogli:
+        df = df[df['Tipo conto e sezione'].str.contains('Conto Economico', na=False)]
+        conto = pulisci_conti(df['Conto'])
+        validi = conto != ''
+        parziali.append(
+            pd.DataFrame({'mese': mese_num, 'foglio': sheet_name, 'conto': conto[validi],
+                          'importo': centesimi_da_testo(df['Importo'])[validi]})
+            .groupby(['mese', 'foglio', 'conto'], sort=False, as_index=False)['importo'].sum()
+        )
+        codici.setdefault((mese_num, sheet_name), set()).update(conto[validi])
+
+    ledger = pd.concat(parziali, ignore_index=True).groupby(['mese', 'foglio', 'conto'], sort=False, as_index=False)['importo'].sum()
+
+    # Solo foglie (codice foglia = nessun sotto-conto nel foglio)
+    foglie = pd.MultiIndex.from_tuples(
+        [(m, f, c) for (m, f), visti in codici.items() for c in PianoConti(visti).foglie()],
+        names=['mese', 'foglio', 'conto'],
+    )
+    ledger = ledger[pd.MultiIndex.from_frame(ledger[['mese', 'foglio', 'conto']]).isin(foglie)]
+    return ledger.groupby(['mese', 'conto'], sort=False, as_index=False)['importo'].sum()
+
+
+def _ledger_foglio(input_file: Path, sheet_name: str) -> pd.DataFrame:
+    return carica_ledger(leggi_a_blocchi(input_file, fogli=[sheet_name], colonne=COLONNE_LEDGER))
+
+
+def leggi_ledger(files: dict, workers: int = 1) -> dict:
+    """
+    Ledger dei workbook {chiave: path} -> {chiave: DataFrame}, letti a blocchi
+    (memoria costante rispetto alle righe dei fogli). Con workers > 1 ogni
+    foglio è aggregato in un processo del pool e i parziali sono riuniti qui.
+    """
+    if workers <= 1:
+        return {chiave: carica_ledger(leggi_a_blocchi(path, colonne=COLONNE_LEDGER)) for chiave, path in files.items()}
+
+    jobs = [(chiave, sheet_name) for chiave, path in files.items() for _, sheet_name in fogli_mese(path)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parziali = list(pool.map(_ledger_foglio, [files[c] for c, _ in jobs], [s for _, s in jobs]))
+    return {
+        chiave: pd.concat([p for (c, _), p in zip(jobs, parziali) if c == chiave], ignore_index=True)
+        .groupby(['mese', 'conto'], sort=False, as_index=False)['importo'].sum()
+        for chiave in files
+    }
+
+
+def carica_ledger_con_cache(files: dict, workers: int = 1, force: bool = False) -> dict:
+    """
+    Ledger per workbook, {chiave: path} -> {chiave: DataFrame}. I workbook
+    con contenuto già visto si leggono dalla cache; gli altri vengono letti
+    (in parallelo con workers > 1) e salvati.
+    """
+    versione = hash_valore([VERSIONE_LEDGER])
+    manifest = {} if force else carica_manifest('ledger', versione)
+    hashes = {chiave: hash_file(path) for chiave, path in files.items()}
+
+    ledger = {}
+    for chiave, h in hashes.items():
+        if h in manifest:
+            df = carica_frame('ledger', h)
+            if df is not None:
+                ledger[chiave] = df
+    da_leggere = {chiave: path for chiave, path in files.items() if chiave not in ledger}
+    print(f"Workbook in cache: {len(ledger)}, da leggere: {len(da_leggere)}")
+
+    if da_leggere:
+        for chiave, letto in leggi_ledger(da_leggere, workers=workers).items():
+            ledger[chiave] = letto
+            # La versione precedente dello stesso workbook non serve più
+            for h, voce in list(manifest.items()):
+                if voce['chiave'] == chiave and h != hashes[chiave]:
+                    elimina_frame('ledger', h)
+                    del manifest[h]
+            salva_frame('ledger', hashes[chiave], ledger[chiave])
+            manifest[hashes[chiave]] = {'chiave': chiave, 'file': Path(files[chiave]).name}
+        salva_manifest('ledger', versione, manifest)
+
+    return {chiave: ledger[chiave] for chiave in files}
+
+
+def costruisci_dashboard(ledger: pd.DataFrame, personale: pd.Series = None) -> pd.DataFrame:
+    """
+    Dashboard mensile (Mese, ricavi per BU, costi, EBITDA) dal ledger classificato,
+    importi in centesimi. `personale` (centesimi per numero di mese) sostituisce
+    il personale contabile nei mesi dove è > 0.
+    """
+    mesi = pd.RangeIndex(1, 13, name='mese')
+    ledger = ledger.join(classifica(ledger['conto']))
+
+    def pivot(colonna, classi):
+        return (
+            ledger.pivot_table(index='mese', columns=colonna, values='importo', aggfunc='sum')
+            .reindex(index=mesi, columns=classi)
+            .fillna(0)
+            .astype('int64')
+        )
+
+    ricavi = pivot('bu', BU)
+    costi = pivot('categoria', CATEGORIE_COSTO)
+    if personale is not None:
+        personale = personale.reindex(mesi, fill_value=0)
+        costi['PERSONALE'] = personale.where(personale > 0, costi['PERSONALE'])
+
+    tot_ricavi = ricavi.sum(axis=1)
+    tot_costi = costi.sum(axis=1)
+    df = pd.concat([ricavi, costi], axis=1).assign(
+        TOT_RICAVI=tot_ricavi,
+        TOT_COSTI=tot_costi,
+        EBITDA=tot_ricavi - tot_costi,
+    )
+    df.insert(0, 'Mese', df.index.map(MESI_NOME))
+    return df[['Mese'] + BU + ['TOT_RICAVI'] + CATEGORIE_COSTO + ['TOT_COSTI', 'EBITDA']].reset_index(drop=True)
+
+
+def crea_dashboard(ledger: dict, anno: int) -> dict:
+    """Dashboard completi {societa: DataFrame} dai ledger, con il personale dei PC dell'anno"""
+    personale = carica_personale(anno)
+    return {
+        societa: aggiorna_dashboard(costruisci_dashboard(l), societa, personale)
+        for societa, l in ledger.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea i dashboard semplificati dai file mesepermese")
+    parser.add_argument(
+        "--societa", nargs="+", choices=list(SOCIETA), default=list(SOCIETA),
+        help="Società da processare (default: tutte)"
+    )
+    parser.add_argument(
+        "--anno", type=int, default=ANNO,
+        help=f"Anno dei file mesepermese e dei PC (default: {ANNO})"
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Processi paralleli per la lettura dei fogli mese (default: 1, seriale)"
+    )
+    parser.add_argument(
+        "--force", "-f", action="store_true",
+        help="Rilegge tutti i workbook ignorando la cache"
+    )
+    args = parser.parse_args()
+
+    files = {societa: path_mesepermese(societa) for societa in args.societa}
+    print(f"Lettura {', '.join(str(p) for p in files.values())}...")
+    ledger = carica_ledger_con_cache(files, workers=args.workers, force=args.force)
+
+    dashboard = crea_dashboard(ledger, args.anno)
+    for societa, df in dashboard.items():
+        path = OUTPUT_DIR / f'{societa}_dashboard_semplificato.csv'
+        scrivi_dashboard(df, path)
+        print(f"Salvato: {path}")
+    archivia_dashboard(dashboard, args.anno)
+    print(f"Archiviato: {archivio.ARCHIVIO_DIR / 'dashboard'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,201 +1,196 @@
 #!/usr/bin/env python3
 """
-Crea INTUR_MASTRINO_PULITO da INTUR_mesepermese.xlsx
+Crea <SOCIETA>_MASTRINO_PULITO da <SOCIETA>_mesepermese.xlsx (ORTI, INTUR)
 Struttura identica a ORTI_MASTRINO_PULITO
+Output: output/<SOCIETA>_mastrino_pulito.csv e output/archivio/mastrino/ (Parquet)
+
+USAGE:
+    python scripts/crea_mastrino_intur.py                    # INTUR
+    python scripts/crea_mastrino_intur.py --societa ORTI INTUR
+    python scripts/crea_mastrino_intur.py --no-upload        # solo CSV
+    python scripts/crea_mastrino_intur.py --sync             # su Sheets solo le celle cambiate
+    python scripts/crea_mastrino_intur.py --societa ORTI INTUR --workers 4
 """
 
+import argparse
 import pandas as pd
 from pathlib import Path
-import gspread
-from google.oauth2.service_account import Credentials
-
-DATA_DIR = Path('data')
-SPREADSHEET_ID = "1CAT_EN6DOXyT3vEbYmnwRQh1pWrdnrCXHFWR--JtFmQ"
-CREDS_PATH = Path("config/hotelHops.json")
-
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
-
-MESI_NOMI = {
-    1: '01_GENNAIO', 2: '02_FEBBRAIO', 3: '03_MARZO', 4: '04_APRILE',
-    5: '05_MAGGIO', 6: '06_GIUGNO', 7: '07_LUGLIO', 8: '08_AGOSTO',
-    9: '09_SETTEMBRE', 10: '10_OTTOBRE', 11: '11_NOVEMBRE', 12: '12_DICEMBRE'
-}
-
-def get_conto_levels(conto: str) -> dict:
-    """Estrae i livelli gerarchici dal codice conto"""
-    parts = str(conto).split('.')
-    levels = {'conto_l1': '', 'conto_l2': '', 'conto_l3': ''}
-
-    if len(parts) >= 1:
-        levels['conto_l1'] = parts[0]
-    if len(parts) >= 2:
-        levels['conto_l2'] = f"{parts[0]}.{parts[1]}"
-    if len(parts) >= 3:
-        levels['conto_l3'] = f"{parts[0]}.{parts[1]}.{parts[2]}"
-
-    return levels
-
-def get_livello(conto: str) -> int:
-    """Determina il livello gerarchico del conto"""
-    parts = str(conto).split('.')
-    return min(len(parts), 4)
-
-def process_intur_mesepermese():
-    """Processa INTUR_mesepermese.xlsx e crea mastrino pulito"""
 
-    input_file = DATA_DIR / 'INTUR_mesepermese.xlsx'
-    print(f"Lettura {input_file}...")
-
-    # Leggi tutte le sheet (ogni mese è una sheet)
-    xl = pd.ExcelFile(input_file)
-    print(f"  Sheet trovate: {xl.sheet_names}")
-
-    all_data = []
-
-    for sheet_name in xl.sheet_names:
-        # Estrai numero mese dal nome sheet
-        try:
-            # Prova a parsare il mese dal nome (es. "Gennaio", "01", etc.)
-            mese_num = None
-            sheet_lower = sheet_name.lower().strip()
-
-            # Mapping nomi italiani
-            mesi_map = {
-                'gennaio': 1, 'febbraio': 2, 'marzo': 3, 'aprile': 4,
-                'maggio': 5, 'giugno': 6, 'luglio': 7, 'agosto': 8,
-                'settembre': 9, 'ottobre': 10, 'novembre': 11, 'dicembre': 12
-            }
-
-            for nome, num in mesi_map.items():
-                if nome in sheet_lower:
-                    mese_num = num
-                    break
-
-            if mese_num is None:
-                # Prova parsing numerico
-                import re
-                match = re.search(r'(\d+)', sheet_name)
-                if match:
-                    mese_num = int(match.group(1))
-
-            if mese_num is None or mese_num < 1 or mese_num > 12:
-                print(f"  Skipping sheet '{sheet_name}' - non riconosciuto come mese")
-                continue
-
-        except Exception as e:
-            print(f"  Skipping sheet '{sheet_name}': {e}")
-            continue
+import archivio
+from importi import centesimi, in_euro
+from mesepermese import MESI_NOMI, SOCIETA, leggi_fogli_mensili, leggi_fogli_paralleli, path_mesepermese
+from piano_conti import PianoConti
+from sheets_batch import Batch
+from sheets_client import SPREADSHEET_ID, apri
+
+COLONNE_MASTRINO = ['mese', 'mese_foglio', 'Conto', 'Partitari', 'Descrizione',
+                    'dare', 'avere', 'saldo', 'livello', 'conto_l1', 'conto_l2', 'conto_l3']
+
+# Schema compatto: codici e descrizioni ripetuti su ogni riga come categorie,
+# mese e livello come interi piccoli, importi in centesimi interi (euro solo nei CSV e su Sheets)
+IMPORTI_MASTRINO = ['dare', 'avere', 'saldo']
+SCHEMA_MASTRINO = {
+    'mese': 'uint8',
+    'mese_foglio': 'category',
+    'Conto': 'category',
+    'Partitari': 'category',
+    'Descrizione': 'category',
+    'dare': 'int64',
+    'avere': 'int64',
+    'saldo': 'int64',
+    'livello': 'uint8',
+    'conto_l1': 'category',
+    'conto_l2': 'category',
+    'conto_l3': 'category',
+}
 
+def mappa_colonne(columns) -> dict:
+    """Trova le colonne rilevanti (possono avere nomi diversi)"""
+    col_mapping = {}
+    for col in columns:
+        col_lower = str(col).lower()
+        if 'conto' in col_lower and 'desc' not in col_lower:
+            col_mapping['Conto'] = col
+        elif 'descrizione' in col_lower or 'desc' in col_lower:
+            col_mapping['Descrizione'] = col
+        elif 'dare' in col_lower:
+            col_mapping['dare'] = col
+        elif 'avere' in col_lower:
+            col_mapping['avere'] = col
+        elif 'saldo' in col_lower:
+            col_mapping['saldo'] = col
+        elif 'partitari' in col_lower:
+            col_mapping['Partitari'] = col
+    return col_mapping
+
+
+def _valore_o_zero(df: pd.DataFrame, col) -> pd.Series:
+    """Equivalente per colonna di `row.get(col, 0) or 0`: valori 'falsi' a 0, NaN invariati"""
+    if col is None:
+        return pd.Series(0, index=df.index)
+    s = df[col]
+    return s.where(s.isna() | s.astype(bool), 0)
+
+
+def _numerico(s: pd.Series) -> pd.Series:
+    return s.astype(float).fillna(0.0)
+
+
+def compatta_mastrino(df: pd.DataFrame) -> pd.DataFrame:
+    """Applica SCHEMA_MASTRINO; importi in centesimi, mancanti o non valorizzati a 0"""
+    importi = {col: centesimi(df[col]) for col in IMPORTI_MASTRINO}
+    return df.assign(**importi).astype(SCHEMA_MASTRINO)
+
+
+def costruisci_foglio(df: pd.DataFrame, mese_num: int, col_mapping: dict) -> pd.DataFrame:
+    """Righe del mastrino per un foglio mese, calcolate per colonne"""
+    conto = df[col_mapping['Conto']]
+    df = df[conto.notna() & (conto.astype(str).str.strip() != '')]
+    conto = df[col_mapping['Conto']].astype(str).str.strip()
+
+    def colonna(nome, default):
+        col = col_mapping.get(nome)
+        return df[col] if col is not None else pd.Series(default, index=df.index)
+
+    out = pd.DataFrame({
+        'mese': mese_num,
+        'mese_foglio': MESI_NOMI.get(mese_num, f'{mese_num:02d}'),
+        'Conto': conto,
+        'Partitari': colonna('Partitari', ''),
+        'Descrizione': colonna('Descrizione', ''),
+        'dare': _valore_o_zero(df, col_mapping.get('dare')),
+        'avere': _valore_o_zero(df, col_mapping.get('avere')),
+    }, index=df.index)
+
+    # Calcola saldo se non presente
+    if col_mapping.get('saldo'):
+        out['saldo'] = _valore_o_zero(df, col_mapping['saldo'])
+    else:
+        out['saldo'] = _numerico(out['dare']) - _numerico(out['avere'])
+
+    return out
+
+
+def aggiungi_livelli(df: pd.DataFrame, piano: PianoConti = None) -> pd.DataFrame:
+    """Livello (max 4) e conto_l1..conto_l3 dal piano dei conti, calcolati una volta per codice"""
+    if piano is None:
+        piano = PianoConti(df['Conto'].unique())
+    return df.join(piano.tabella_livelli(n=3, livello_max=4), on='Conto')
+
+
+def process_mesepermese(societa: str, fogli: list = None):
+    """
+    Processa <SOCIETA>_mesepermese.xlsx e crea mastrino pulito.
+    `fogli` sono i fogli mese già letti (vedi leggi_fogli_paralleli); se
+    assenti il workbook viene letto qui, aperto una sola volta.
+    """
+
+    if fogli is None:
+        input_file = path_mesepermese(societa)
+        print(f"Lettura {input_file}...")
+        fogli = leggi_fogli_mensili(input_file)
+
+    frames = []
+    for mese_num, sheet_name, df in fogli:
         print(f"  Processing: {sheet_name} -> mese {mese_num}")
 
-        df = pd.read_excel(input_file, sheet_name=sheet_name)
-
-        # Trova le colonne rilevanti (possono avere nomi diversi)
-        col_mapping = {}
-        for col in df.columns:
-            col_lower = str(col).lower()
-            if 'conto' in col_lower and 'desc' not in col_lower:
-                col_mapping['Conto'] = col
-            elif 'descrizione' in col_lower or 'desc' in col_lower:
-                col_mapping['Descrizione'] = col
-            elif 'dare' in col_lower:
-                col_mapping['dare'] = col
-            elif 'avere' in col_lower:
-                col_mapping['avere'] = col
-            elif 'saldo' in col_lower:
-                col_mapping['saldo'] = col
-            elif 'partitari' in col_lower:
-                col_mapping['Partitari'] = col
-
+        col_mapping = mappa_colonne(df.columns)
         if 'Conto' not in col_mapping:
             print(f"    WARN: Colonna 'Conto' non trovata in {sheet_name}")
             print(f"    Colonne disponibili: {list(df.columns)}")
             continue
 
-        # Processa ogni riga
-        for _, row in df.iterrows():
-            conto = row.get(col_mapping.get('Conto', ''), '')
-            if pd.isna(conto) or str(conto).strip() == '':
-                continue
-
-            conto = str(conto).strip()
-
-            record = {
-                'mese': mese_num,
-                'mese_foglio': MESI_NOMI.get(mese_num, f'{mese_num:02d}'),
-                'Conto': conto,
-                'Partitari': row.get(col_mapping.get('Partitari', ''), ''),
-                'Descrizione': row.get(col_mapping.get('Descrizione', ''), ''),
-                'dare': row.get(col_mapping.get('dare', ''), 0) or 0,
-                'avere': row.get(col_mapping.get('avere', ''), 0) or 0,
-                'livello': get_livello(conto),
-            }
-
-            # Calcola saldo se non presente
-            if col_mapping.get('saldo'):
-                record['saldo'] = row.get(col_mapping['saldo'], 0) or 0
-            else:
-                dare = float(record['dare']) if pd.notna(record['dare']) else 0
-                avere = float(record['avere']) if pd.notna(record['avere']) else 0
-                record['saldo'] = dare - avere
-
-            # Aggiungi livelli conto
-            levels = get_conto_levels(conto)
-            record.update(levels)
-
-            all_data.append(record)
-
-    if not all_data:
+        frames.append(costruisci_foglio(df, mese_num, col_mapping))
+
+    if not frames or sum(len(f) for f in frames) == 0:
         print("ERRORE: Nessun dato estratto!")
         return None
 
-    # Crea DataFrame
-    df_out = pd.DataFrame(all_data)
+    df_out = pd.concat(frames, ignore_index=True)
+
+    # Piano dei conti del workbook, costruito una volta per tutti i mesi
+    piano = PianoConti(df_out['Conto'].unique())
+    df_out = aggiungi_livelli(df_out, piano)
 
     # Ordina per mese e conto
     df_out = df_out.sort_values(['mese', 'Conto'])
 
-    # Colonne in ordine corretto
-    columns = ['mese', 'mese_foglio', 'Conto', 'Partitari', 'Descrizione',
-               'dare', 'avere', 'saldo', 'livello', 'conto_l1', 'conto_l2', 'conto_l3']
-    df_out = df_out[columns]
+    # Colonne in ordine corretto, schema compatto
+    df_out = compatta_mastrino(df_out[COLONNE_MASTRINO])
 
     print(f"\nTotale righe: {len(df_out)}")
-    print(f"Mesi presenti: {sorted(df_out['mese'].unique())}")
+    print(f"Mesi presenti: {sorted(df_out['mese'].unique().tolist())}")
 
     return df_out
 
 
-def upload_to_sheets(df: pd.DataFrame):
-    """Carica il mastrino su Google Sheets"""
+def process_intur_mesepermese():
+    """Processa INTUR_mesepermese.xlsx e crea mastrino pulito"""
+    return process_mesepermese('INTUR')
 
-    print("\nUpload su Google Sheets...")
 
-    credentials = Credentials.from_service_account_file(str(CREDS_PATH), scopes=SCOPES)
-    gc = gspread.authorize(credentials)
-    spreadsheet = gc.open_by_key(SPREADSHEET_ID)
+def upload_to_sheets(df: pd.DataFrame, sheet_name: str = "INTUR_MASTRINO_PULITO", sync: bool = False):
+    """Carica il mastrino su Google Sheets (sync: solo le celle cambiate)"""
+
+    print("\nUpload su Google Sheets...")
 
-    sheet_name = "INTUR_MASTRINO_PULITO"
+    spreadsheet = apri()
 
-    try:
-        ws = spreadsheet.worksheet(sheet_name)
+    batch = Batch(spreadsheet, incrementale=sync)
+    if batch.esiste(sheet_name):
         print(f"  Foglio '{sheet_name}' esistente, aggiornamento...")
-        ws.clear()
-    except gspread.WorksheetNotFound:
+    else:
         print(f"  Creazione foglio '{sheet_name}'...")
-        ws = spreadsheet.add_worksheet(title=sheet_name, rows=len(df)+10, cols=15)
+    ws = batch.foglio(sheet_name, rows=len(df)+10, cols=15, ridimensiona=False)
+    ws.clear()
 
     # Prepara dati
     header = df.columns.tolist()
-    data = df.fillna('').astype(str).values.tolist()
+    data = in_euro(df, IMPORTI_MASTRINO).astype(object).fillna('').astype(str).values.tolist()
     all_data = [header] + data
 
-    # Scrivi
-    ws.update(range_name="A1", values=all_data)
-    print(f"  Scritte {len(data)} righe")
+    # Scrivi (testo così com'è, come nel CSV)
+    ws.update(range_name="A1", values=all_data, value_input_option="RAW")
 
     # Formattazione header
     ws.format("1:1", {
@@ -207,29 +202,68 @@ def upload_to_sheets(df: pd.DataFrame):
     # Freeze header
     ws.freeze(rows=1)
 
-    print("  Formattazione applicata")
+    chiamate = batch.flush()
+    scritte = f"{batch.celle} celle modificate" if sync else f"{len(data)} righe"
+    print(f"  Scritte {scritte} ({chiamate} richieste)")
 
 
 def main():
-    print("="*60)
-    print("CREAZIONE INTUR_MASTRINO_PULITO")
-    print("="*60)
+    parser = argparse.ArgumentParser(description="Crea i mastrini puliti dai file mesepermese")
+    parser.add_argument(
+        "--societa", nargs="+", choices=list(SOCIETA), default=['INTUR'],
+        help="Società da processare (default: INTUR)"
+    )
+    parser.add_argument(
+        "--no-upload", action="store_true",
+        help="Salva solo i CSV in output/, senza caricare su Google Sheets"
+    )
+    parser.add_argument(
+        "--sync", action="store_true",
+        help="Su Google Sheets scrive solo le celle cambiate invece di riscrivere il foglio"
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Processi paralleli per la lettura dei fogli mese (default: 1, seriale)"
+    )
+    parser.add_argument(
+        "--anno", type=int, default=2025,
+        help="Anno dei file mesepermese, usato come partizione in archivio (default: 2025)"
+    )
+    args = parser.parse_args()
+
+    # Lettura di tutti i fogli (società x mese), eventualmente in parallelo
+    files = {societa: path_mesepermese(societa) for societa in args.societa}
+    print(f"Lettura {', '.join(str(p) for p in files.values())}...")
+    fogli = leggi_fogli_paralleli(files, workers=args.workers)
+
+    for societa in args.societa:
+        print("="*60)
+        print(f"CREAZIONE {societa}_MASTRINO_PULITO")
+        print("="*60)
+
+        df = process_mesepermese(societa, fogli[societa])
 
-    df = process_intur_mesepermese()
+        if df is None:
+            continue
 
-    if df is not None:
         # Salva CSV locale
-        output_path = Path('output') / 'INTUR_mastrino_pulito.csv'
-        df.to_csv(output_path, index=False)
+        output_path = Path('output') / f'{societa}_mastrino_pulito.csv'
+        in_euro(df, IMPORTI_MASTRINO).to_csv(output_path, index=False)
         print(f"\nSalvato: {output_path}")
 
+        # Archivio colonnare, partizionato per societa/anno/mese
+        archivio.scrivi(df.assign(societa=societa, anno=args.anno), 'mastrino', ['societa', 'anno', 'mese'],
+                        importi=IMPORTI_MASTRINO)
+        print(f"Archiviato: {archivio.ARCHIVIO_DIR / 'mastrino'} (societa={societa}, anno={args.anno})")
+
         # Upload su Sheets
-        upload_to_sheets(df)
+        if not args.no_upload:
+            upload_to_sheets(df, f"{societa}_MASTRINO_PULITO", sync=args.sync)
 
-        print("\n" + "="*60)
-        print("COMPLETATO!")
-        print(f"https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}")
-        print("="*60)
+    print("\n" + "="*60)
+    print("COMPLETATO!")
+    print(f"https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}")
+    print("="*60)
 
 
 if __name__ == '__main__':
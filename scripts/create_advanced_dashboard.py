@@ -1,18 +1,66 @@
 #!/usr/bin/env python3
 """
 Advanced Dashboard Builder for ORTI/INTUR 2025
+
+Every KPI, trend, YTD, seasonality and BU-mix figure is computed locally by
+kpi.py from the dashboard CSVs in output/ (the same files upload_to_sheets.py
+publishes). Consolidated columns and trends use CONSOLIDATO (consolidamento.py).
+Each computed cell carries both its value and the equivalent Sheets formula,
+and --mode picks what gets published:
+
+- values (default): plain numbers, no cross-sheet formulas to recalculate
+- audit: the same numbers, with the formula behind each one as a cell note
+- formulas: live formulas on the *_Dashboard sheets
+
+Formulas come from formule.py: one array formula per row (or column) of a
+block over named ranges such as CONSOLIDATO_TOT_RICAVI, which Sheets spills
+into the cells next to it. Layouts follow ENTITIES and the number of months,
+so adding a company or changing the months moves columns, not formulas.
+
+The Scenario_2026 projections stay formulas in every mode, since they depend
+on the yellow input cells. verify_kpi.py evaluates every formula offline
+against the local values.
+
+All four sheets are queued on one sheets_batch.Batch and sent together at the
+end: one batchUpdate for sheets/formats/freezes/notes/named ranges and one
+values batchUpdate. With --sync the sheets are not cleared: current values are
+read in one call and only the changed cells are written.
 """
 
-import gspread
-from google.oauth2.service_account import Credentials
-from pathlib import Path
+import argparse
+from collections import namedtuple
+
+from gspread.utils import rowcol_to_a1
+
+import formule as f
+import kpi
+from consolidamento import CONSOLIDATO
+from importi import euro
+from mesepermese import SOCIETA
+from sheets_batch import Batch
+from sheets_client import SPREADSHEET_ID, apri
+
+# Consolidated figures come from CONSOLIDATO_Dashboard (written by
+# upload_to_sheets.py from consolidamento.py), not from adding up the
+# per-entity columns, so intercompany rent is not counted twice.
+ENTITIES = [*SOCIETA, CONSOLIDATO]
+
+MODES = ["values", "audit", "formulas"]
 
-SCRIPT_DIR = Path(__file__).parent
-PROJECT_DIR = SCRIPT_DIR.parent
-CONFIG_DIR = PROJECT_DIR / "config"
+MONTHS = ["Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic"]
 
-SPREADSHEET_ID = "1CAT_EN6DOXyT3vEbYmnwRQh1pWrdnrCXHFWR--JtFmQ"
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+BU_LABELS = [("Hotel", "HOTEL"), ("Angelina", "ANGELINA"), ("CVM", "CVM"), ("F&B", "F&B"),
+             ("Spiaggia", "SPIAGGIA"), ("Altri", "ALTRI_RICAVI")]
+COST_LABELS = [("Costi Fissi", "COSTI_FISSI"), ("Costi Variabili", "COSTI_VARIABILI"), ("Personale", "PERSONALE")]
+BU_PEAK = {"HOTEL": "Lug-Set", "ANGELINA": "Lug-Set", "CVM": "Lug-Set", "F&B": "Ago", "SPIAGGIA": "Lug-Ago",
+           "ALTRI_RICAVI": "Variabile"}
+
+# Scenario_2026 inputs: (row name, label, default) and quick scenarios (label, revenue growth, cost change)
+PARAMETERS = [("growth", "Crescita Ricavi %", 0.05), ("delta_fixed", "Δ Costi Fissi %", 0.03),
+              ("delta_variable", "Δ Costi Variabili %", 0.04), ("delta_staff", "Δ Personale %", 0.05)]
+SCENARIOS = [("Conservative", 0.02, 0.02), ("Base", 0.05, 0.04), ("Optimistic", 0.08, 0.05),
+             ("Aggressive", 0.12, 0.07)]
+SEPARATOR = "═══════════════════════════════════════════════════════════════"
 
 # Styles
 HEADER_BLUE = {"textFormat": {"bold": True, "foregroundColor": {"red": 1, "green": 1, "blue": 1}},
@@ -29,249 +77,435 @@ NUM_DELTA = {"numberFormat": {"type": "NUMBER", "pattern": "+€#,##0;-€#,##0"
 NUM_PCT_DELTA = {"numberFormat": {"type": "PERCENT", "pattern": "+0.0%;-0.0%"}}
 INPUT_CELL = {"backgroundColor": {"red": 1, "green": 0.95, "blue": 0.8}, "numberFormat": {"type": "PERCENT", "pattern": "0%"}}
 
+# A cell computed by kpi.py: the local value and the equivalent Sheets formula.
+# formula=None marks a cell filled by the array formula of a neighbouring cell:
+# in formulas mode it is written as None, which the upload leaves untouched.
+Calc = namedtuple("Calc", ["value", "formula"])
+
+
+def letter(index):
+    """Column letter, 0 -> A"""
+    return rowcol_to_a1(1, index + 1)[:-1]
+
+
+def span(first, count, row, last_row=None):
+    """A1 range of `count` columns from column index `first`, on row (or rows row..last_row)"""
+    return f"{letter(first)}{row}:{letter(first + count - 1)}{last_row or row}"
+
+
+def absolute(column, row):
+    """$C$5"""
+    return f"${column}${row}"
+
 
-def get_client():
-    credentials = Credentials.from_service_account_file(str(CONFIG_DIR / "hotelHops.json"), scopes=SCOPES)
-    return gspread.authorize(credentials)
+class Layout(list):
+    """
+    The rows of a sheet, with the rows of each named block in `at`
+    ({name: (first, last)}, 1-based), so formulas and formats refer to blocks
+    by name rather than by hardcoded A1 ranges.
+    """
 
+    def __init__(self):
+        super().__init__()
+        self.at = {}
 
-def get_or_create_sheet(spreadsheet, name, rows=100, cols=20):
-    try:
-        ws = spreadsheet.worksheet(name)
-        ws.clear()
-    except gspread.WorksheetNotFound:
-        ws = spreadsheet.add_worksheet(title=name, rows=rows, cols=cols)
+    @property
+    def next(self):
+        """Row number of the next row added"""
+        return len(self) + 1
+
+    def add(self, name, *rows):
+        if name is not None:
+            self.at[name] = (self.next, self.next + len(rows) - 1)
+        self.extend(rows)
+
+
+def spill(values, formula):
+    """Cells filled by one array formula: the formula sits in the first one"""
+    return [Calc(values[0], f.formula(formula))] + [Calc(v, None) for v in values[1:]]
+
+
+def spill_column(rows, column, values, formula):
+    """Like spill(), down `column` of consecutive `rows` (lists, extended in place)"""
+    for row, cell in zip(rows, spill(values, formula)):
+        row.extend([""] * (column - len(row)))
+        row.append(cell)
+    return rows
+
+
+def compute(dashboard):
+    """All the tables behind the four sheets, from kpi.py"""
+    tot = kpi.totali(dashboard)
+    return {
+        "kpi": kpi.kpi(tot),
+        "mix": kpi.mix_bu(tot),
+        "costs": kpi.struttura_costi(tot),
+        "tot": tot,
+        "trend": kpi.trend(dashboard[CONSOLIDATO]),
+        "season": kpi.stagionalita(dashboard[CONSOLIDATO]),
+    }
+
+
+def render(cell, mode):
+    if isinstance(cell, Calc):
+        return cell.formula if mode == "formulas" else cell.value
+    return cell
+
+
+def publish(ws, rows, mode):
+    """Write the rows in `mode`; in audit mode every computed value gets its formula as a note"""
+    ws.update(range_name="A1", values=[[render(c, mode) for c in row] for row in rows])
+    if mode == "audit":
+        ws.note([[(c.formula or "") if isinstance(c, Calc) else "" for c in row] for row in rows])
+    else:
+        ws.note()   # notes left by an earlier audit run
+
+
+def get_or_create_sheet(batch, name, rows=100, cols=20):
+    """Existing sheets are cleared (values only) and keep their size"""
+    ws = batch.foglio(name, rows=rows, cols=cols, ridimensiona=False)
+    ws.clear()
     return ws
 
 
-def create_kpi_dashboard(spreadsheet):
+def kpi_rows(t):
+    k, mix, costs, season = t["kpi"], t["mix"], t["costs"], t["season"]
+    n = len(ENTITIES)
+    first = 2                                   # C: first entity column
+    cons = letter(first + n - 1)                # consolidated column
+    share_col = first + n                       # % Mix / % Ricavi
+    sheet = Layout()
+
+    def annual(label, column, values):
+        return [label, ""] + spill([euro(values[e]) for e in ENTITIES], f.somme(column, ENTITIES))
+
+    def entities(name):
+        return span(first, n, *sheet.at[name])
+
+    def block(name, labels, table):
+        top, bottom = sheet.next, sheet.next + len(labels) - 1
+        rows = [annual(label, column, table.loc[column]) for label, column in labels]
+        shares = table.loc[[column for _, column in labels], "quota"].astype(float).tolist()
+        sheet.add(name, *spill_column(rows, share_col, shares, f.rapporto(
+            f"{cons}{top}:{cons}{bottom}", absolute(cons, sheet.at["revenue"][0]))))
+
+    sheet.add("title", ["🏨 HOTELOPS - KPI DASHBOARD 2025"], [""])
+    sheet.add("metrics_header", ["📈 KEY METRICS", ""] + ENTITIES)
+    sheet.add(None, [""])
+    sheet.add("revenue", annual("Ricavi Totali", "TOT_RICAVI", k["ricavi"]))
+    sheet.add("costs", annual("Costi Totali", "TOT_COSTI", k["costi"]))
+    sheet.add("ebitda", ["EBITDA", ""] + spill([euro(v) for v in k["ebitda"]],
+                                               f.vettore(f"{entities('revenue')}-{entities('costs')}")))
+    sheet.add("margin", ["Margine EBITDA %", ""] + spill(k["margine"].tolist(),
+                                                         f.rapporto(entities("ebitda"), entities("revenue"))))
+    sheet.add(None, [""])
+    sheet.add("bu_header", ["💰 RICAVI PER BU", ""] + list(SOCIETA) + ["TOTALE", "% Mix"])
+    sheet.add(None, [""])
+    block("bu", BU_LABELS, mix)
+    sheet.add(None, [""])
+    sheet.add("cost_header", ["📉 STRUTTURA COSTI", ""] + list(SOCIETA) + ["TOTALE", "% Ricavi"])
+    sheet.add(None, [""])
+    block("cost", COST_LABELS, costs)
+    sheet.add(None, [""])
+    sheet.add("season_header", ["🌞 STAGIONALITÀ", "", "Alta (Giu-Set)", "Bassa (Resto)", "Ratio"])
+    sheet.add(None, [""])
+    top, bottom = sheet.next, sheet.next + 1
+    high, low = letter(first), letter(first + 1)
+    sheet.add("season", *spill_column(
+        [["Ricavi Consolidati", ""] + spill([euro(v) for v in season.loc["ricavi", ["alta", "bassa"]]],
+                                            f.stagioni("TOT_RICAVI", CONSOLIDATO, kpi.ALTA_STAGIONE)),
+         ["EBITDA Consolidato", ""] + spill([euro(v) for v in season.loc["ebitda", ["alta", "bassa"]]],
+                                            f.stagioni("EBITDA", CONSOLIDATO, kpi.ALTA_STAGIONE))],
+        first + 2, season["rapporto"].astype(float).tolist(),
+        f.rapporto(f"{high}{top}:{high}{bottom}", f"{low}{top}:{low}{bottom}")))
+    return sheet
+
+
+def create_kpi_dashboard(batch, tables, mode):
     """KPI Dashboard with key metrics"""
     print("  Creating KPI Dashboard...")
-    ws = get_or_create_sheet(spreadsheet, "📊 KPI_2025", 50, 10)
-
-    data = [
-        ["🏨 HOTELOPS - KPI DASHBOARD 2025"],
-        [""],
-        ["📈 KEY METRICS", "", "ORTI", "INTUR", "CONSOLIDATO"],
-        [""],
-        ["Ricavi Totali", "", "=SUM(ORTI_Dashboard!H2:H13)", "=SUM(INTUR_Dashboard!H2:H13)", "=C5+D5"],
-        ["Costi Totali", "", "=SUM(ORTI_Dashboard!L2:L13)", "=SUM(INTUR_Dashboard!L2:L13)", "=C6+D6"],
-        ["EBITDA", "", "=C5-C6", "=D5-D6", "=E5-E6"],
-        ["Margine EBITDA %", "", "=C7/C5", "=D7/D5", "=E7/E5"],
-        [""],
-        ["💰 RICAVI PER BU", "", "ORTI", "INTUR", "TOTALE", "% Mix"],
-        [""],
-        ["Hotel", "", "=SUM(ORTI_Dashboard!B2:B13)", "=SUM(INTUR_Dashboard!B2:B13)", "=C12+D12", "=E12/$E$5"],
-        ["Angelina", "", "=SUM(ORTI_Dashboard!C2:C13)", "=SUM(INTUR_Dashboard!C2:C13)", "=C13+D13", "=E13/$E$5"],
-        ["CVM", "", "=SUM(ORTI_Dashboard!D2:D13)", "=SUM(INTUR_Dashboard!D2:D13)", "=C14+D14", "=E14/$E$5"],
-        ["F&B", "", "=SUM(ORTI_Dashboard!E2:E13)", "=SUM(INTUR_Dashboard!E2:E13)", "=C15+D15", "=E15/$E$5"],
-        ["Spiaggia", "", "=SUM(ORTI_Dashboard!F2:F13)", "=SUM(INTUR_Dashboard!F2:F13)", "=C16+D16", "=E16/$E$5"],
-        ["Altri", "", "=SUM(ORTI_Dashboard!G2:G13)", "=SUM(INTUR_Dashboard!G2:G13)", "=C17+D17", "=E17/$E$5"],
-        [""],
-        ["📉 STRUTTURA COSTI", "", "ORTI", "INTUR", "TOTALE", "% Ricavi"],
-        [""],
-        ["Costi Fissi", "", "=SUM(ORTI_Dashboard!I2:I13)", "=SUM(INTUR_Dashboard!I2:I13)", "=C21+D21", "=E21/$E$5"],
-        ["Costi Variabili", "", "=SUM(ORTI_Dashboard!J2:J13)", "=SUM(INTUR_Dashboard!J2:J13)", "=C22+D22", "=E22/$E$5"],
-        ["Personale", "", "=SUM(ORTI_Dashboard!K2:K13)", "=SUM(INTUR_Dashboard!K2:K13)", "=C23+D23", "=E23/$E$5"],
-        [""],
-        ["🌞 STAGIONALITÀ", "", "Alta (Giu-Set)", "Bassa (Resto)", "Ratio"],
-        [""],
-        ["Ricavi Consolidati", "", "=SUM(ORTI_Dashboard!H7:H10)+SUM(INTUR_Dashboard!H7:H10)",
-         "=SUM(ORTI_Dashboard!H2:H6)+SUM(ORTI_Dashboard!H11:H13)+SUM(INTUR_Dashboard!H2:H6)+SUM(INTUR_Dashboard!H11:H13)", "=C27/D27"],
-        ["EBITDA Consolidato", "", "=SUM(ORTI_Dashboard!M7:M10)+SUM(INTUR_Dashboard!M7:M10)",
-         "=SUM(ORTI_Dashboard!M2:M6)+SUM(ORTI_Dashboard!M11:M13)+SUM(INTUR_Dashboard!M2:M6)+SUM(INTUR_Dashboard!M11:M13)", "=IF(D28<>0,C28/D28,0)"],
-    ]
-    ws.update(range_name="A1", values=data)
+    n = len(ENTITIES)
+    ws = get_or_create_sheet(batch, "📊 KPI_2025", 50, max(10, n + 4))
+    sheet = kpi_rows(tables)
+    publish(ws, sheet, mode)
 
     # Formatting
     ws.format("A1", {"textFormat": {"bold": True, "fontSize": 16}})
-    ws.format("A3:F3", HEADER_BLUE)
-    ws.format("A10:F10", HEADER_GREEN)
-    ws.format("A19:F19", {"textFormat": {"bold": True}, "backgroundColor": {"red": 0.7, "green": 0.3, "blue": 0.3},
-                          "foregroundColor": {"red": 1, "green": 1, "blue": 1}})
-    ws.format("A25:E25", HEADER_ORANGE)
-    ws.format("C5:E7", NUM_EUR)
-    ws.format("C8:E8", NUM_PCT)
-    ws.format("C12:E17", NUM_EUR)
-    ws.format("F12:F17", NUM_PCT)
-    ws.format("C21:E23", NUM_EUR)
-    ws.format("F21:F23", NUM_PCT)
-    ws.format("C27:D28", NUM_EUR)
+    ws.format(span(0, n + 3, *sheet.at["metrics_header"]), HEADER_BLUE)
+    ws.format(span(0, n + 3, *sheet.at["bu_header"]), HEADER_GREEN)
+    ws.format(span(0, n + 3, *sheet.at["cost_header"]),
+              {"textFormat": {"bold": True, "foregroundColor": {"red": 1, "green": 1, "blue": 1}},
+               "backgroundColor": {"red": 0.7, "green": 0.3, "blue": 0.3}})
+    ws.format(span(0, 5, *sheet.at["season_header"]), HEADER_ORANGE)
+    ws.format(span(2, n, sheet.at["revenue"][0], sheet.at["ebitda"][1]), NUM_EUR)
+    ws.format(span(2, n, *sheet.at["margin"]), NUM_PCT)
+    for block in ("bu", "cost"):
+        ws.format(span(2, n, *sheet.at[block]), NUM_EUR)
+        ws.format(span(2 + n, 1, *sheet.at[block]), NUM_PCT)
+    ws.format(span(2, 2, *sheet.at["season"]), NUM_EUR)
     ws.freeze(rows=1)
-    print("    ✓ Done")
+    print("    ✓ Queued")
+
+
+def trends_rows(t):
+    tr = t["trend"]
+    m = len(tr)
+    tot = t["kpi"].loc[CONSOLIDATO]
+    labels = [MONTHS[month - 1] for month in tr.index]
+    sheet = Layout()
+
+    def months(name):
+        return span(1, m, *sheet.at[name])
+
+    def with_total(name):
+        return span(1, m + 1, *sheet.at[name])
+
+    sheet.add("title", ["📈 TREND MENSILI CONSOLIDATO 2025"], [""])
+    sheet.add("header", [""] + labels + ["TOTALE"])
+    sheet.add("revenue", ["Ricavi"] + spill([euro(v) for v in [*tr["ricavi"], tot["ricavi"]]],
+                                            f.con_totale("TOT_RICAVI", CONSOLIDATO)))
+    sheet.add("costs", ["Costi"] + spill([euro(v) for v in [*tr["costi"], tot["costi"]]],
+                                         f.con_totale("TOT_COSTI", CONSOLIDATO)))
+    sheet.add("ebitda", ["EBITDA"] + spill([euro(v) for v in [*tr["ebitda"], tot["ebitda"]]],
+                                           f.vettore(f"{with_total('revenue')}-{with_total('costs')}")))
+    sheet.add("margin", ["Margine %"] + spill([*tr["margine"], tot["margine"]],
+                                              f.rapporto(with_total("ebitda"), with_total("revenue"))))
+    sheet.add(None, [""])
+    sheet.add("ytd_header", ["YTD CUMULATO"] + labels)
+    sheet.add("revenue_ytd", ["Ricavi Cum."] + spill([euro(v) for v in tr["ricavi_ytd"]], f.cumulato(months("revenue"))))
+    sheet.add("ebitda_ytd", ["EBITDA Cum."] + spill([euro(v) for v in tr["ebitda_ytd"]], f.cumulato(months("ebitda"))))
+    return sheet
 
 
-def create_monthly_trends(spreadsheet):
+def create_monthly_trends(batch, tables, mode):
     """Monthly trends analysis"""
     print("  Creating Monthly Trends...")
-    ws = get_or_create_sheet(spreadsheet, "📈 Trends", 20, 15)
-
-    data = [
-        ["📈 TREND MENSILI CONSOLIDATO 2025"],
-        [""],
-        ["", "Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic", "TOTALE"],
-        ["Ricavi", "=ORTI_Dashboard!H2+INTUR_Dashboard!H2", "=ORTI_Dashboard!H3+INTUR_Dashboard!H3",
-         "=ORTI_Dashboard!H4+INTUR_Dashboard!H4", "=ORTI_Dashboard!H5+INTUR_Dashboard!H5",
-         "=ORTI_Dashboard!H6+INTUR_Dashboard!H6", "=ORTI_Dashboard!H7+INTUR_Dashboard!H7",
-         "=ORTI_Dashboard!H8+INTUR_Dashboard!H8", "=ORTI_Dashboard!H9+INTUR_Dashboard!H9",
-         "=ORTI_Dashboard!H10+INTUR_Dashboard!H10", "=ORTI_Dashboard!H11+INTUR_Dashboard!H11",
-         "=ORTI_Dashboard!H12+INTUR_Dashboard!H12", "=ORTI_Dashboard!H13+INTUR_Dashboard!H13", "=SUM(B4:M4)"],
-        ["Costi", "=ORTI_Dashboard!L2+INTUR_Dashboard!L2", "=ORTI_Dashboard!L3+INTUR_Dashboard!L3",
-         "=ORTI_Dashboard!L4+INTUR_Dashboard!L4", "=ORTI_Dashboard!L5+INTUR_Dashboard!L5",
-         "=ORTI_Dashboard!L6+INTUR_Dashboard!L6", "=ORTI_Dashboard!L7+INTUR_Dashboard!L7",
-         "=ORTI_Dashboard!L8+INTUR_Dashboard!L8", "=ORTI_Dashboard!L9+INTUR_Dashboard!L9",
-         "=ORTI_Dashboard!L10+INTUR_Dashboard!L10", "=ORTI_Dashboard!L11+INTUR_Dashboard!L11",
-         "=ORTI_Dashboard!L12+INTUR_Dashboard!L12", "=ORTI_Dashboard!L13+INTUR_Dashboard!L13", "=SUM(B5:M5)"],
-        ["EBITDA", "=B4-B5", "=C4-C5", "=D4-D5", "=E4-E5", "=F4-F5", "=G4-G5",
-         "=H4-H5", "=I4-I5", "=J4-J5", "=K4-K5", "=L4-L5", "=M4-M5", "=SUM(B6:M6)"],
-        ["Margine %", "=IF(B4=0,0,B6/B4)", "=IF(C4=0,0,C6/C4)", "=IF(D4=0,0,D6/D4)", "=IF(E4=0,0,E6/E4)",
-         "=IF(F4=0,0,F6/F4)", "=IF(G4=0,0,G6/G4)", "=IF(H4=0,0,H6/H4)", "=IF(I4=0,0,I6/I4)",
-         "=IF(J4=0,0,J6/J4)", "=IF(K4=0,0,K6/K4)", "=IF(L4=0,0,L6/L4)", "=IF(M4=0,0,M6/M4)", "=IF(N4=0,0,N6/N4)"],
-        [""],
-        ["YTD CUMULATO", "Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago", "Set", "Ott", "Nov", "Dic"],
-        ["Ricavi Cum.", "=B4", "=B10+C4", "=C10+D4", "=D10+E4", "=E10+F4", "=F10+G4",
-         "=G10+H4", "=H10+I4", "=I10+J4", "=J10+K4", "=K10+L4", "=L10+M4"],
-        ["EBITDA Cum.", "=B6", "=B11+C6", "=C11+D6", "=D11+E6", "=E11+F6", "=F11+G6",
-         "=G11+H6", "=H11+I6", "=I11+J6", "=J11+K6", "=K11+L6", "=L11+M6"],
-    ]
-    ws.update(range_name="A1", values=data)
+    m = len(tables["trend"])
+    ws = get_or_create_sheet(batch, "📈 Trends", 20, max(15, m + 3))
+    sheet = trends_rows(tables)
+    publish(ws, sheet, mode)
 
     ws.format("A1", {"textFormat": {"bold": True, "fontSize": 16}})
-    ws.format("A3:N3", HEADER_BLUE)
-    ws.format("A9:M9", HEADER_GRAY)
-    ws.format("B4:N6", NUM_EUR)
-    ws.format("B7:N7", NUM_PCT)
-    ws.format("B10:M11", NUM_EUR)
-    print("    ✓ Done")
+    ws.format(span(0, m + 2, *sheet.at["header"]), HEADER_BLUE)
+    ws.format(span(0, m + 1, *sheet.at["ytd_header"]), HEADER_GRAY)
+    ws.format(span(1, m + 1, sheet.at["revenue"][0], sheet.at["ebitda"][1]), NUM_EUR)
+    ws.format(span(1, m + 1, *sheet.at["margin"]), NUM_PCT)
+    ws.format(span(1, m, sheet.at["revenue_ytd"][0], sheet.at["ebitda_ytd"][1]), NUM_EUR)
+    print("    ✓ Queued")
+
+
+def scenario_rows(t):
+    tot, k = t["tot"], t["kpi"]
+    n = len(ENTITIES)
+    s = len(SCENARIOS)
+    cons = letter(1 + n)                        # consolidated column
+    delta = letter(2 + n)
+    sheet = Layout()
+
+    def cols(name):
+        """Entity columns C.. on the row of `name`"""
+        return span(2, n, *sheet.at[name])
+
+    def param(name):
+        return absolute("C", sheet.at[name][0])
+
+    def baseline(name, label, column):
+        sheet.add(name, [label, ""] + spill([euro(tot.loc[e, column]) for e in ENTITIES], f.somme(column, ENTITIES)))
+
+    def projection(name, label, expression, base=None, pct=None):
+        # Live formulas on the yellow inputs in every mode: one array formula per row
+        row, base = sheet.next, sheet.at[base or f"base_{name}"][0]
+        pct = f"={delta}{row}/{cons}{base}" if pct is None else pct
+        sheet.add(name, [label, "", f.formula(f.vettore(expression))] + [""] * (n - 1) + [
+            f"={cons}{row}-{cons}{base}", pct])
+
+    sheet.add("title", ["🔮 SCENARIO BUILDER 2026"], [""])
+    sheet.add("params_header", ["⚙️ PARAMETRI (modifica celle gialle)", "", "Valore"])
+    sheet.add(None, [""])
+    for name, label, value in PARAMETERS:
+        sheet.add(name, [label, "", value])
+    sheet.add(None, [""], [SEPARATOR], [""])
+    sheet.add("base_header", ["📊 BASELINE 2025", ""] + ENTITIES)
+    sheet.add(None, [""])
+    baseline("base_revenue", "Ricavi", "TOT_RICAVI")
+    baseline("base_fixed", "Costi Fissi", "COSTI_FISSI")
+    baseline("base_variable", "Costi Variabili", "COSTI_VARIABILI")
+    baseline("base_staff", "Personale", "PERSONALE")
+    sheet.add("base_costs", ["Costi Totali", ""] + spill(
+        [euro(v) for v in k["costi"]], f.vettore(f"{cols('base_fixed')}+{cols('base_variable')}+{cols('base_staff')}")))
+    sheet.add("base_ebitda", ["EBITDA", ""] + spill(
+        [euro(v) for v in k["ebitda"]], f.vettore(f"{cols('base_revenue')}-{cols('base_costs')}")))
+    sheet.add("base_margin", ["Margine %", ""] + spill(
+        k["margine"].tolist(), f.rapporto(cols("base_ebitda"), cols("base_revenue"))))
+    sheet.add(None, [""], [SEPARATOR], [""])
+    sheet.add("projection_header", ["🚀 PROIEZIONE 2026", ""] + ENTITIES + ["Δ €", "Δ %"])
+    sheet.add(None, [""])
+    projection("revenue", "Ricavi", f"{cols('base_revenue')}*(1+{param('growth')})")
+    projection("fixed", "Costi Fissi", f"{cols('base_fixed')}*(1+{param('delta_fixed')})")
+    projection("variable", "Costi Variabili", f"{cols('base_variable')}*(1+{param('delta_variable')})")
+    projection("staff", "Personale", f"{cols('base_staff')}*(1+{param('delta_staff')})")
+    projection("costs", "Costi Totali", f"{cols('fixed')}+{cols('variable')}+{cols('staff')}")
+    base = sheet.at["base_ebitda"][0]
+    projection("ebitda", "EBITDA", f"{cols('revenue')}-{cols('costs')}",
+               pct=f"=IF({cons}{base}<>0,{delta}{sheet.next}/{cons}{base},0)")
+    projection("margin", "Margine %", f"{cols('ebitda')}/{cols('revenue')}", base="base_margin", pct="")
+    sheet.add(None, [""], [SEPARATOR], [""])
+    sheet.add("scenarios_header", ["📋 SCENARI RAPIDI", ""] + [label for label, *_ in SCENARIOS])
+    sheet.add(None, [""])
+    sheet.add("scenario_growth", ["Crescita Ricavi", ""] + [growth for _, growth, _ in SCENARIOS])
+    sheet.add("scenario_costs", ["Δ Costi", ""] + [costs for *_, costs in SCENARIOS])
+    sheet.add(None, [""])
 
+    def scenarios(name):
+        return span(2, s, *sheet.at[name])
 
-def create_scenario_builder(spreadsheet):
+    revenue = f"{cons}{sheet.at['base_revenue'][0]}*(1+{scenarios('scenario_growth')})"
+    sheet.add("scenario_ebitda", ["EBITDA 2026", "", f.formula(f.vettore(
+        f"{revenue}-{cons}{sheet.at['base_costs'][0]}*(1+{scenarios('scenario_costs')})"))])
+    sheet.add("scenario_margin", ["Margine %", "", f.formula(f.vettore(f"{scenarios('scenario_ebitda')}/({revenue})"))])
+    sheet.add("scenario_delta", ["Δ vs 2025", "", f.formula(f.vettore(
+        f"{scenarios('scenario_ebitda')}-{cons}{sheet.at['base_ebitda'][0]}"))])
+    return sheet
+
+
+def create_scenario_builder(batch, tables, mode):
     """2026 scenario projection builder"""
     print("  Creating 2026 Scenario Builder...")
-    ws = get_or_create_sheet(spreadsheet, "🔮 Scenario_2026", 50, 12)
-
-    data = [
-        ["🔮 SCENARIO BUILDER 2026"],
-        [""],
-        ["⚙️ PARAMETRI (modifica celle gialle)", "", "Valore"],
-        [""],
-        ["Crescita Ricavi %", "", "5%"],
-        ["Δ Costi Fissi %", "", "3%"],
-        ["Δ Costi Variabili %", "", "4%"],
-        ["Δ Personale %", "", "5%"],
-        [""],
-        ["═══════════════════════════════════════════════════════════════"],
-        [""],
-        ["📊 BASELINE 2025", "", "ORTI", "INTUR", "CONSOLIDATO"],
-        [""],
-        ["Ricavi", "", "=SUM(ORTI_Dashboard!H2:H13)", "=SUM(INTUR_Dashboard!H2:H13)", "=C14+D14"],
-        ["Costi Fissi", "", "=SUM(ORTI_Dashboard!I2:I13)", "=SUM(INTUR_Dashboard!I2:I13)", "=C15+D15"],
-        ["Costi Variabili", "", "=SUM(ORTI_Dashboard!J2:J13)", "=SUM(INTUR_Dashboard!J2:J13)", "=C16+D16"],
-        ["Personale", "", "=SUM(ORTI_Dashboard!K2:K13)", "=SUM(INTUR_Dashboard!K2:K13)", "=C17+D17"],
-        ["Costi Totali", "", "=C15+C16+C17", "=D15+D16+D17", "=E15+E16+E17"],
-        ["EBITDA", "", "=C14-C18", "=D14-D18", "=E14-E18"],
-        ["Margine %", "", "=C19/C14", "=D19/D14", "=E19/E14"],
-        [""],
-        ["═══════════════════════════════════════════════════════════════"],
-        [""],
-        ["🚀 PROIEZIONE 2026", "", "ORTI", "INTUR", "CONSOLIDATO", "Δ €", "Δ %"],
-        [""],
-        ["Ricavi", "", "=C14*(1+$C$5)", "=D14*(1+$C$5)", "=C26+D26", "=E26-E14", "=F26/E14"],
-        ["Costi Fissi", "", "=C15*(1+$C$6)", "=D15*(1+$C$6)", "=C27+D27", "=E27-E15", "=F27/E15"],
-        ["Costi Variabili", "", "=C16*(1+$C$7)", "=D16*(1+$C$7)", "=C28+D28", "=E28-E16", "=F28/E16"],
-        ["Personale", "", "=C17*(1+$C$8)", "=D17*(1+$C$8)", "=C29+D29", "=E29-E17", "=F29/E17"],
-        ["Costi Totali", "", "=C27+C28+C29", "=D27+D28+D29", "=E27+E28+E29", "=E30-E18", "=F30/E18"],
-        ["EBITDA", "", "=C26-C30", "=D26-D30", "=E26-E30", "=E31-E19", "=IF(E19<>0,F31/E19,0)"],
-        ["Margine %", "", "=C31/C26", "=D31/D26", "=E31/E26", "=E32-E20", ""],
-        [""],
-        ["═══════════════════════════════════════════════════════════════"],
-        [""],
-        ["📋 SCENARI RAPIDI", "", "Conservative", "Base", "Optimistic", "Aggressive"],
-        [""],
-        ["Crescita Ricavi", "", "2%", "5%", "8%", "12%"],
-        ["Δ Costi", "", "2%", "4%", "5%", "7%"],
-        [""],
-        ["EBITDA 2026", "",
-         "=E14*(1+C38)-E18*(1+C39)", "=E14*(1+D38)-E18*(1+D39)",
-         "=E14*(1+E38)-E18*(1+E39)", "=E14*(1+F38)-E18*(1+F39)"],
-        ["Margine %", "",
-         "=C41/(E14*(1+C38))", "=D41/(E14*(1+D38))", "=E41/(E14*(1+E38))", "=F41/(E14*(1+F38))"],
-        ["Δ vs 2025", "", "=C41-E19", "=D41-E19", "=E41-E19", "=F41-E19"],
-    ]
-    ws.update(range_name="A1", values=data)
+    n = len(ENTITIES)
+    s = len(SCENARIOS)
+    ws = get_or_create_sheet(batch, "🔮 Scenario_2026", 50, max(12, n + 6))
+    sheet = scenario_rows(tables)
+    publish(ws, sheet, mode)
+
+    def rows(first, last):
+        return sheet.at[first][0], sheet.at[last][1]
 
     ws.format("A1", {"textFormat": {"bold": True, "fontSize": 16}})
-    ws.format("A3", {"textFormat": {"bold": True}})
-    ws.format("C5:C8", INPUT_CELL)
-    ws.format("A12:E12", HEADER_BLUE)
-    ws.format("A24:G24", HEADER_GREEN)
-    ws.format("A36:F36", HEADER_ORANGE)
-    ws.format("C14:E20", NUM_EUR)
-    ws.format("C20:E20", NUM_PCT)
-    ws.format("C26:E32", NUM_EUR)
-    ws.format("F26:F31", NUM_DELTA)
-    ws.format("G26:G31", NUM_PCT_DELTA)
-    ws.format("C32:E32", NUM_PCT)
-    ws.format("C38:F39", NUM_PCT)
-    ws.format("C41:F41", NUM_EUR)
-    ws.format("C42:F42", NUM_PCT)
-    ws.format("C43:F43", NUM_DELTA)
+    ws.format(span(0, 1, *sheet.at["params_header"]), {"textFormat": {"bold": True}})
+    ws.format(span(2, 1, *rows(PARAMETERS[0][0], PARAMETERS[-1][0])), INPUT_CELL)
+    ws.format(span(0, n + 2, *sheet.at["base_header"]), HEADER_BLUE)
+    ws.format(span(0, n + 4, *sheet.at["projection_header"]), HEADER_GREEN)
+    ws.format(span(0, s + 2, *sheet.at["scenarios_header"]), HEADER_ORANGE)
+    ws.format(span(2, n, *rows("base_revenue", "base_ebitda")), NUM_EUR)
+    ws.format(span(2, n, *sheet.at["base_margin"]), NUM_PCT)
+    ws.format(span(2, n, *rows("revenue", "ebitda")), NUM_EUR)
+    ws.format(span(2 + n, 1, *rows("revenue", "ebitda")), NUM_DELTA)
+    ws.format(span(3 + n, 1, *rows("revenue", "ebitda")), NUM_PCT_DELTA)
+    ws.format(span(2, n, *sheet.at["margin"]), NUM_PCT)
+    ws.format(span(2, s, *rows("scenario_growth", "scenario_costs")), NUM_PCT)
+    ws.format(span(2, s, *sheet.at["scenario_ebitda"]), NUM_EUR)
+    ws.format(span(2, s, *sheet.at["scenario_margin"]), NUM_PCT)
+    ws.format(span(2, s, *sheet.at["scenario_delta"]), NUM_DELTA)
     ws.freeze(rows=1)
-    print("    ✓ Done")
+    print("    ✓ Queued")
+
+
+def bu_rows(t):
+    mix, k = t["mix"], t["kpi"]
+    n = len(ENTITIES)
+    first, second = list(SOCIETA)[:2]
+    pair = [first, second]
+    cons = letter(n)                            # entities from B, consolidated last
+    sheet = Layout()
+
+    sheet.add("title", ["🏢 DETTAGLIO BUSINESS UNIT 2025"], [""])
+    sheet.add("header", ["BU", *SOCIETA, "TOTALE", "% Mix", "Stagione Peak"])
+    sheet.add(None, [""])
+
+    top, bottom = sheet.next, sheet.next + len(BU_LABELS) - 1
+    rows = [[label] + spill([euro(mix.loc[bu, e]) for e in ENTITIES], f.somme(bu, ENTITIES)) for label, bu in BU_LABELS]
+    # Mix on consolidated revenue, like kpi.mix_bu(), not on the BUs listed here
+    spill_column(rows, n + 1, mix.loc[[bu for _, bu in BU_LABELS], "quota"].astype(float).tolist(),
+                 f.rapporto(f"{cons}{top}:{cons}{bottom}", f"SUM({f.nome_intervallo(CONSOLIDATO, 'TOT_RICAVI')})"))
+    for row, (_, bu) in zip(rows, BU_LABELS):
+        row.append(BU_PEAK[bu])
+    sheet.add("bu", *rows)
+    shown = mix.loc[[bu for _, bu in BU_LABELS]]
+    sheet.add("total", ["TOTALE"] + spill([euro(shown[e].sum()) for e in ENTITIES],
+                                          f.somme_colonne(span(1, n, *sheet.at["bu"]))) + ["100%", ""])
+    sheet.add(None, [""])
+    sheet.add("performance_header", [f"PERFORMANCE {first} vs {second}", "", first, second, "Δ", "Note"])
+    sheet.add(None, [""])
 
+    def pair_cols(row):
+        return span(2, 2, row)
 
-def create_bu_breakdown(spreadsheet):
+    revenue, ebitda = sheet.next, sheet.next + 1
+    performance = [
+        ["Ricavi Totali", ""] + spill([euro(k.loc[e, "ricavi"]) for e in pair], f.somme("TOT_RICAVI", pair)),
+        ["EBITDA", ""] + spill([euro(k.loc[e, "ebitda"]) for e in pair], f.somme("EBITDA", pair)),
+        ["Margine %", ""] + spill([float(k.loc[e, "margine"]) for e in pair],
+                                  f.rapporto(pair_cols(ebitda), pair_cols(revenue))),
+        ["Personale/Ricavi", ""] + spill([float(k.loc[e, "incidenza_personale"]) for e in pair],
+                                         f.rapporto(f.somme("PERSONALE", pair), pair_cols(revenue))),
+    ]
+    deltas = [euro(k.loc[first, "ricavi"] - k.loc[second, "ricavi"]),
+              euro(k.loc[first, "ebitda"] - k.loc[second, "ebitda"]),
+              float(k.loc[first, "margine"] - k.loc[second, "margine"]),
+              float(k.loc[first, "incidenza_personale"] - k.loc[second, "incidenza_personale"])]
+    last = revenue + len(performance) - 1
+    spill_column(performance, 4, deltas, f.vettore(f"{span(2, 1, revenue, last)}-{span(3, 1, revenue, last)}"))
+    for row in performance:
+        row.append("")
+    sheet.add("performance_amounts", *performance[:2])
+    sheet.add("performance_ratios", *performance[2:])
+    return sheet
+
+
+def create_bu_breakdown(batch, tables, mode):
     """Business Unit breakdown"""
     print("  Creating BU Breakdown...")
-    ws = get_or_create_sheet(spreadsheet, "🏢 BU_Detail", 30, 10)
-
-    data = [
-        ["🏢 DETTAGLIO BUSINESS UNIT 2025"],
-        [""],
-        ["BU", "ORTI", "INTUR", "TOTALE", "% Mix", "Stagione Peak"],
-        [""],
-        ["Hotel", "=SUM(ORTI_Dashboard!B2:B13)", "=SUM(INTUR_Dashboard!B2:B13)", "=B5+C5", "=D5/$D$11", "Lug-Set"],
-        ["Angelina", "=SUM(ORTI_Dashboard!C2:C13)", "=SUM(INTUR_Dashboard!C2:C13)", "=B6+C6", "=D6/$D$11", "Lug-Set"],
-        ["CVM", "=SUM(ORTI_Dashboard!D2:D13)", "=SUM(INTUR_Dashboard!D2:D13)", "=B7+C7", "=D7/$D$11", "Lug-Set"],
-        ["F&B", "=SUM(ORTI_Dashboard!E2:E13)", "=SUM(INTUR_Dashboard!E2:E13)", "=B8+C8", "=D8/$D$11", "Ago"],
-        ["Spiaggia", "=SUM(ORTI_Dashboard!F2:F13)", "=SUM(INTUR_Dashboard!F2:F13)", "=B9+C9", "=D9/$D$11", "Lug-Ago"],
-        ["Altri", "=SUM(ORTI_Dashboard!G2:G13)", "=SUM(INTUR_Dashboard!G2:G13)", "=B10+C10", "=D10/$D$11", "Variabile"],
-        ["TOTALE", "=SUM(B5:B10)", "=SUM(C5:C10)", "=SUM(D5:D10)", "100%", ""],
-        [""],
-        ["PERFORMANCE ORTI vs INTUR", "", "ORTI", "INTUR", "Δ", "Note"],
-        [""],
-        ["Ricavi Totali", "", "=SUM(ORTI_Dashboard!H2:H13)", "=SUM(INTUR_Dashboard!H2:H13)", "=C15-D15", ""],
-        ["EBITDA", "", "=SUM(ORTI_Dashboard!M2:M13)", "=SUM(INTUR_Dashboard!M2:M13)", "=C16-D16", ""],
-        ["Margine %", "", "=C16/C15", "=D16/D15", "=C17-D17", ""],
-        ["Personale/Ricavi", "", "=SUM(ORTI_Dashboard!K2:K13)/C15", "=SUM(INTUR_Dashboard!K2:K13)/D15", "=C18-D18", ""],
-    ]
-    ws.update(range_name="A1", values=data)
+    n = len(ENTITIES)
+    ws = get_or_create_sheet(batch, "🏢 BU_Detail", 30, max(10, n + 4))
+    sheet = bu_rows(tables)
+    publish(ws, sheet, mode)
 
     ws.format("A1", {"textFormat": {"bold": True, "fontSize": 16}})
-    ws.format("A3:F3", HEADER_BLUE)
-    ws.format("A11:F11", HEADER_GRAY)
-    ws.format("A13:F13", HEADER_GREEN)
-    ws.format("B5:D11", NUM_EUR)
-    ws.format("E5:E10", NUM_PCT)
-    ws.format("C15:E16", NUM_EUR)
-    ws.format("C17:E18", NUM_PCT)
-    print("    ✓ Done")
+    ws.format(span(0, n + 3, *sheet.at["header"]), HEADER_BLUE)
+    ws.format(span(0, n + 3, *sheet.at["total"]), HEADER_GRAY)
+    ws.format(span(0, 6, *sheet.at["performance_header"]), HEADER_GREEN)
+    ws.format(span(1, n, sheet.at["bu"][0], sheet.at["total"][1]), NUM_EUR)
+    ws.format(span(1 + n, 1, *sheet.at["bu"]), NUM_PCT)
+    ws.format(span(2, 3, *sheet.at["performance_amounts"]), NUM_EUR)
+    ws.format(span(2, 3, *sheet.at["performance_ratios"]), NUM_PCT)
+    print("    ✓ Queued")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Create KPI, Trends, Scenario and BU sheets")
+    parser.add_argument("--mode", choices=MODES, default="values",
+                        help="values: numbers computed locally (default); audit: numbers with their formula "
+                             "as a note; formulas: live array formulas on named ranges")
+    parser.add_argument("--sync", action="store_true", help="Write only the cells that changed")
+    parser.add_argument("--credentials", "-c", help="Service account JSON (default: see sheets_client.py)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🚀 CREATING ADVANCED DASHBOARDS")
     print("=" * 60)
 
-    gc = get_client()
-    spreadsheet = gc.open_by_key(SPREADSHEET_ID)
+    dashboards = kpi.carica_dashboard(ENTITIES)
+    tables = compute(dashboards)
+    print(f"\nKPI computed locally ({', '.join(ENTITIES)}), mode: {args.mode}")
+
+    spreadsheet = apri(SPREADSHEET_ID, args.credentials)
     print(f"\nSpreadsheet: {spreadsheet.title}")
+
+    batch = Batch(spreadsheet, incrementale=args.sync)
+    if args.mode != "values":
+        missing = f.definisci_intervalli(batch, {e: len(df) for e, df in dashboards.items()})
+        if missing:
+            print(f"  ⚠️  Missing {', '.join(missing)}: run upload_to_sheets.py first")
+
     print("\nCreating sheets...")
+    create_kpi_dashboard(batch, tables, args.mode)
+    create_monthly_trends(batch, tables, args.mode)
+    create_scenario_builder(batch, tables, args.mode)
+    create_bu_breakdown(batch, tables, args.mode)
 
-    create_kpi_dashboard(spreadsheet)
-    create_monthly_trends(spreadsheet)
-    create_scenario_builder(spreadsheet)
-    create_bu_breakdown(spreadsheet)
+    print("\nSending...")
+    requests = batch.flush()
+    print(f"    ✓ {requests} requests" + (f", {batch.celle} cells changed" if args.sync else ""))
 
     print("\n" + "=" * 60)
     print("✅ ALL DASHBOARDS CREATED!")
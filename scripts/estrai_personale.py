@@ -2,7 +2,8 @@
 """
 Estrae costi personale dai file prospetti contabili (PC)
 Fonte: data/personale/PROSPETTO ORTI/*.xlsx e data/personale/PROSPETTO INTUR/*.xlsx
-Output: output/personale_mensile.csv
+Output: output/archivio/personale/ (Parquet per societa/anno/mese, vedi personale_store.py),
+        output/personale_dettaglio.csv, output/personale_mensile.csv (per anno/mese)
 
 Tipi file:
 - *_PC_MM_YYYY.xlsx: dipendenti fissi
@@ -13,12 +14,40 @@ Tipi file:
 Output separato:
 - RETRIBUZIONI: stipendi puri
 - ONERI: contributi, accantonamenti, TFR, trasferte
+
+Gli importi sono sommati in centesimi interi (importi.py), quindi i totali
+sono esatti; nei CSV sono scritti in euro.
+
+I risultati per file sono in cache (output/cache/personale.json), indicizzati
+per hash del contenuto: a ogni esecuzione si rileggono solo i file nuovi o
+modificati. La cache si invalida da sola se cambiano le liste voci.
+
+USAGE:
+    python scripts/estrai_personale.py
+    python scripts/estrai_personale.py --workers 4
+    python scripts/estrai_personale.py --force      # ignora la cache
 """
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from openpyxl import load_workbook
 from pathlib import Path
 import re
 
+from cache import carica_manifest, hash_file, hash_valore, salva_manifest
+from importi import centesimi, euro, in_euro
+import personale_store
+
+# Da incrementare quando cambia la logica di estrazione (invalida la cache)
+VERSIONE_ESTRAZIONE = 3
+
+# Società: directory dei prospetti e pattern dei file PC
+SOCIETA = {
+    'ORTI': ('PROSPETTO ORTI', 'ORT_PC*.xlsx'),
+    'INTUR': ('PROSPETTO INTUR', 'INT_PC*.xlsx'),
+}
+
 # RETRIBUZIONI = stipendi puri
 VOCI_RETRIBUZIONI = [
     'Retribuzioni',
@@ -42,6 +71,9 @@ VOCI_ONERI = [
     'Oneri previd. Accant. 14ma',
 ]
 
+# Colonne di FoglioDati effettivamente usate
+COLONNE_FOGLIO_DATI = ['Tipo conto', 'Descrizione', 'Dare', 'Avere', 'Mese', 'Anno']
+
 # Voci esplicitamente escluse
 VOCI_ESCLUSE = [
     'Accanton. Ferie',
@@ -50,52 +82,110 @@ VOCI_ESCLUSE = [
 ]
 
 
-def estrai_personale(file_path: Path) -> dict:
-    """Estrae costo personale da un file PC, separando retribuzioni da oneri"""
-    df = pd.read_excel(file_path, sheet_name='FoglioDati')
-
-    # Filtra solo Tipo conto = 'E' (Economico)
-    df_eco = df[df['Tipo conto'] == 'E'].copy()
-
-    # Calcola saldo per ogni voce
-    retribuzioni = 0.0
-    oneri = 0.0
-    dettaglio = {}
+def _compila_prefissi(voci: list) -> re.Pattern:
+    """Compila una lista di voci in un'unica regex ancorata (equivale a startswith)"""
+    return re.compile('|'.join(re.escape(v) for v in voci) or r'(?!)')
+
+
+def compila_classificatore() -> list:
+    """
+    Compila le liste voci in regole (categoria, regex), valutate in ordine.
+    Le voci escluse hanno priorità, poi retribuzioni, poi oneri.
+    """
+    return [
+        (None, _compila_prefissi(VOCI_ESCLUSE)),
+        ('RETRIBUZIONI', _compila_prefissi(VOCI_RETRIBUZIONI)),
+        ('ONERI', _compila_prefissi(VOCI_ONERI)),
+    ]
+
+
+CLASSIFICATORE = compila_classificatore()
+
+
+def classifica_voci(descrizioni: pd.Series) -> pd.Series:
+    """Assegna la categoria (RETRIBUZIONI/ONERI/None) a un'intera colonna di descrizioni"""
+    categoria = pd.Series(None, index=descrizioni.index, dtype=object)
+    libere = pd.Series(True, index=descrizioni.index)
+    for cat, regex in CLASSIFICATORE:
+        match = libere & descrizioni.str.match(regex, na=False)
+        categoria[match] = cat
+        libere &= ~match
+    return categoria
+
+
+def calcola_costi(df_eco: pd.DataFrame) -> tuple:
+    """
+    Calcola retribuzioni, oneri e dettaglio per voce dalle righe economiche
+    di FoglioDati. Importi in centesimi (int).
+    """
+    desc = df_eco['Descrizione'].astype(str).str.strip()
+    saldo = centesimi(df_eco['Dare']) - centesimi(df_eco['Avere'])
+    categoria = classifica_voci(desc)
+
+    retribuzioni = int(saldo[categoria == 'RETRIBUZIONI'].sum())
+    oneri = int(saldo[categoria == 'ONERI'].sum())
+
+    # Descrizioni ripetute: ordine della prima occorrenza, importo dell'ultima (come il ciclo originale)
+    classificate = categoria.notna()
+    voci = pd.DataFrame({
+        'categoria': categoria[classificate],
+        'importo': saldo[classificate],
+    }).groupby(desc[classificate], sort=False).last()
+    dettaglio = {
+        d: {'categoria': c, 'importo': int(v)}
+        for d, c, v in zip(voci.index, voci['categoria'], voci['importo'])
+    }
 
-    for _, row in df_eco.iterrows():
-        desc = str(row['Descrizione']).strip()
-        dare = float(row['Dare']) if pd.notna(row['Dare']) else 0.0
-        avere = float(row['Avere']) if pd.notna(row['Avere']) else 0.0
-        saldo = dare - avere
+    return retribuzioni, oneri, dettaglio
+
+
+def leggi_foglio_dati(file_path: Path) -> tuple:
+    """
+    Legge FoglioDati in streaming (openpyxl read-only), tenendo solo le colonne
+    COLONNE_FOGLIO_DATI e solo le righe con Tipo conto = 'E'.
+    Restituisce (righe economiche, anno, mese); anno e mese vengono dalla prima riga.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        righe = wb['FoglioDati'].iter_rows(values_only=True)
+        header = list(next(righe, ()))
+        mancanti = [c for c in COLONNE_FOGLIO_DATI if c not in header]
+        if mancanti:
+            raise KeyError(f"Colonne mancanti in FoglioDati: {mancanti}")
+        i_tipo, i_desc, i_dare, i_avere, i_mese, i_anno = (header.index(c) for c in COLONNE_FOGLIO_DATI)
+        ultima = max(i_tipo, i_desc, i_dare, i_avere, i_mese, i_anno)
+
+        prima = None
+        economiche = []
+        for r in righe:
+            if len(r) <= ultima:
+                r = tuple(r) + (None,) * (ultima + 1 - len(r))
+            if prima is None:
+                prima = r
+            if r[i_tipo] == 'E':
+                economiche.append((r[i_desc], r[i_dare], r[i_avere]))
+    finally:
+        wb.close()
+
+    if prima is None:
+        raise ValueError("FoglioDati vuoto")
+
+    df_eco = pd.DataFrame(economiche, columns=['Descrizione', 'Dare', 'Avere'])
+    return df_eco, int(prima[i_anno]), int(prima[i_mese])
 
-        # Salta voci escluse
-        if any(desc.startswith(v) for v in VOCI_ESCLUSE):
-            continue
 
-        # Check retribuzioni
-        for voce in VOCI_RETRIBUZIONI:
-            if desc.startswith(voce) or desc == voce:
-                retribuzioni += saldo
-                dettaglio[desc] = {'categoria': 'RETRIBUZIONI', 'importo': saldo}
-                break
-        else:
-            # Check oneri
-            for voce in VOCI_ONERI:
-                if desc.startswith(voce) or desc == voce:
-                    oneri += saldo
-                    dettaglio[desc] = {'categoria': 'ONERI', 'importo': saldo}
-                    break
-
-    # Estrai mese e anno dal dataframe
-    mese = int(df['Mese'].iloc[0])
-    anno = int(df['Anno'].iloc[0])
+def estrai_personale(file_path: Path) -> dict:
+    """Estrae costo personale da un file PC, separando retribuzioni da oneri (in centesimi)"""
+    # Solo righe Tipo conto = 'E' (Economico), filtrate in lettura
+    df_eco, anno, mese = leggi_foglio_dati(file_path)
+    retribuzioni, oneri, dettaglio = calcola_costi(df_eco)
 
     return {
         'anno': anno,
         'mese': mese,
-        'retribuzioni': round(retribuzioni, 2),
-        'oneri': round(oneri, 2),
-        'totale': round(retribuzioni + oneri, 2),
+        'retribuzioni': retribuzioni,
+        'oneri': oneri,
+        'totale': retribuzioni + oneri,
         'dettaglio': dettaglio,
         'file': file_path.name
     }
@@ -113,77 +203,146 @@ def parse_file_type(filename: str) -> str:
         return 'dipendenti'
 
 
-def main():
-    base_path = Path('data/personale')
+def elenca_file(base_path: Path) -> list:
+    """Elenca i file PC da processare come coppie (societa, path), in ordine deterministico"""
+    jobs = []
+    for societa, (cartella, pattern) in SOCIETA.items():
+        path = base_path / cartella
+        if not path.exists():
+            print(f"Directory non trovata: {path}")
+            continue
+        jobs.extend((societa, f) for f in sorted(path.glob(pattern)))
+    return jobs
+
+
+def processa_file(societa: str, file_path: Path) -> tuple:
+    """
+    Estrae un singolo file PC. Restituisce (dati, errore): un file che fallisce
+    non interrompe gli altri, anche quando gira in un processo worker.
+    """
+    try:
+        data = estrai_personale(file_path)
+    except Exception as e:
+        return None, str(e)
+    data['societa'] = societa
+    data['tipo'] = parse_file_type(file_path.name)
+    return data, None
+
+
+def estrai_tutti(jobs: list, workers: int = 1) -> list:
+    """
+    Processa tutti i file, in serie o su un pool di processi.
+    Restituisce un risultato per job, nello stesso ordine (None se il file è fallito).
+    """
+    societa = [s for s, _ in jobs]
+    files = [f for _, f in jobs]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            esiti = pool.map(processa_file, societa, files)
+            return _raccogli(files, esiti)
+
+    return _raccogli(files, map(processa_file, societa, files))
+
+
+def _raccogli(files: list, esiti) -> list:
+    """Risultati in ordine di job, stampati man mano che arrivano (a file già elaborato)"""
     results = []
+    for f, (data, errore) in zip(files, esiti):
+        print(f"Elaborato {f.name}")
+        if errore is not None:
+            print(f"  ERRORE: {errore}")
+        results.append(data)
+    return results
+
+
+def versione_cache() -> str:
+    """Firma della logica di estrazione: cambia se cambiano le liste voci o VERSIONE_ESTRAZIONE"""
+    return hash_valore([VERSIONE_ESTRAZIONE, VOCI_ESCLUSE, VOCI_RETRIBUZIONI, VOCI_ONERI])
 
-    # Processa ORTI
-    orti_path = base_path / 'PROSPETTO ORTI'
-    if orti_path.exists():
-        for f in sorted(orti_path.glob('ORT_PC*.xlsx')):
-            print(f"Processing {f.name}...")
-            try:
-                data = estrai_personale(f)
-                data['societa'] = 'ORTI'
-                data['tipo'] = parse_file_type(f.name)
-                results.append(data)
-            except Exception as e:
-                print(f"  ERRORE: {e}")
-    else:
-        print(f"Directory non trovata: {orti_path}")
-
-    # Processa INTUR
-    intur_path = base_path / 'PROSPETTO INTUR'
-    if intur_path.exists():
-        for f in sorted(intur_path.glob('INT_PC*.xlsx')):
-            print(f"Processing {f.name}...")
-            try:
-                data = estrai_personale(f)
-                data['societa'] = 'INTUR'
-                data['tipo'] = parse_file_type(f.name)
-                results.append(data)
-            except Exception as e:
-                print(f"  ERRORE: {e}")
-    else:
-        print(f"Directory non trovata: {intur_path}")
+
+def estrai_con_cache(jobs: list, workers: int = 1, force: bool = False) -> list:
+    """
+    Come estrai_tutti, ma i file con contenuto già visto vengono letti dalla
+    cache. Restituisce i soli risultati validi, in ordine di job.
+    """
+    versione = versione_cache()
+    manifest = {} if force else carica_manifest('personale', versione)
+
+    hashes = [hash_file(f) for _, f in jobs]
+    da_leggere = [i for i, h in enumerate(hashes) if h not in manifest]
+    print(f"File in cache: {len(jobs) - len(da_leggere)}, da leggere: {len(da_leggere)}")
+
+    nuovi = estrai_tutti([jobs[i] for i in da_leggere], workers=workers)
+    for i, data in zip(da_leggere, nuovi):
+        if data is not None:
+            manifest[hashes[i]] = {k: v for k, v in data.items() if k != 'societa'}
+
+    results = []
+    voci = {}
+    for (societa, f), h in zip(jobs, hashes):
+        if h not in manifest:
+            continue
+        voci[h] = manifest[h]
+        # societa/tipo/file dipendono dal percorso, non dal contenuto
+        results.append(dict(manifest[h], societa=societa, tipo=parse_file_type(f.name), file=f.name))
+
+    # Il manifest tiene solo i file ancora presenti
+    salva_manifest('personale', versione, voci)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrae costi personale dai prospetti contabili PC")
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Processi paralleli per la lettura dei file (default: 1, seriale)"
+    )
+    parser.add_argument(
+        "--force", "-f", action="store_true",
+        help="Rilegge tutti i file ignorando la cache"
+    )
+    args = parser.parse_args()
+
+    base_path = Path('data/personale')
+    results = estrai_con_cache(elenca_file(base_path), workers=args.workers, force=args.force)
 
     if not results:
         print("\nNessun file trovato!")
         return
 
-    # Crea DataFrame
+    # Aggiorna l'archivio: riscrive solo le partizioni (societa, anno, mese) cambiate
     df_out = pd.DataFrame(results)
+    scritte = personale_store.scrivi(df_out)
+    print(f"\nPartizioni aggiornate: {len(scritte)}")
+    for p in scritte:
+        print(f"  {p}")
 
-    # Aggrega per società/mese (somma dipendenti + stagionali + collaboratori)
-    df_agg = df_out.groupby(['societa', 'anno', 'mese']).agg({
-        'retribuzioni': 'sum',
-        'oneri': 'sum',
-        'totale': 'sum'
-    }).reset_index()
-
-    df_agg = df_agg.sort_values(['societa', 'anno', 'mese'])
+    # Riepiloghi su tutti gli anni in archivio, anche quelli non riletti
+    df_out = personale_store.carica(list(SOCIETA))
+    df_agg = personale_store.mensile(list(SOCIETA))
 
     # Output
     output_path = Path('output')
     output_path.mkdir(exist_ok=True)
 
     # Pivot per RETRIBUZIONI
-    pivot_retr = df_agg.pivot(index='mese', columns='societa', values='retribuzioni').fillna(0)
+    pivot_retr = df_agg.pivot(index=['anno', 'mese'], columns='societa', values='retribuzioni').fillna(0).astype('int64')
     pivot_retr.columns = [f'{c}_RETRIB' for c in pivot_retr.columns]
 
     # Pivot per ONERI
-    pivot_oneri = df_agg.pivot(index='mese', columns='societa', values='oneri').fillna(0)
+    pivot_oneri = df_agg.pivot(index=['anno', 'mese'], columns='societa', values='oneri').fillna(0).astype('int64')
     pivot_oneri.columns = [f'{c}_ONERI' for c in pivot_oneri.columns]
 
     # Pivot per TOTALE
-    pivot_tot = df_agg.pivot(index='mese', columns='societa', values='totale').fillna(0)
+    pivot_tot = df_agg.pivot(index=['anno', 'mese'], columns='societa', values='totale').fillna(0).astype('int64')
     pivot_tot.columns = [f'{c}_TOTALE' for c in pivot_tot.columns]
 
     # Combina tutto
     pivot = pd.concat([pivot_retr, pivot_oneri, pivot_tot], axis=1)
     # Riordina colonne: ORTI_RETRIB, ORTI_ONERI, ORTI_TOTALE, INTUR_RETRIB, etc.
     cols_order = []
-    for soc in ['ORTI', 'INTUR']:
+    for soc in SOCIETA:
         for tipo in ['RETRIB', 'ONERI', 'TOTALE']:
             col = f'{soc}_{tipo}'
             if col in pivot.columns:
@@ -195,48 +354,54 @@ def main():
     pivot['TOT_ONERI'] = pivot[[c for c in pivot.columns if '_ONERI' in c]].sum(axis=1)
     pivot['TOT_PERSONALE'] = pivot[[c for c in pivot.columns if '_TOTALE' in c]].sum(axis=1)
 
+    # Da qui in euro: CSV e stampe
+    pivot = euro(pivot)
+
     # Dettaglio per file
-    df_out[['societa', 'tipo', 'anno', 'mese', 'retribuzioni', 'oneri', 'totale', 'file']].to_csv(
-        output_path / 'personale_dettaglio.csv', index=False
-    )
+    in_euro(df_out[['societa', 'tipo', 'anno', 'mese', 'retribuzioni', 'oneri', 'totale', 'file']],
+            personale_store.VALORI).to_csv(output_path / 'personale_dettaglio.csv', index=False)
 
     # Riepilogo mensile
     pivot.to_csv(output_path / 'personale_mensile.csv')
 
-    print("\n" + "="*70)
-    print("RIEPILOGO PERSONALE 2025 - RETRIBUZIONI vs ONERI")
-    print("="*70)
-
-    # Vista semplificata per società
-    for soc in ['ORTI', 'INTUR']:
-        retrib_col = f'{soc}_RETRIB'
-        oneri_col = f'{soc}_ONERI'
-        tot_col = f'{soc}_TOTALE'
-        if tot_col in pivot.columns:
-            print(f"\n{soc}:")
-            print(f"  {'Mese':<6} {'Retribuzioni':>14} {'Oneri':>14} {'Totale':>14}")
-            print(f"  {'-'*6} {'-'*14} {'-'*14} {'-'*14}")
-            for mese in pivot.index:
-                r = pivot.loc[mese, retrib_col] if retrib_col in pivot.columns else 0
-                o = pivot.loc[mese, oneri_col] if oneri_col in pivot.columns else 0
-                t = pivot.loc[mese, tot_col]
-                print(f"  {mese:<6} €{r:>12,.2f} €{o:>12,.2f} €{t:>12,.2f}")
-
-            tot_r = pivot[retrib_col].sum() if retrib_col in pivot.columns else 0
-            tot_o = pivot[oneri_col].sum() if oneri_col in pivot.columns else 0
-            tot_t = pivot[tot_col].sum()
-            print(f"  {'-'*6} {'-'*14} {'-'*14} {'-'*14}")
-            print(f"  {'TOT':<6} €{tot_r:>12,.2f} €{tot_o:>12,.2f} €{tot_t:>12,.2f}")
+    for anno, pivot_anno in pivot.groupby(level='anno'):
+        pivot_anno = pivot_anno.droplevel('anno')
+        print("\n" + "="*70)
+        print(f"RIEPILOGO PERSONALE {anno} - RETRIBUZIONI vs ONERI")
+        print("="*70)
+
+        # Vista semplificata per società
+        for soc in SOCIETA:
+            retrib_col = f'{soc}_RETRIB'
+            oneri_col = f'{soc}_ONERI'
+            tot_col = f'{soc}_TOTALE'
+            if tot_col in pivot_anno.columns:
+                print(f"\n{soc}:")
+                print(f"  {'Mese':<6} {'Retribuzioni':>14} {'Oneri':>14} {'Totale':>14}")
+                print(f"  {'-'*6} {'-'*14} {'-'*14} {'-'*14}")
+                for mese in pivot_anno.index:
+                    r = pivot_anno.loc[mese, retrib_col] if retrib_col in pivot_anno.columns else 0
+                    o = pivot_anno.loc[mese, oneri_col] if oneri_col in pivot_anno.columns else 0
+                    t = pivot_anno.loc[mese, tot_col]
+                    print(f"  {mese:<6} €{r:>12,.2f} €{o:>12,.2f} €{t:>12,.2f}")
+
+                tot_r = pivot_anno[retrib_col].sum() if retrib_col in pivot_anno.columns else 0
+                tot_o = pivot_anno[oneri_col].sum() if oneri_col in pivot_anno.columns else 0
+                tot_t = pivot_anno[tot_col].sum()
+                print(f"  {'-'*6} {'-'*14} {'-'*14} {'-'*14}")
+                print(f"  {'TOT':<6} €{tot_r:>12,.2f} €{tot_o:>12,.2f} €{tot_t:>12,.2f}")
 
     print("\n" + "="*70)
     print("RIEPILOGO COMPLESSIVO")
     print("="*70)
-    tot_retrib = pivot['TOT_RETRIB'].sum()
-    tot_oneri = pivot['TOT_ONERI'].sum()
-    tot_pers = pivot['TOT_PERSONALE'].sum()
-    print(f"  RETRIBUZIONI TOTALI: €{tot_retrib:>12,.2f}")
-    print(f"  ONERI TOTALI:        €{tot_oneri:>12,.2f}")
-    print(f"  PERSONALE TOTALE:    €{tot_pers:>12,.2f}")
+    for anno, pivot_anno in pivot.groupby(level='anno'):
+        tot_retrib = pivot_anno['TOT_RETRIB'].sum()
+        tot_oneri = pivot_anno['TOT_ONERI'].sum()
+        tot_pers = pivot_anno['TOT_PERSONALE'].sum()
+        print(f"  {anno}")
+        print(f"  RETRIBUZIONI TOTALI: €{tot_retrib:>12,.2f}")
+        print(f"  ONERI TOTALI:        €{tot_oneri:>12,.2f}")
+        print(f"  PERSONALE TOTALE:    €{tot_pers:>12,.2f}")
     print("="*70)
 
 
@@ -0,0 +1,125 @@
+"""
+Formule compatte per i fogli Sheets: formule-matrice su intervalli con nome.
+
+I fogli di riepilogo avevano una formula per cella: una per mese nei trend
+(=CONSOLIDATO_Dashboard!H2, =CONSOLIDATO_Dashboard!H3, ...), una catena per
+i cumulati (=B10+C4, =C10+D4, ...) e intervalli scritti a mano (H2:H13,
+H7:H10) che si rompono se cambiano colonne, mesi o società. Qui ogni riga
+(o colonna) di un blocco è una sola formula che Sheets valuta come vettore e
+distribuisce nelle celle accanto:
+
+- somme(colonna, entita): {SUM(ORTI_TOT_RICAVI),SUM(INTUR_TOT_RICAVI),...},
+  il totale annuo di una colonna per ogni entità, in riga
+- mensili(colonna, entita): TRANSPOSE(CONSOLIDATO_TOT_RICAVI), i mesi in riga
+- cumulato(intervallo): SCAN(0,B4:M4,LAMBDA(a,x,a+x)), i cumulati da inizio anno
+- stagioni(colonna, entita, alta): alta e bassa stagione, dalla colonna Mese
+- rapporto(num, den): ARRAYFORMULA(IF(den=0,0,num/den)) elemento per elemento
+- vettore(espressione): ARRAYFORMULA(espressione)
+
+Gli intervalli con nome sono <ENTITA>_<COLONNA> (caratteri non alfanumerici
+tolti, F&B -> FB) sulle righe dei mesi del foglio <ENTITA>_Dashboard, più
+<ENTITA>_MESE sulla colonna Mese; le righe sono quelle del dashboard di
+ogni entità (definisci_intervalli({entità: mesi})). Si creano o aggiornano con definisci_intervalli() nella batchUpdate di un Batch
+(sheets_batch.py). Le formule non contengono né lettere di colonna dei
+dashboard né numeri di riga: aggiungere una società o cambiare il numero di
+mesi cambia solo gli argomenti.
+
+Tutte le funzioni restituiscono espressioni senza '=' iniziale, componibili;
+formula() aggiunge l'uguale.
+"""
+
+import re
+
+from gspread.utils import rowcol_to_a1
+
+from aggiorna_personale_dashboard import COLONNE_DASHBOARD, IMPORTI_DASHBOARD, MESI_NOME
+
+PRIMA_RIGA = 2          # primo mese nei fogli *_Dashboard (riga 1 = intestazione)
+
+# {nome nell'intervallo: colonna del dashboard}: gli importi e i mesi
+COLONNE_INTERVALLI = {**{colonna: colonna for colonna in IMPORTI_DASHBOARD}, 'MESE': 'Mese'}
+
+
+def formula(espressione: str) -> str:
+    return f"={espressione}"
+
+
+def foglio_dashboard(entita: str) -> str:
+    return f"{entita}_Dashboard"
+
+
+def nome_intervallo(entita: str, colonna: str) -> str:
+    """Nome dell'intervallo dei mesi di `colonna` nel dashboard di `entita`"""
+    return re.sub(r'\W', '', f"{entita}_{colonna}")
+
+
+def intervalli(mesi: dict) -> dict:
+    """{nome: (foglio, intervallo A1)} per ogni colonna di COLONNE_INTERVALLI, da {entità: mesi nel dashboard}"""
+    risultato = {}
+    for e, n in mesi.items():
+        ultima = PRIMA_RIGA + n - 1
+        for nome, colonna in COLONNE_INTERVALLI.items():
+            lettera = rowcol_to_a1(1, COLONNE_DASHBOARD.index(colonna) + 1)[:-1]
+            risultato[nome_intervallo(e, nome)] = (foglio_dashboard(e), f"{lettera}{PRIMA_RIGA}:{lettera}{ultima}")
+    return risultato
+
+
+def definisci_intervalli(batch, mesi: dict) -> list:
+    """
+    Crea o aggiorna nel batch gli intervalli con nome delle entità di `mesi`
+    ({entità: mesi nel dashboard}) che hanno un foglio dashboard; restituisce
+    i fogli mancanti.
+    """
+    saltate = []
+    for nome, (foglio, a1) in intervalli(mesi).items():
+        if batch.esiste(foglio):
+            batch.intervallo_nominato(nome, foglio, a1)
+        elif foglio not in saltate:
+            saltate.append(foglio)
+    return saltate
+
+
+def somme(colonna: str, entita: list) -> str:
+    """Totale annuo di `colonna` per entità, in riga"""
+    return "{" + ",".join(f"SUM({nome_intervallo(e, colonna)})" for e in entita) + "}"
+
+
+def mensili(colonna: str, entita: str) -> str:
+    """I mesi di `colonna` di una entità, in riga"""
+    return f"TRANSPOSE({nome_intervallo(entita, colonna)})"
+
+
+def con_totale(colonna: str, entita: str) -> str:
+    """I mesi in riga seguiti dal totale annuo"""
+    return "{" + f"{mensili(colonna, entita)},SUM({nome_intervallo(entita, colonna)})" + "}"
+
+
+def stagioni(colonna: str, entita: str, alta: list) -> str:
+    """
+    Somma di `colonna` nei mesi `alta` (1-12) e negli altri, in riga. I mesi
+    si riconoscono dalla colonna Mese (<ENTITA>_MESE), non dalla posizione:
+    un dashboard che non parte da gennaio resta corretto.
+    """
+    nome = nome_intervallo(entita, colonna)
+    nomi_alta = ';'.join(f'"{MESI_NOME[m]}"' for m in alta)
+    maschera = f"ISNUMBER(MATCH({nome_intervallo(entita, 'MESE')},{{{nomi_alta}}},0))"
+    return f"{{SUMPRODUCT({nome}*{maschera}),SUMPRODUCT({nome}*(1-{maschera}))}}"
+
+
+def cumulato(intervallo: str) -> str:
+    """Cumulati progressivi di un intervallo in riga"""
+    return f"SCAN(0,{intervallo},LAMBDA(a,x,a+x))"
+
+
+def somme_colonne(intervallo: str) -> str:
+    """Somma di ogni colonna di un intervallo, in riga"""
+    return f"BYCOL({intervallo},LAMBDA(c,SUM(c)))"
+
+
+def vettore(espressione: str) -> str:
+    return f"ARRAYFORMULA({espressione})"
+
+
+def rapporto(numeratore: str, denominatore: str) -> str:
+    """numeratore/denominatore elemento per elemento, 0 dove il denominatore è 0"""
+    return vettore(f"IF({denominatore}=0,0,{numeratore}/{denominatore})")
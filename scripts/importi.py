@@ -0,0 +1,67 @@
+"""
+Importi in centesimi interi (int64).
+
+Nella pipeline gli importi viaggiano come interi in centesimi: somme e
+differenze sono esatte (niente 3355.7599999999998) e le riduzioni su
+colonne int64 costano meno di quelle su float. La conversione avviene ai
+bordi:
+
+- in ingresso, centesimi() / centesimi_da_testo() arrotondano al centesimo
+  i valori letti da Excel o da CSV;
+- in uscita, euro() / in_euro() dividono per 100 solo per i CSV, Sheets e
+  le stampe; cent/100 è il float più vicino al valore a due decimali, quindi
+  si scrive come '3355.76'.
+
+Esempio:
+    from importi import centesimi, in_euro
+    df['importo'] = centesimi(df['importo'])
+    df.groupby('mese')['importo'].sum()         # somma intera, esatta
+    in_euro(df, ['importo']).to_csv(...)
+"""
+
+import numpy as np
+import pandas as pd
+
+CENTESIMI = 100
+
+
+def centesimi(valori):
+    """
+    Importi in euro (numeri o testo numerico '1234.56') -> centesimi int64.
+    Mancanti e non numerici valgono 0. Accetta Series, DataFrame o scalare.
+    """
+    if isinstance(valori, pd.DataFrame):
+        return valori.apply(centesimi)
+    if isinstance(valori, pd.Series):
+        numeri = pd.to_numeric(valori, errors='coerce').astype(float).fillna(0.0)
+        return pd.Series(np.rint(numeri.to_numpy() * CENTESIMI).astype(np.int64), index=valori.index, name=valori.name)
+    if valori is None or pd.isna(valori):
+        return 0
+    return int(np.rint(float(valori) * CENTESIMI))
+
+
+def centesimi_da_testo(col: pd.Series) -> pd.Series:
+    """Centesimi da una colonna mista: numeri così come sono, testo in formato italiano ('1.234,56'), il resto 0"""
+    if pd.api.types.is_numeric_dtype(col):
+        return centesimi(col)
+    col = col.astype(object)
+    testuali = col.map(type).eq(str)
+    testo = (
+        col.where(testuali).astype(str)
+        .str.replace('.', '', regex=False)
+        .str.replace(',', '.', regex=False)
+        .str.strip()
+    )
+    return centesimi(testo.where(testuali, col))
+
+
+def euro(cent):
+    """Centesimi -> euro (float), per l'esportazione"""
+    if isinstance(cent, (pd.Series, pd.DataFrame)):
+        return cent.astype(np.int64) / CENTESIMI
+    return int(cent) / CENTESIMI
+
+
+def in_euro(df: pd.DataFrame, colonne: list) -> pd.DataFrame:
+    """Copia di df con le colonne in centesimi convertite in euro"""
+    return df.assign(**{c: euro(df[c]) for c in colonne if c in df.columns})
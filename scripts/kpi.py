@@ -0,0 +1,144 @@
+"""
+KPI dei dashboard avanzati (create_advanced_dashboard.py) calcolati in locale.
+
+I fogli KPI_2025, Trends, Scenario_2026 e BU_Detail erano fatti di centinaia
+di formule fra fogli (=SUM(ORTI_Dashboard!H2:H13), =CONSOLIDATO_Dashboard!H2
+per ogni mese, ...): Sheets le ricalcola a ogni modifica di un dashboard e
+si potevano controllare solo online. Qui gli stessi numeri si calcolano dai
+CSV in output/ (importi in centesimi, importi.py), in blocco su un cubo
+entità x mesi x colonne, senza cicli:
+
+- totali(): somma annua di ogni colonna del dashboard, per entità
+- kpi(): ricavi, costi, EBITDA, personale e margini annui per entità
+- mix_bu(), struttura_costi(): ricavi per BU e costi per categoria, con le
+  quote sul totale consolidato
+- trend(): il consolidato mese per mese, con i cumulati da inizio anno
+- stagionalita(): alta stagione (ALTA_STAGIONE, Giu-Set) contro il resto
+
+L'asse dei mesi è quello delle righe dei dashboard (colonna Mese), non
+12 mesi fissi: un esercizio ancora aperto ha solo i mesi già nel mastrino.
+
+Le entità sono le società di mesepermese.SOCIETA più il consolidato
+(consolidamento.py), che porta le elisioni intercompany: i totali consolidati
+non sono la somma delle società. Gli importi restano in centesimi int64, i
+rapporti sono frazioni float, 0 se il denominatore è 0 (come =IF(x=0,0,..)
+nei fogli).
+
+USO:
+    dashboard = carica_dashboard()
+    kpi(totali(dashboard))                  # una riga per entità
+    trend(dashboard[CONSOLIDATO])           # una riga per mese
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aggiorna_personale_dashboard import IMPORTI_DASHBOARD, MESI_NOME, leggi_dashboard
+from consolidamento import CONSOLIDATO
+from crea_dashboard import BU, CATEGORIE_COSTO
+from mesepermese import SOCIETA
+
+OUTPUT_DIR = Path('output')
+
+NUMERO_MESE = {nome: n for n, nome in MESI_NOME.items()}
+ALTA_STAGIONE = [6, 7, 8, 9]      # Giu-Set
+
+
+def path_dashboard(entita: str) -> Path:
+    return OUTPUT_DIR / f'{entita}_dashboard_semplificato.csv'
+
+
+def carica_dashboard(entita: list = None) -> dict:
+    """{entità: dashboard in centesimi}, di default le società e il consolidato"""
+    entita = [*SOCIETA, CONSOLIDATO] if entita is None else entita
+    return {e: leggi_dashboard(path_dashboard(e)) for e in entita}
+
+
+def mesi(df: pd.DataFrame) -> pd.Index:
+    """Mesi (1-12) delle righe di un dashboard, dalla colonna Mese"""
+    return pd.Index([NUMERO_MESE[nome] for nome in df['Mese']], name='mese')
+
+
+def cubo(dashboard: dict) -> np.ndarray:
+    """
+    Importi dei dashboard come array int64 (entità, mese, colonna di
+    IMPORTI_DASHBOARD), sull'unione dei mesi delle entità: un mese che
+    manca a un'entità vale 0.
+    """
+    asse = sorted(set().union(*(mesi(df) for df in dashboard.values())))
+    return np.stack([
+        df[IMPORTI_DASHBOARD].set_axis(mesi(df)).reindex(asse, fill_value=0).to_numpy(np.int64)
+        for df in dashboard.values()
+    ])
+
+
+def rapporto(numeratore, denominatore) -> np.ndarray:
+    """numeratore / denominatore elemento per elemento, 0 dove il denominatore è 0"""
+    numeratore = np.asarray(numeratore, dtype=float)
+    denominatore = np.asarray(denominatore, dtype=float)
+    return np.divide(numeratore, denominatore, out=np.zeros(np.broadcast(numeratore, denominatore).shape),
+                     where=denominatore != 0)
+
+
+def totali(dashboard: dict) -> pd.DataFrame:
+    """Somma annua: una riga per entità, una colonna per importo del dashboard"""
+    return pd.DataFrame(cubo(dashboard).sum(axis=1), index=pd.Index(list(dashboard), name='entita'),
+                        columns=IMPORTI_DASHBOARD)
+
+
+def kpi(tot: pd.DataFrame) -> pd.DataFrame:
+    """KPI annui per entità (righe di totali())"""
+    return pd.DataFrame({
+        'ricavi': tot['TOT_RICAVI'],
+        'costi': tot['TOT_COSTI'],
+        'ebitda': tot['EBITDA'],
+        'personale': tot['PERSONALE'],
+        'margine': rapporto(tot['EBITDA'], tot['TOT_RICAVI']),
+        'incidenza_personale': rapporto(tot['PERSONALE'], tot['TOT_RICAVI']),
+    }, index=tot.index)
+
+
+def _quote(tot: pd.DataFrame, colonne: list, denominatore: str) -> pd.DataFrame:
+    """colonne x entità, più la quota del consolidato sul suo `denominatore`"""
+    tabella = tot[colonne].T
+    tabella['quota'] = rapporto(tabella[CONSOLIDATO], tot.loc[CONSOLIDATO, denominatore])
+    return tabella
+
+
+def mix_bu(tot: pd.DataFrame) -> pd.DataFrame:
+    """Ricavi per BU (righe) ed entità (colonne), quota = mix sui ricavi consolidati"""
+    return _quote(tot, BU, 'TOT_RICAVI')
+
+
+def struttura_costi(tot: pd.DataFrame) -> pd.DataFrame:
+    """Costi per categoria (righe) ed entità (colonne), quota = incidenza sui ricavi consolidati"""
+    return _quote(tot, CATEGORIE_COSTO, 'TOT_RICAVI')
+
+
+def trend(df: pd.DataFrame) -> pd.DataFrame:
+    """Un dashboard mese per mese: ricavi, costi, EBITDA, margine e cumulati da inizio anno"""
+    ricavi = df['TOT_RICAVI'].to_numpy(np.int64)
+    costi = df['TOT_COSTI'].to_numpy(np.int64)
+    ebitda = df['EBITDA'].to_numpy(np.int64)
+    return pd.DataFrame({
+        'ricavi': ricavi,
+        'costi': costi,
+        'ebitda': ebitda,
+        'margine': rapporto(ebitda, ricavi),
+        'ricavi_ytd': ricavi.cumsum(),
+        'ebitda_ytd': ebitda.cumsum(),
+    }, index=mesi(df))
+
+
+def stagionalita(df: pd.DataFrame, alta: list = None) -> pd.DataFrame:
+    """Ricavi ed EBITDA di un dashboard in alta e bassa stagione, e il rapporto alta/bassa"""
+    alta = np.isin(mesi(df), ALTA_STAGIONE if alta is None else alta)
+    importi = df[['TOT_RICAVI', 'EBITDA']].to_numpy(np.int64)
+    tabella = pd.DataFrame({
+        'alta': importi[alta].sum(axis=0),
+        'bassa': importi[~alta].sum(axis=0),
+    }, index=['ricavi', 'ebitda'])
+    tabella['rapporto'] = rapporto(tabella['alta'], tabella['bassa'])
+    return tabella
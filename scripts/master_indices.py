@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Ingestione dei workbook <SOCIETA>_Master Indices <ANNO>.xlsx (Stato
+Patrimoniale, Rating, Vendite, Conto Economico, Budget, Cash - Flow,
+Indicatori) in una tabella lunga tipizzata, accanto al mastrino.
+
+I fogli si leggono in streaming con openpyxl in sola lettura (read_only,
+data_only): niente DOM completo del workbook, una riga in memoria alla
+volta. Ogni foglio ha una struttura diversa,
+descritta in FOGLI come le regole di classificazione.py: riga di
+intestazione, colonne di voce / codice conto e, per ogni periodo trovato
+nell'intestazione (anno o mese), le misure lette a quello scostamento di
+colonna. Le colonne di intestazione senza periodo (es. 'Budget Mensile')
+diventano misure a sé.
+
+Una riga per valore numerico:
+    societa, esercizio, foglio, riga, conto, voce, tipo, anno, mese, misura, valore
+Chiave: (societa, esercizio, foglio, riga, anno, mese, misura). `riga` resta
+nella chiave perché le voci si ripetono (es. 'F.DO AMM.' sotto ogni cespite).
+`valore` è float: nei fogli ci sono importi, percentuali e indici insieme.
+Errori di formula (#DIV/0!) e testi sono scartati.
+
+Il risultato è in cache per hash del file (cache.py) e va nell'archivio:
+    output/archivio/master_indices/societa=ORTI/esercizio=2025/part-0.parquet
+
+USAGE:
+    python scripts/master_indices.py
+    python scripts/master_indices.py --anno 2025 --force
+"""
+
+import argparse
+import re
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+from openpyxl.utils.datetime import to_excel
+
+import archivio
+from aggiorna_personale_dashboard import MESI_NOME
+from cache import carica_frame, carica_manifest, elimina_frame, hash_file, hash_valore, salva_frame, salva_manifest
+from mesepermese import DATA_DIR, SOCIETA
+
+_ESERCIZIO = re.compile(r'ES\.?\s*((?:19|20)\d\d)')
+
+# Versione della normalizzazione: cambiarla invalida la cache
+VERSIONE_MASTER = 2
+
+# Struttura dei fogli (righe e colonne da 0):
+#   intestazione: riga con i periodi
+#   voce / conto: colonne della descrizione e del codice conto
+#   misure:       {scostamento dalla colonna del periodo: misura}
+#   tipo:         scostamento della colonna Tipo (IP/F/V/Z) dalla colonna del periodo
+#   sottotitoli:  righe di solo testo nelle colonne misura rinominano le misure
+#                 (Rating: 'Importo' / '%', poi 'Valore' / 'Scoring')
+#   mese_in_voce: il mese è nella colonna voce (Vendite: 'GEN.', 'FEB.', ...)
+# Nel Conto Economico e nello Stato Patrimoniale il dettaglio è una colonna
+# prima dell'anno e i totali sotto l'anno.
+FOGLI = {
+    'Stato Patrimoniale': {'intestazione': 4, 'voce': 1, 'conto': 0, 'misure': {-1: 'importo', 0: 'importo', 1: '%'}},
+    'Conto Economico': {'intestazione': 3, 'voce': 1, 'conto': 0, 'misure': {-1: 'importo', 0: 'importo', 1: '%'},
+                        'tipo': 2},
+    'Rating': {'intestazione': 1, 'voce': 0, 'misure': {0: 'importo', 1: '%'}, 'sottotitoli': True},
+    'Vendite': {'intestazione': 3, 'voce': 0, 'misure': {0: 'importo'}, 'mese_in_voce': True},
+    'Budget': {'intestazione': 9, 'voce': 1, 'conto': 0, 'misure': {0: 'importo', 1: '%'}, 'tipo': 2},
+    'Cash - Flow': {'intestazione': 1, 'voce': 1, 'misure': {0: 'importo'}},
+    'Indicatori': {'intestazione': 3, 'voce': 0, 'misure': {0: 'valore'}},
+}
+
+COLONNE = ['societa', 'esercizio', 'foglio', 'riga', 'conto', 'voce', 'tipo', 'anno', 'mese', 'misura', 'valore']
+
+# 'GENNAIO', 'Gennaio', 'GEN.' -> 1
+MESI = {nome.upper(): n for n, nome in MESI_NOME.items()} | {nome[:3].upper(): n for n, nome in MESI_NOME.items()}
+
+
+def path_master_indices(societa: str, anno: int) -> Path:
+    return DATA_DIR / f'{societa}_Master Indices {anno}.xlsx'
+
+
+# === LETTURA IN STREAMING ===
+
+def _valore(valore):
+    """
+    Valore di cella come lo usa la normalizzazione: numeri (e date, come
+    seriale Excel) float, testo str; celle vuote ed errori (#DIV/0!) None.
+    """
+    if valore is None or valore == '' or valore in ERROR_CODES:
+        return None
+    if isinstance(valore, (datetime, time, timedelta)):
+        return float(to_excel(valore))
+    if isinstance(valore, int) and not isinstance(valore, bool):
+        return float(valore)
+    return valore
+
+
+def righe(ws):
+    """
+    Generatore di (riga, {colonna: valore}) per le righe con almeno un
+    valore, righe e colonne da 0 (valori come _valore).
+    """
+    for riga, valori in enumerate(ws.iter_rows(values_only=True)):
+        celle_riga = {colonna: v for colonna, valore in enumerate(valori) if (v := _valore(valore)) is not None}
+        if celle_riga:
+            yield riga, celle_riga
+
+
+# === NORMALIZZAZIONE ===
+
+def _testo(valore) -> str:
+    return valore.strip() if isinstance(valore, str) else ''
+
+
+def _numero(valore):
+    """float, o None per testo non numerico ed errori di formula"""
+    if isinstance(valore, float):
+        return valore
+    try:
+        return float(valore)
+    except (TypeError, ValueError):
+        return None
+
+
+def _periodo(valore):
+    """Cella di intestazione -> ('anno', 2025) / ('mese', 3) / None"""
+    if isinstance(valore, float) and valore.is_integer() and 1900 <= valore <= 2100:
+        return 'anno', int(valore)
+    testo = _testo(valore).upper()
+    if m := _ESERCIZIO.fullmatch(testo):
+        return 'anno', int(m.group(1))
+    if testo in MESI:
+        return 'mese', MESI[testo]
+    return None
+
+
+def colonne_misura(intestazione: dict, layout: dict, esercizio: int) -> tuple:
+    """
+    Dall'intestazione: ({colonna: [anno, mese, misura]}, {colonna: colonna Tipo}).
+    Le colonne dei blocchi periodo vengono prima; le altre colonne con testo
+    sono misure dell'esercizio ('%' prende il nome della misura a sinistra).
+    """
+    misure, tipi = {}, {}
+    for colonna, valore in intestazione.items():
+        if (periodo := _periodo(valore)) is None:
+            continue
+        anno, mese = (periodo[1], None) if periodo[0] == 'anno' else (esercizio, periodo[1])
+        for scostamento, misura in layout['misure'].items():
+            misure[colonna + scostamento] = [anno, mese, misura]
+            if 'tipo' in layout:
+                tipi[colonna + scostamento] = colonna + layout['tipo']
+
+    riservate = {layout['voce'], layout.get('conto'), *tipi.values()}
+    precedente = None
+    for colonna, valore in sorted(intestazione.items()):
+        if colonna in misure or colonna in riservate or not (testo := _testo(valore)):
+            continue
+        misura = f'{precedente} %' if testo == '%' and precedente else testo
+        misure[colonna] = [esercizio, None, misura]
+        precedente = misura
+    return misure, tipi
+
+
+def normalizza_foglio(righe_foglio, layout: dict, esercizio: int):
+    """
+    Generatore di record (riga, conto, voce, tipo, anno, mese, misura, valore)
+    dalle righe di un foglio, secondo il layout di FOGLI.
+    """
+    misure, tipi = None, {}
+    for riga, celle_riga in righe_foglio:
+        if riga < layout['intestazione']:
+            continue
+        if riga == layout['intestazione']:
+            misure, tipi = colonne_misura(celle_riga, layout, esercizio)
+            continue
+
+        valori = {c: celle_riga[c] for c in misure if c in celle_riga}
+        if layout.get('sottotitoli') and valori and all(
+            _testo(v) and not _testo(v).startswith('#') and _numero(v) is None for v in valori.values()
+        ):
+            for colonna, valore in valori.items():
+                misure[colonna] = [*misure[colonna][:2], _testo(valore).lower()]
+            continue
+
+        voce = _testo(celle_riga.get(layout['voce']))
+        if not voce:
+            continue
+        numeri = {c: n for c, v in valori.items() if (n := _numero(v)) is not None}
+        # Righe che ripetono gli anni dell'intestazione (Rating: 'DSCR 2023 2024 2025')
+        if numeri and all(n == misure[c][0] for c, n in numeri.items()):
+            continue
+
+        conto = celle_riga.get(layout.get('conto'))
+        conto = _testo(conto) or None    # codici rovinati in numeri (date) -> nessun codice
+        mese_voce = MESI.get(voce.upper().rstrip('.')) if layout.get('mese_in_voce') else None
+        for colonna, valore in numeri.items():
+            anno, mese, misura = misure[colonna]
+            tipo = _testo(celle_riga.get(tipi.get(colonna))) or None
+            yield riga, conto, voce, tipo, anno, mese_voce or mese, misura, valore
+
+
+def leggi_master_indices(path: Path, societa: str, esercizio: int) -> pd.DataFrame:
+    """Tutti i fogli di FOGLI presenti nel workbook, in forma lunga (COLONNE)"""
+    frames = []
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for foglio, layout in FOGLI.items():
+            if foglio not in wb.sheetnames:
+                print(f"  ⚠️  {Path(path).name}: foglio '{foglio}' non trovato")
+                continue
+            ws = wb[foglio]
+            ws.reset_dimensions()    # le dimensioni dichiarate nel file possono essere sbagliate
+            record = normalizza_foglio(righe(ws), layout, esercizio)
+            df = pd.DataFrame(
+                list(record), columns=['riga', 'conto', 'voce', 'tipo', 'anno', 'mese', 'misura', 'valore']
+            )
+            frames.append(df.assign(foglio=foglio))
+    finally:
+        wb.close()
+
+    df = pd.concat(frames, ignore_index=True).assign(societa=societa, esercizio=esercizio)
+    return df[COLONNE].astype({
+        'societa': 'category', 'esercizio': 'int16', 'foglio': 'category', 'riga': 'int32',
+        'anno': 'int16', 'mese': 'Int8', 'misura': 'category', 'valore': 'float64',
+    })
+
+
+def carica_master_indices(files: dict, esercizio: int, force: bool = False) -> pd.DataFrame:
+    """
+    Master Indices di più società, {societa: path} -> DataFrame unico. I
+    workbook con contenuto già visto si leggono dalla cache.
+    """
+    versione = hash_valore([VERSIONE_MASTER, {foglio: str(layout) for foglio, layout in FOGLI.items()}])
+    manifest = {} if force else carica_manifest('master_indices', versione)
+
+    frames, letti = [], 0
+    for societa, path in files.items():
+        h = hash_file(path)
+        df = carica_frame('master_indices', h) if h in manifest else None
+        if df is None:
+            df = leggi_master_indices(path, societa, esercizio)
+            letti += 1
+            # La versione precedente dello stesso workbook non serve più
+            for vecchio, voce in list(manifest.items()):
+                if voce['chiave'] == societa and vecchio != h:
+                    elimina_frame('master_indices', vecchio)
+                    del manifest[vecchio]
+            salva_frame('master_indices', h, df)
+            manifest[h] = {'chiave': societa, 'file': Path(path).name}
+        frames.append(df)
+    print(f"Workbook in cache: {len(files) - letti}, da leggere: {letti}")
+    if letti:
+        salva_manifest('master_indices', versione, manifest)
+
+    df = pd.concat(frames, ignore_index=True)
+    return df.astype({'societa': 'category', 'foglio': 'category', 'misura': 'category'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestione dei workbook Master Indices")
+    parser.add_argument("--anno", type=int, default=2025, help="Esercizio dei workbook (default: 2025)")
+    parser.add_argument("--force", "-f", action="store_true", help="Rilegge tutti i workbook ignorando la cache")
+    args = parser.parse_args()
+
+    files = {societa: path_master_indices(societa, args.anno) for societa in SOCIETA}
+    mancanti = [societa for societa, path in files.items() if not path.exists()]
+    for societa in mancanti:
+        print(f"⚠️  {files.pop(societa)} non trovato")
+    if not files:
+        return
+
+    df = carica_master_indices(files, args.anno, force=args.force)
+    archivio.scrivi(df, 'master_indices', ['societa', 'esercizio'])
+    print(f"Archiviato: {archivio.ARCHIVIO_DIR / 'master_indices'}")
+
+    print("\n" + "="*60)
+    print(f"MASTER INDICES {args.anno}")
+    print("="*60)
+    conteggi = df.groupby(['foglio', 'societa'], observed=True).size().unstack(fill_value=0)
+    print(f"  {'Valori':<22}" + ''.join(f"{s:>12}" for s in conteggi.columns))
+    for foglio, r in conteggi.iterrows():
+        print(f"  {foglio:<22}" + ''.join(f"{n:>12,}" for n in r))
+    print("="*60)
+
+
+if __name__ == '__main__':
+    main()
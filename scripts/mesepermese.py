@@ -0,0 +1,172 @@
+"""
+Lettura dei file contabili *_mesepermese.xlsx (un foglio per mese).
+
+Il workbook viene aperto una sola volta e vengono letti solo i fogli
+riconosciuti come mesi (es. '01_GENNAIO', '02_FEBBRAIIO', 'Marzo', '4').
+Con più workbook le coppie (società, foglio) si possono leggere in
+parallelo su un pool di processi: il risultato è lo stesso della lettura
+seriale, nello stesso ordine.
+
+Per i mastrini dettagliati (righe partitari, centinaia di migliaia di righe
+per foglio) leggi_a_blocchi() scorre i fogli in sola lettura e restituisce
+blocchi di al più CHUNK_RIGHE righe: la memoria resta costante al crescere
+del foglio, purché chi consuma i blocchi aggreghi man mano (vedi
+crea_dashboard.carica_ledger).
+"""
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+
+DATA_DIR = Path('data')
+
+# Anno dei file mesepermese in DATA_DIR
+ANNO = 2025
+
+# File mesepermese per società
+SOCIETA = {
+    'ORTI': 'ORTI_mesepermese.xlsx',
+    'INTUR': 'INTUR_mesepermese.xlsx',
+}
+
+MESI_NOMI = {
+    1: '01_GENNAIO', 2: '02_FEBBRAIO', 3: '03_MARZO', 4: '04_APRILE',
+    5: '05_MAGGIO', 6: '06_GIUGNO', 7: '07_LUGLIO', 8: '08_AGOSTO',
+    9: '09_SETTEMBRE', 10: '10_OTTOBRE', 11: '11_NOVEMBRE', 12: '12_DICEMBRE'
+}
+
+# Righe per blocco in leggi_a_blocchi
+CHUNK_RIGHE = 10_000
+
+# Mapping nomi italiani
+_MESI_MAP = {
+    'gennaio': 1, 'febbraio': 2, 'marzo': 3, 'aprile': 4,
+    'maggio': 5, 'giugno': 6, 'luglio': 7, 'agosto': 8,
+    'settembre': 9, 'ottobre': 10, 'novembre': 11, 'dicembre': 12
+}
+
+
+def mese_da_foglio(sheet_name: str):
+    """Numero del mese dal nome del foglio (es. "Gennaio", "01_GENNAIO", "01"), None se non è un mese"""
+    sheet_lower = sheet_name.lower().strip()
+
+    mese_num = None
+    for nome, num in _MESI_MAP.items():
+        if nome in sheet_lower:
+            mese_num = num
+            break
+
+    if mese_num is None:
+        # Prova parsing numerico
+        match = re.search(r'(\d+)', sheet_name)
+        if match:
+            mese_num = int(match.group(1))
+
+    if mese_num is None or mese_num < 1 or mese_num > 12:
+        return None
+    return mese_num
+
+
+def path_mesepermese(societa: str) -> Path:
+    return DATA_DIR / SOCIETA[societa]
+
+
+def leggi_fogli_mensili(input_file: Path) -> list:
+    """
+    Legge tutti i fogli mese aprendo il workbook una sola volta.
+    Restituisce [(mese, nome_foglio, DataFrame)] nell'ordine dei fogli.
+    """
+    fogli = []
+    with pd.ExcelFile(input_file) as xl:
+        print(f"  Sheet trovate: {xl.sheet_names}")
+        for sheet_name in xl.sheet_names:
+            mese_num = mese_da_foglio(sheet_name)
+            if mese_num is None:
+                print(f"  Skipping sheet '{sheet_name}' - non riconosciuto come mese")
+                continue
+            fogli.append((mese_num, sheet_name, xl.parse(sheet_name)))
+    return fogli
+
+
+def fogli_mese(input_file: Path) -> list:
+    """Elenco (mese, nome_foglio) letto dal solo indice del workbook, senza leggere i fogli"""
+    wb = load_workbook(input_file, read_only=True)
+    try:
+        sheet_names = wb.sheetnames
+    finally:
+        wb.close()
+    print(f"  Sheet trovate in {Path(input_file).name}: {sheet_names}")
+    fogli = []
+    for sheet_name in sheet_names:
+        mese_num = mese_da_foglio(sheet_name)
+        if mese_num is None:
+            print(f"  Skipping sheet '{sheet_name}' - non riconosciuto come mese")
+            continue
+        fogli.append((mese_num, sheet_name))
+    return fogli
+
+
+def _intestazione(nomi) -> list:
+    """Nomi colonna della prima riga come li dà read_excel ('Unnamed: i' per le celle vuote)"""
+    return [f'Unnamed: {i}' if n is None else n for i, n in enumerate(nomi)]
+
+
+def leggi_a_blocchi(input_file: Path, fogli: list = None, colonne: list = None, righe: int = CHUNK_RIGHE):
+    """
+    Generatore di (mese, nome_foglio, DataFrame) con al più `righe` righe
+    ciascuno, foglio per foglio; lo stesso foglio arriva in più blocchi
+    consecutivi. `fogli` limita la lettura a quei nomi foglio, `colonne` alle
+    colonne indicate (le altre celle non arrivano mai in un DataFrame).
+    """
+    wb = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        if fogli is None:
+            print(f"  Sheet trovate in {Path(input_file).name}: {wb.sheetnames}")
+        for sheet_name in wb.sheetnames:
+            mese_num = mese_da_foglio(sheet_name)
+            if mese_num is None or (fogli is not None and sheet_name not in fogli):
+                continue
+            righe_foglio = wb[sheet_name].iter_rows(values_only=True)
+            nomi = _intestazione(next(righe_foglio, ()))
+            indici = [i for i, n in enumerate(nomi) if colonne is None or n in colonne]
+            nomi = [nomi[i] for i in indici]
+
+            blocco = []
+            for riga in righe_foglio:
+                blocco.append([riga[i] if i < len(riga) else None for i in indici])
+                if len(blocco) == righe:
+                    yield mese_num, sheet_name, pd.DataFrame(blocco, columns=nomi)
+                    blocco = []
+            if blocco:
+                yield mese_num, sheet_name, pd.DataFrame(blocco, columns=nomi)
+    finally:
+        wb.close()
+
+
+def _leggi_foglio(input_file: Path, sheet_name: str) -> pd.DataFrame:
+    return pd.read_excel(input_file, sheet_name=sheet_name)
+
+
+def leggi_fogli_paralleli(files: dict, workers: int = 1) -> dict:
+    """
+    Legge i fogli mese di più workbook, {chiave: path} -> {chiave: [(mese, nome_foglio, DataFrame)]}.
+    Con workers > 1 ogni coppia (workbook, foglio) è un job separato del pool;
+    i risultati sono ricomposti nell'ordine dei file e dei fogli.
+    """
+    if workers <= 1:
+        return {chiave: leggi_fogli_mensili(path) for chiave, path in files.items()}
+
+    jobs = [
+        (chiave, mese_num, sheet_name)
+        for chiave, path in files.items()
+        for mese_num, sheet_name in fogli_mese(path)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = pool.map(_leggi_foglio, [files[c] for c, _, _ in jobs], [s for _, _, s in jobs])
+        risultato = {chiave: [] for chiave in files}
+        for (chiave, mese_num, sheet_name), df in zip(jobs, frames):
+            risultato[chiave].append((mese_num, sheet_name, df))
+    return risultato
@@ -0,0 +1,108 @@
+"""
+Archivio costi personale per (società, anno), con i confronti fra anni.
+
+Il dettaglio per file PC (stesse colonne di personale_dettaglio.csv) sta
+nella tabella 'personale' dell'archivio colonnare (archivio.py), partizionata
+per societa/anno/mese: è l'unica copia, letta sia dai dashboard
+(aggiorna_personale_dashboard.carica_personale) sia dai confronti qui sotto.
+Una partizione viene riscritta solo se il suo contenuto cambia: aggiungere
+un file 2026 tocca solo le partizioni 2026, gli anni precedenti restano
+disponibili anche se i prospetti originali sono stati archiviati.
+
+Gli importi sono centesimi interi, vedi importi.py.
+
+Esempi:
+    import personale_store as ps
+    ps.mensile(anni=[2025])
+    ps.stesso_mese_anno_precedente(2026, 3)
+    ps.ytd_vs_precedente(2026, 8, societa=['ORTI'])
+"""
+
+import pandas as pd
+
+import archivio
+
+TABELLA = 'personale'
+PARTIZIONI = ['societa', 'anno', 'mese']
+
+COLONNE = ['societa', 'tipo', 'anno', 'mese', 'retribuzioni', 'oneri', 'totale', 'file']
+VALORI = ['retribuzioni', 'oneri', 'totale']
+
+
+def partizioni() -> list:
+    """Elenco delle coppie (societa, anno) presenti in archivio"""
+    try:
+        parti = archivio.partizioni(TABELLA)
+    except FileNotFoundError:
+        return []
+    return sorted({(chiavi['societa'], chiavi['anno']) for chiavi, _ in parti})
+
+
+def scrivi(df: pd.DataFrame) -> list:
+    """
+    Salva il dettaglio (importi in centesimi) nelle partizioni presenti in df.
+    Le partizioni con contenuto invariato non vengono toccate; quelle
+    assenti da df restano come sono. Restituisce i path riscritti.
+    """
+    return archivio.scrivi(df[COLONNE], TABELLA, PARTIZIONI, importi=VALORI)
+
+
+def carica(societa: list = None, anni: list = None) -> pd.DataFrame:
+    """
+    Carica il dettaglio leggendo solo le partizioni richieste, importi in centesimi.
+    Le società sono restituite nell'ordine indicato (default: alfabetico).
+    """
+    filtri = {}
+    if societa is not None:
+        filtri['societa'] = list(societa)
+    if anni is not None:
+        filtri['anno'] = list(anni)
+    try:
+        df = archivio.leggi(TABELLA, colonne=COLONNE, filtri=filtri)
+    except FileNotFoundError:
+        df = pd.DataFrame(columns=COLONNE)
+    if df.empty:
+        return pd.DataFrame(columns=COLONNE).astype({v: 'int64' for v in VALORI})
+    ordine = sorted(df['societa'].unique()) if societa is None else list(societa)
+    df['societa'] = pd.Categorical(df['societa'], categories=ordine, ordered=True)
+    df = df.sort_values(['societa', 'anno', 'mese'], kind='stable', ignore_index=True)
+    df['societa'] = df['societa'].astype(object)
+    return df
+
+
+def mensile(societa: list = None, anni: list = None) -> pd.DataFrame:
+    """Totali per società/anno/mese (somma dipendenti + stagionali + collaboratori + 13ma/14ma)"""
+    df = carica(societa, anni)
+    return (
+        df.groupby(['societa', 'anno', 'mese'])[VALORI]
+        .sum()
+        .reset_index()
+        .sort_values(['societa', 'anno', 'mese'], ignore_index=True)
+    )
+
+
+def _confronta(corrente: pd.DataFrame, precedente: pd.DataFrame) -> pd.DataFrame:
+    df = corrente.join(precedente, lsuffix='', rsuffix='_prec', how='outer').fillna(0).astype('int64')
+    for v in VALORI:
+        df[f'{v}_delta'] = df[v] - df[f'{v}_prec']
+    return df.reset_index()
+
+
+def stesso_mese_anno_precedente(anno: int, mese: int, societa: list = None) -> pd.DataFrame:
+    """Mese `mese` dell'anno vs stesso mese dell'anno prima, per società"""
+    df = mensile(societa, anni=[anno, anno - 1])
+    df = df[df['mese'] == mese]
+    corrente = df[df['anno'] == anno].set_index('societa')[VALORI]
+    precedente = df[df['anno'] == anno - 1].set_index('societa')[VALORI]
+    return _confronta(corrente, precedente)
+
+
+def ytd_vs_precedente(anno: int, fino_al_mese: int, societa: list = None) -> pd.DataFrame:
+    """Progressivo gennaio..fino_al_mese dell'anno vs stesso periodo dell'anno prima, per società"""
+    df = mensile(societa, anni=[anno, anno - 1])
+    df = df[df['mese'] <= fino_al_mese]
+    ytd = df.groupby(['anno', 'societa'])[VALORI].sum()
+    vuoto = pd.DataFrame(columns=VALORI, dtype='int64')
+    corrente = ytd.loc[anno] if anno in ytd.index.get_level_values(0) else vuoto
+    precedente = ytd.loc[anno - 1] if anno - 1 in ytd.index.get_level_values(0) else vuoto
+    return _confronta(corrente, precedente)
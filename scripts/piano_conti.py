@@ -0,0 +1,117 @@
+"""
+Indice del piano dei conti: albero dei prefissi sui codici puntati
+(es. 47 -> 47.91 -> 47.91.01).
+
+Si costruisce una volta per workbook in tempo lineare nel numero di codici;
+foglia/padre, livello e antenati costano O(profondità), i discendenti di un
+conto O(risultato). Un conto è foglia se nessun altro codice inizia con
+"<conto>." (stessa regola del vecchio is_true_leaf), anche quando i livelli
+intermedi mancano dal piano.
+
+Esempio:
+    piano = PianoConti(['47.91', '47.91.01', '47.91.03', '55.01.05'])
+    piano.is_foglia('47.91')        # False
+    piano.discendenti('47.91')      # ['47.91.01', '47.91.03']
+    piano.livelli('55.01.05')       # ('55', '55.01', '55.01.05')
+"""
+
+import pandas as pd
+
+SEPARATORE = '.'
+
+
+class PianoConti:
+    """Albero dei prefissi sui codici conto"""
+
+    def __init__(self, codici=()):
+        self._figli = {}       # nodo -> figli diretti, nell'ordine di inserimento
+        self._presenti = {}    # codici effettivamente nel piano (dict per tenere l'ordine)
+        for codice in codici:
+            self.aggiungi(codice)
+
+    def aggiungi(self, codice: str):
+        """Inserisce un codice e, come nodi impliciti, i suoi prefissi mancanti"""
+        if codice in self._presenti:
+            return
+        self._presenti[codice] = None
+        if codice in self._figli:
+            return  # era già un nodo implicito, collegato ai suoi prefissi
+        self._figli[codice] = []
+        nodo, padre = codice, self.padre(codice)
+        while padre is not None:
+            esisteva = padre in self._figli
+            self._figli.setdefault(padre, []).append(nodo)
+            if esisteva:
+                break
+            nodo, padre = padre, self.padre(padre)
+
+    def __contains__(self, codice) -> bool:
+        return codice in self._presenti
+
+    def __len__(self) -> int:
+        return len(self._presenti)
+
+    def __iter__(self):
+        return iter(self._presenti)
+
+    @staticmethod
+    def padre(codice: str):
+        """Codice del livello superiore ('47.91' -> '47'), None per i conti di primo livello"""
+        pos = codice.rfind(SEPARATORE)
+        return codice[:pos] if pos > 0 else None
+
+    @staticmethod
+    def livello(codice: str) -> int:
+        """Numero di segmenti del codice ('47' -> 1, '47.91.01' -> 3)"""
+        return codice.count(SEPARATORE) + 1
+
+    @staticmethod
+    def antenati(codice: str) -> list:
+        """Prefissi dal primo livello al padre ('47.91.01' -> ['47', '47.91'])"""
+        parti = codice.split(SEPARATORE)
+        return [SEPARATORE.join(parti[:i]) for i in range(1, len(parti))]
+
+    @staticmethod
+    def livelli(codice: str, n: int = 3) -> tuple:
+        """Prefissi ai primi n livelli, '' dove il codice è più corto (conto_l1..conto_l3)"""
+        parti = codice.split(SEPARATORE)
+        return tuple(SEPARATORE.join(parti[:i]) if i <= len(parti) else '' for i in range(1, n + 1))
+
+    def figli(self, codice: str) -> list:
+        """Figli diretti nell'albero (anche nodi impliciti)"""
+        return list(self._figli.get(codice, ()))
+
+    def is_foglia(self, codice: str) -> bool:
+        return not self._figli.get(codice)
+
+    def foglie(self) -> list:
+        """Codici del piano senza sotto-conti, nell'ordine di inserimento"""
+        return [c for c in self._presenti if not self._figli.get(c)]
+
+    def discendenti(self, codice: str) -> list:
+        """Tutti i codici del piano sotto `codice` (escluso), in ordine di visita"""
+        risultato = []
+        pila = list(reversed(self._figli.get(codice, ())))
+        while pila:
+            nodo = pila.pop()
+            if nodo in self._presenti:
+                risultato.append(nodo)
+            pila.extend(reversed(self._figli[nodo]))
+        return risultato
+
+    def tabella_livelli(self, n: int = 3, livello_max: int = None) -> pd.DataFrame:
+        """
+        Una riga per codice del piano con livello e conto_l1..conto_l<n>,
+        indicizzata per codice: da unire al mastrino con join(on='Conto').
+        """
+        codici = list(self._presenti)
+        tabella = pd.DataFrame(
+            [self.livelli(c, n) for c in codici],
+            index=pd.Index(codici, name='codice'),
+            columns=[f'conto_l{i}' for i in range(1, n + 1)],
+        )
+        livello = pd.Series([self.livello(c) for c in codici], index=tabella.index)
+        if livello_max is not None:
+            livello = livello.clip(upper=livello_max)
+        tabella.insert(0, 'livello', livello)
+        return tabella
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Riconciliazione del personale: prospetti contabili (PC) contro i conti
+personale del mesepermese.
+
+I dashboard prendono il personale dai PC (aggiorna_personale_dashboard.py),
+mentre nel Conto Economico lo stesso costo è nei conti 67.* / 61.*
+(classificazione.py). Qui le due fonti si confrontano per società × mese ×
+voce in una sola passata:
+
+- RETRIBUZIONI: PC retribuzioni vs conti 67.01.01 (retribuzioni lorde)
+- ONERI:        PC oneri vs gli altri conti 67.01 (contributi, TFR, ...)
+- PERSONALE:    PC totale vs RETRIBUZIONI + ONERI della contabilità
+
+Ogni conto che il dashboard conta come PERSONALE ha una voce in
+VOCI_CONTABILI. I costi del personale che nei PC non ci sono (67.03 costi
+diversi del personale, 61.* lavoro autonomo) vanno nella voce ALTRI: sono
+riportati come FUORI PC, senza confronto, così RETRIBUZIONI + ONERI + ALTRI
+della contabilità fa il PERSONALE del Conto Economico.
+
+Le righe con |differenza| oltre la tolleranza finiscono nel report eccezioni.
+I mesepermese sono di un solo anno (mesepermese.ANNO): --anno deve essere
+quello.
+
+Output: output/riconciliazione_personale.csv (solo eccezioni, importi in euro)
+
+USAGE:
+    python scripts/riconciliazione_personale.py
+    python scripts/riconciliazione_personale.py --anno 2025 --tolleranza 50
+    python scripts/riconciliazione_personale.py --tutte    # anche le righe in tolleranza
+"""
+
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from aggiorna_personale_dashboard import MESI_NOME, carica_personale
+from classificazione import Classificatore, classifica
+from crea_dashboard import carica_ledger_con_cache
+from importi import centesimi, euro, in_euro
+from mesepermese import ANNO, SOCIETA, path_mesepermese
+
+OUTPUT_DIR = Path('output')
+
+VOCI = ['RETRIBUZIONI', 'ONERI', 'PERSONALE']
+FUORI_PC = 'ALTRI'
+
+# Conti del Conto Economico -> voce dei PC (prefisso più lungo, come
+# classificazione.py). Copre tutti i conti PERSONALE di classificazione.py.
+VOCI_CONTABILI = {
+    '67.01.01': 'RETRIBUZIONI',   # retribuzioni lorde
+    '67.01': 'ONERI',             # contributi, INAIL, TFR, ...
+    '67.': FUORI_PC,              # 67.03 costi diversi del personale (vestiario, reclutamento, ...)
+    '61.': FUORI_PC,              # lavoro autonomo e consulenze
+}
+VOCE_CONTABILE = Classificatore(VOCI_CONTABILI)
+
+TOLLERANZA_DEFAULT = 1.0  # euro
+
+
+def personale_contabile(ledger: dict) -> pd.DataFrame:
+    """
+    Conti personale dei ledger {societa: ledger} per (societa, mese, voce),
+    centesimi: RETRIBUZIONI, ONERI, PERSONALE (la loro somma) e ALTRI
+    """
+    df = pd.concat(ledger, names=['societa', None]).reset_index('societa')
+    df = df[classifica(df['conto'])['categoria'] == 'PERSONALE']
+    df = df.assign(voce=VOCE_CONTABILE.applica(df['conto']))
+    senza_voce = df.loc[df['voce'].isna(), 'conto'].unique()
+    if len(senza_voce):
+        raise ValueError(f"Conti personale senza voce in VOCI_CONTABILI: {', '.join(sorted(senza_voce))}")
+    voci = pd.concat([df, df[df['voce'].isin(['RETRIBUZIONI', 'ONERI'])].assign(voce='PERSONALE')])
+    return voci.groupby(['societa', 'mese', 'voce'])['importo'].sum().rename('contabilita')
+
+
+def personale_prospetti(personale: pd.DataFrame) -> pd.Series:
+    """carica_personale() in forma lunga per (societa, mese, voce), centesimi"""
+    return personale[VOCI].rename_axis(columns='voce').stack().rename('prospetti')
+
+
+def riconcilia(ledger: dict, personale: pd.DataFrame, tolleranza_centesimi: int = 0) -> pd.DataFrame:
+    """
+    Confronto PC vs contabilità per ogni società × mese × voce presente in
+    almeno una delle due fonti. Importi in centesimi.
+    """
+    df = pd.concat([personale_prospetti(personale), personale_contabile(ledger)], axis=1)
+    df = df.fillna(0).astype('int64').reset_index()
+    df['differenza'] = df['prospetti'] - df['contabilita']
+
+    # Mesi senza PC: il dashboard non ha il personale, ma la contabilità sì
+    con_pc = pd.MultiIndex.from_frame(df[['societa', 'mese']]).isin(personale.index)
+    df['stato'] = 'OK'
+    fuori = df['differenza'].abs() > tolleranza_centesimi
+    df.loc[fuori, 'stato'] = 'DIFFERENZA'
+    df.loc[fuori & ~con_pc, 'stato'] = 'MANCA PC'
+    df.loc[fuori & con_pc & (df['contabilita'] == 0), 'stato'] = 'NON IN CONTABILITA'
+    df.loc[df['voce'] == FUORI_PC, 'stato'] = 'FUORI PC'
+
+    df['voce'] = pd.Categorical(df['voce'], categories=VOCI + [FUORI_PC], ordered=True)
+    df = df.sort_values(['societa', 'mese', 'voce'], ignore_index=True)
+    df['voce'] = df['voce'].astype(object)
+    df.insert(2, 'Mese', df['mese'].map(MESI_NOME))
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Riconciliazione personale: prospetti PC vs conti 67.*/61.*")
+    parser.add_argument("--anno", type=int, default=ANNO, help=f"Anno dei file mesepermese e dei PC (default: {ANNO})")
+    parser.add_argument(
+        "--tolleranza", "-t", type=float, default=TOLLERANZA_DEFAULT,
+        help=f"Differenza massima in euro considerata in quadratura (default: {TOLLERANZA_DEFAULT:g})"
+    )
+    parser.add_argument("--tutte", action="store_true", help="Scrive anche le righe in tolleranza")
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Processi paralleli per la lettura dei fogli mese (default: 1, seriale)"
+    )
+    parser.add_argument("--force", "-f", action="store_true", help="Rilegge tutti i workbook ignorando la cache")
+    args = parser.parse_args()
+    if args.anno != ANNO:
+        parser.error(f"i file mesepermese in {path_mesepermese(next(iter(SOCIETA))).parent} sono del {ANNO}, "
+                     f"non del {args.anno}")
+
+    files = {societa: path_mesepermese(societa) for societa in SOCIETA}
+    ledger = carica_ledger_con_cache(files, workers=args.workers, force=args.force)
+    df = riconcilia(ledger, carica_personale(args.anno), centesimi(args.tolleranza))
+    eccezioni = df[~df['stato'].isin(['OK', 'FUORI PC'])]
+
+    path = OUTPUT_DIR / 'riconciliazione_personale.csv'
+    in_euro(df if args.tutte else eccezioni, ['prospetti', 'contabilita', 'differenza']).to_csv(path, index=False)
+    print(f"Salvato: {path}")
+
+    print("\n" + "="*80)
+    print(f"RICONCILIAZIONE PERSONALE {args.anno} (tolleranza €{args.tolleranza:,.2f})")
+    print("="*80)
+    print(f"Confronti: {len(df)}, eccezioni: {len(eccezioni)}")
+    for stato, n in eccezioni['stato'].value_counts().items():
+        print(f"   {stato}: {n}")
+
+    totali = df[df['voce'] == 'PERSONALE'].groupby('societa')[['prospetti', 'contabilita', 'differenza']].sum()
+    altri = df[df['voce'] == FUORI_PC].groupby('societa')['contabilita'].sum()
+    print(f"\n  {'PERSONALE':<10} {'Prospetti':>16} {'Contabilità':>16} {'Differenza':>16} {'Fuori PC':>16}")
+    for societa, r in totali.iterrows():
+        print(f"  {societa:<10} {euro(r['prospetti']):>16,.2f} {euro(r['contabilita']):>16,.2f} "
+              f"{euro(r['differenza']):>16,.2f} {euro(altri.get(societa, 0)):>16,.2f}")
+    print("="*80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Scritture su Google Sheets raccolte e inviate in blocco.
+
+Ogni chiamata gspread su un foglio (update, format, freeze, resize, clear) è
+una richiesta HTTP: ricostruire i dashboard ne costava decine e finiva contro
+la quota di scritture al minuto. Batch raccoglie le operazioni su tutto lo
+spreadsheet e flush() le invia con il minimo di chiamate:
+
+1. una spreadsheets.batchUpdate: fogli nuovi (addSheet), dimensioni e righe
+   bloccate (updateSheetProperties, una per foglio), pulizia (updateCells),
+   formati (repeatCell) e intervalli con nome (addNamedRange /
+   updateNamedRange), nell'ordine in cui sono stati chiesti
+2. una values.batchUpdate per ogni valueInputOption usata (di solito una sola,
+   USER_ENTERED, così le formule restano formule); con flush(workers=N) una
+   per foglio, inviate in parallelo (la quota la gestisce sheets_quota.py)
+
+I valori si scrivono dopo la batchUpdate: un foglio pulito e riscritto nello
+stesso batch ha i valori nuovi. I fogli e gli intervalli con nome esistenti
+si risolvono con una sola lettura dei metadati dello spreadsheet.
+
+FoglioBatch espone gli stessi metodi di gspread.Worksheet usati dagli script
+(update, format, freeze, resize, clear), che accodano invece di inviare, più
+note() per le note di cella (anche quelle nella batchUpdate).
+
+Modalità incrementale (Batch(spreadsheet, incrementale=True)): clear() non
+svuota più il foglio e update() non riscrive tutta la griglia. Al flush le
+griglie attuali dei fogli toccati si leggono con una sola values.batchGet
+(formule come formule) e si scrivono solo le celle cambiate, raggruppate in
+rettangoli (blocchi_modificati). Dopo un clear() le celle rimaste fuori dai
+dati nuovi (di tutti gli update() sul foglio) vengono svuotate. Una cella
+None nei valori resta com'è, come per l'API: così le celle riempite da una
+formula matrice vicina non vengono riscritte né svuotate. Per un aggiornamento mensile sono poche celle,
+e chi guarda il foglio non lo vede mai vuoto a metà upload.
+
+USO:
+    batch = Batch(spreadsheet)
+    ws = batch.foglio('Riepilogo', rows=30, cols=6)
+    ws.clear()
+    ws.update(range_name='A1', values=dati)
+    ws.format('A1', {'textFormat': {'bold': True}})
+    batch.flush()
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, rowcol_to_a1
+
+
+def _uguali(attuale, nuovo) -> bool:
+    """Cella letta (render FORMULA) contro valore da scrivere; vuoto e None coincidono"""
+    attuale = '' if attuale is None else attuale
+    nuovo = '' if nuovo is None else nuovo
+    numeri = (int, float)
+    if isinstance(attuale, numeri) and isinstance(nuovo, numeri) and not isinstance(nuovo, bool):
+        return math.isclose(attuale, nuovo, rel_tol=1e-12, abs_tol=1e-9)
+    return attuale == nuovo
+
+
+def blocchi_modificati(attuali: list, nuovi: list, tutto: bool = False) -> list:
+    """
+    Celle da riscrivere perché `attuali` diventi `nuovi` (liste di righe,
+    righe corte = celle vuote), come rettangoli [(riga, colonna, valori)] con
+    riga e colonna da 0. Le celle cambiate consecutive di una riga formano un
+    tratto; tratti con le stesse colonne in righe consecutive si uniscono.
+    Le celle None di `nuovi` restano come sono e non sono mai cambiate.
+    Con tutto=True si confronta anche l'area di `attuali` fuori da `nuovi`
+    (le celle lì vengono svuotate), altrimenti solo l'area di `nuovi`.
+    """
+    def cella(griglia, r, c):
+        return griglia[r][c] if r < len(griglia) and c < len(griglia[r]) else ''
+
+    n_righe = max(len(nuovi), len(attuali) if tutto else 0)
+    aperti, chiusi = {}, []       # {(c0, c1): [r0, r1]}
+    for r in range(n_righe):
+        n_col = max(len(nuovi[r]) if r < len(nuovi) else 0,
+                    len(attuali[r]) if tutto and r < len(attuali) else 0)
+        tratti, inizio = [], None
+        for c in range(n_col + 1):
+            nuova = cella(nuovi, r, c) if c < n_col else None
+            cambiata = nuova is not None and not _uguali(cella(attuali, r, c), nuova)
+            if cambiata and inizio is None:
+                inizio = c
+            elif not cambiata and inizio is not None:
+                tratti.append((inizio, c - 1))
+                inizio = None
+        for tratto in tratti:
+            if tratto in aperti and aperti[tratto][1] == r - 1:
+                aperti[tratto][1] = r
+            else:
+                if tratto in aperti:
+                    chiusi.append((tratto, aperti[tratto]))
+                aperti[tratto] = [r, r]
+    chiusi.extend(aperti.items())
+
+    return sorted(
+        (r0, c0, [[cella(nuovi, r, c) for c in range(c0, c1 + 1)] for r in range(r0, r1 + 1)])
+        for (c0, c1), (r0, r1) in chiusi
+    )
+
+
+class FoglioBatch:
+    """Un foglio dello spreadsheet; le operazioni finiscono nel Batch"""
+
+    def __init__(self, batch, titolo: str, sheet_id: int):
+        self.batch = batch
+        self.title = titolo
+        self.id = sheet_id
+
+    def update(self, values, range_name: str = 'A1', value_input_option: str = 'USER_ENTERED'):
+        if self.batch.incrementale:
+            self.batch._da_confrontare.append((self, range_name, values, value_input_option))
+            return
+        self.batch._valori.setdefault(value_input_option, []).append(
+            {'range': f"'{self.title}'!{range_name}", 'values': values}
+        )
+
+    def format(self, ranges, format: dict):
+        for intervallo in ranges if isinstance(ranges, list) else [ranges]:
+            self.batch._richieste.append({'repeatCell': {
+                'range': a1_range_to_grid_range(intervallo, self.id),
+                'cell': {'userEnteredFormat': format},
+                'fields': f"userEnteredFormat({','.join(format)})",
+            }})
+
+    def freeze(self, rows: int = None, cols: int = None):
+        if rows is not None:
+            self.batch._griglia(self.id)['frozenRowCount'] = rows
+        if cols is not None:
+            self.batch._griglia(self.id)['frozenColumnCount'] = cols
+
+    def resize(self, rows: int = None, cols: int = None):
+        if rows is not None:
+            self.batch._griglia(self.id)['rowCount'] = rows
+        if cols is not None:
+            self.batch._griglia(self.id)['columnCount'] = cols
+
+    def note(self, notes: list = None, range_name: str = 'A1'):
+        """Note di cella da range_name, griglia come update ('' = nessuna nota); senza notes toglie tutte le note"""
+        if notes is None:
+            self.batch._richieste.append({'updateCells': {'range': {'sheetId': self.id}, 'fields': 'note'}})
+            return
+        riga, colonna = a1_to_rowcol(range_name)
+        self.batch._richieste.append({'updateCells': {
+            'range': {'sheetId': self.id, 'startRowIndex': riga - 1, 'startColumnIndex': colonna - 1},
+            'rows': [{'values': [{'note': nota} if nota else {} for nota in riga_note]} for riga_note in notes],
+            'fields': 'note',
+        }})
+
+    def clear(self):
+        """Solo i valori, come gspread.Worksheet.clear(): i formati restano"""
+        if self.batch.incrementale:
+            self.batch._puliti.add(self.title)
+            return
+        self.batch._richieste.append({'updateCells': {'range': {'sheetId': self.id}, 'fields': 'userEnteredValue'}})
+
+
+class Batch:
+    """Operazioni su uno spreadsheet gspread, inviate da flush()"""
+
+    def __init__(self, spreadsheet, incrementale: bool = False):
+        self.spreadsheet = spreadsheet
+        self.incrementale = incrementale
+        self._fogli = None        # {titolo: sheetId}, letto alla prima richiesta
+        self._nomi = {}           # {nome: namedRangeId} degli intervalli con nome esistenti
+        self._nomi_nuovi = {}     # {nome: namedRange} da creare al flush
+        self._nuovi = []          # richieste addSheet
+        self._proprieta = {}      # {sheetId: gridProperties da aggiornare}
+        self._richieste = []
+        self._valori = {}         # {valueInputOption: [ValueRange]}
+        self._da_confrontare = [] # incrementale: (foglio, cella, valori, valueInputOption)
+        self._puliti = set()      # incrementale: fogli con clear()
+        self.celle = 0            # celle scritte dall'ultimo flush incrementale
+
+    def _id_fogli(self) -> dict:
+        if self._fogli is None:
+            metadati = self.spreadsheet.fetch_sheet_metadata()
+            self._fogli = {s['properties']['title']: s['properties']['sheetId'] for s in metadati['sheets']}
+            self._nomi = {n['name']: n['namedRangeId'] for n in metadati.get('namedRanges', [])}
+        return self._fogli
+
+    def _griglia(self, sheet_id: int) -> dict:
+        return self._proprieta.setdefault(sheet_id, {})
+
+    def esiste(self, titolo: str) -> bool:
+        return titolo in self._id_fogli()
+
+    def foglio(self, titolo: str, rows: int = 100, cols: int = 26, ridimensiona: bool = True) -> FoglioBatch:
+        """
+        Il foglio `titolo`, creato con rows x cols se non c'è. Se esiste viene
+        ridimensionato a rows x cols, salvo ridimensiona=False.
+        """
+        fogli = self._id_fogli()
+        if titolo in fogli:
+            ws = FoglioBatch(self, titolo, fogli[titolo])
+            if ridimensiona:
+                ws.resize(rows=rows, cols=cols)
+            return ws
+
+        sheet_id = max(fogli.values(), default=0) + 1
+        fogli[titolo] = sheet_id
+        self._nuovi.append({'addSheet': {'properties': {
+            'sheetId': sheet_id, 'title': titolo, 'gridProperties': {'rowCount': rows, 'columnCount': cols},
+        }}})
+        return FoglioBatch(self, titolo, sheet_id)
+
+    def intervallo_nominato(self, nome: str, titolo: str, intervallo: str):
+        """Definisce (o sposta, se esiste già) l'intervallo con nome `nome` su titolo!intervallo"""
+        griglia = a1_range_to_grid_range(intervallo, self._id_fogli()[titolo])
+        if nome in self._nomi:
+            self._richieste.append({'updateNamedRange': {
+                'namedRange': {'namedRangeId': self._nomi[nome], 'name': nome, 'range': griglia}, 'fields': 'range',
+            }})
+        elif nome in self._nomi_nuovi:
+            self._nomi_nuovi[nome]['range'] = griglia
+        else:
+            self._nomi_nuovi[nome] = {'name': nome, 'range': griglia}
+            self._richieste.append({'addNamedRange': {'namedRange': self._nomi_nuovi[nome]}})
+
+    def richieste(self) -> list:
+        """Le richieste della batchUpdate, nell'ordine di invio"""
+        proprieta = [
+            {'updateSheetProperties': {
+                'properties': {'sheetId': sheet_id, 'gridProperties': griglia},
+                'fields': ','.join(f'gridProperties.{campo}' for campo in griglia),
+            }}
+            for sheet_id, griglia in self._proprieta.items()
+        ]
+        return self._nuovi + proprieta + self._richieste
+
+    def _confronta(self):
+        """Incrementale: una lettura per tutti i fogli toccati, poi solo i blocchi cambiati in _valori"""
+        titoli = list(dict.fromkeys(ws.title for ws, *_ in self._da_confrontare))
+        letti = self.spreadsheet.values_batch_get(
+            [f"'{titolo}'" for titolo in titoli], params={'valueRenderOption': 'FORMULA'}
+        )
+        attuali = dict(zip(titoli, (vr.get('values', []) for vr in letti['valueRanges'])))
+
+        def accoda(titolo, riga0, col0, blocchi, opzione):
+            for r, c, blocco in blocchi:
+                self._valori.setdefault(opzione, []).append(
+                    {'range': f"'{titolo}'!{rowcol_to_a1(riga0 + r + 1, col0 + c + 1)}", 'values': blocco}
+                )
+                self.celle += sum(len(riga) for riga in blocco)
+
+        self.celle = 0
+        scritte = {}              # fogli puliti: {titolo: [righe, None = cella scritta]}
+        for ws, cella, valori, opzione in self._da_confrontare:
+            riga0, col0 = (n - 1 for n in a1_to_rowcol(cella))
+            griglia = [r[col0:] for r in attuali[ws.title][riga0:]]
+            accoda(ws.title, riga0, col0, blocchi_modificati(griglia, valori), opzione)
+            if ws.title in self._puliti:
+                coperte = scritte.setdefault(ws.title, [])
+                for r, riga in enumerate(valori, riga0):
+                    coperte.extend([] for _ in range(r + 1 - len(coperte)))
+                    coperte[r].extend('' for _ in range(col0 + len(riga) - len(coperte[r])))
+                    coperte[r][col0:col0 + len(riga)] = [None] * len(riga)
+
+        # Un solo clear per foglio: si svuota quello che nessun update() ha scritto
+        for titolo, coperte in scritte.items():
+            accoda(titolo, 0, 0, blocchi_modificati(attuali[titolo], coperte, tutto=True), 'USER_ENTERED')
+
+    def _invii_valori(self, workers: int) -> list:
+        """Corpi delle values.batchUpdate: uno per opzione, o uno per foglio e opzione con workers > 1"""
+        if workers <= 1:
+            return [{'valueInputOption': opzione, 'data': dati} for opzione, dati in self._valori.items()]
+        per_foglio = {}
+        for opzione, dati in self._valori.items():
+            for vr in dati:
+                foglio = vr['range'].rsplit('!', 1)[0]
+                per_foglio.setdefault((foglio, opzione), []).append(vr)
+        return [{'valueInputOption': opzione, 'data': dati} for (_, opzione), dati in per_foglio.items()]
+
+    def flush(self, workers: int = 1) -> int:
+        """
+        Invia tutto e svuota il batch; restituisce il numero di chiamate HTTP.
+        Con workers > 1 i valori dei fogli partono in parallelo, uno per foglio.
+        """
+        chiamate = 0
+        if richieste := self.richieste():
+            risposta = self.spreadsheet.batch_update({'requests': richieste})
+            chiamate += 1
+            # Gli intervalli appena creati: un'altra definizione nello stesso Batch li aggiorna
+            for r in (risposta or {}).get('replies', []):
+                if 'addNamedRange' in r:
+                    nuovo = r['addNamedRange']['namedRange']
+                    self._nomi[nuovo['name']] = nuovo['namedRangeId']
+        # Dopo la batchUpdate: i fogli nuovi esistono e le griglie hanno le dimensioni finali
+        if self._da_confrontare:
+            self._confronta()
+            chiamate += 1
+        invii = self._invii_valori(workers)
+        if workers > 1 and len(invii) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(self.spreadsheet.values_batch_update, invii))
+        else:
+            for corpo in invii:
+                self.spreadsheet.values_batch_update(corpo)
+        chiamate += len(invii)
+
+        self._nuovi, self._proprieta, self._richieste, self._valori = [], {}, [], {}
+        self._da_confrontare, self._puliti, self._nomi_nuovi = [], set(), {}
+        return chiamate
@@ -0,0 +1,150 @@
+"""
+Client Google Sheets condiviso dagli script (upload, dashboard avanzati,
+mastrini, verifiche).
+
+Ogni script costruiva il proprio client (credenziali, token, sessione HTTP,
+open_by_key) e cercava le credenziali in posti diversi. Qui:
+
+- credenziali: --credentials se indicato, altrimenti il primo file esistente
+  di PERCORSI_CREDENZIALI (config/hotelHops.json per primo)
+- token: il token d'accesso del service account si salva in
+  output/cache/sheets_token.json fino alla scadenza, così gli script lanciati
+  uno dopo l'altro si autenticano una volta sola (il file è solo dell'utente)
+- client(): un gspread.Client per file di credenziali e per processo, con una
+  sola sessione HTTP (pool di connessioni) e le chiamate in quota di
+  sheets_quota.py
+- apri(): uno spreadsheet per ID, aperto una volta sola
+- metadati: CacheHTTPClient tiene in memoria i metadati dello spreadsheet
+  (fogli, titoli, sheetId), così spreadsheet.worksheet(nome) e
+  Batch.foglio() non rileggono ogni volta; ogni batchUpdate (fogli nuovi,
+  ridimensionamenti, anche da gspread) li invalida
+
+USO:
+    from sheets_client import apri
+    spreadsheet = apri()                    # SPREADSHEET_ID, credenziali di default
+    ws = spreadsheet.worksheet('Riepilogo') # nessuna rilettura dei metadati
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+from cache import CACHE_DIR, hash_valore
+from sheets_quota import BUCKET, QuotaHTTPClient
+
+SPREADSHEET_ID = "1CAT_EN6DOXyT3vEbYmnwRQh1pWrdnrCXHFWR--JtFmQ"
+SERVICE_ACCOUNT_EMAIL = "drive-audit@hotelops-suite.iam.gserviceaccount.com"
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+PROJECT_DIR = Path(__file__).parent.parent
+PERCORSI_CREDENZIALI = [
+    PROJECT_DIR / "config" / "hotelHops.json",
+    Path.home() / ".config" / "gspread" / "service_account.json",
+    Path.home() / ".gspread" / "service_account.json",
+    PROJECT_DIR / "credentials" / "service_account.json",
+    PROJECT_DIR / "scripts" / "service_account.json",
+]
+
+TOKEN_CACHE = CACHE_DIR / "sheets_token.json"
+CONNESSIONI = 16          # pool della sessione: basta per Batch.flush(workers=N)
+
+_lock = threading.Lock()
+_client = {}              # {percorso credenziali: gspread.Client}
+_spreadsheet = {}         # {(percorso credenziali, spreadsheet_id): gspread.Spreadsheet}
+
+
+class CacheHTTPClient(QuotaHTTPClient):
+    """QuotaHTTPClient con i metadati degli spreadsheet in memoria fino al prossimo batchUpdate"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metadati = {}       # {spreadsheet_id: metadati senza params}
+        self._lock_metadati = threading.Lock()
+
+    def fetch_sheet_metadata(self, id, params=None):
+        # Le letture con params (namedRanges, campi scelti) vanno sempre all'API
+        if params is not None:
+            return super().fetch_sheet_metadata(id, params=params)
+        with self._lock_metadati:
+            if id not in self._metadati:
+                self._metadati[id] = super().fetch_sheet_metadata(id)
+            return self._metadati[id]
+
+    def batch_update(self, id, body):
+        try:
+            return super().batch_update(id, body)
+        finally:
+            with self._lock_metadati:
+                self._metadati.pop(id, None)
+
+
+def trova_credenziali(percorso: str = None) -> Path:
+    """File delle credenziali: `percorso`, o il primo esistente fra PERCORSI_CREDENZIALI"""
+    if percorso:
+        percorsi = [Path(percorso)]
+    else:
+        percorsi = PERCORSI_CREDENZIALI
+    for p in percorsi:
+        if p.exists():
+            return p
+    raise FileNotFoundError(
+        "File credenziali non trovato. Cercato in:\n" + "\n".join(f"  - {p}" for p in percorsi)
+    )
+
+
+def _credenziali(percorso: Path) -> Credentials:
+    """Credenziali del service account con token valido, dalla cache su disco se non è scaduto"""
+    credentials = Credentials.from_service_account_file(str(percorso), scopes=SCOPES)
+    chiave = hash_valore([credentials.service_account_email, SCOPES])
+
+    try:
+        salvato = json.loads(TOKEN_CACHE.read_text())
+        if salvato['chiave'] == chiave:
+            credentials.token = salvato['token']
+            credentials.expiry = datetime.fromisoformat(salvato['scadenza'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # valid tiene conto del margine di google-auth prima della scadenza
+    if not credentials.valid:
+        credentials.refresh(Request())
+        TOKEN_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(TOKEN_CACHE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'chiave': chiave, 'token': credentials.token,
+                       'scadenza': credentials.expiry.isoformat()}, f)
+    return credentials
+
+
+def client(percorso: str = None) -> gspread.Client:
+    """gspread.Client condiviso nel processo per il file di credenziali"""
+    percorso = trova_credenziali(percorso).resolve()
+    with _lock:
+        if percorso not in _client:
+            gc = gspread.Client(_credenziali(percorso), http_client=partial(CacheHTTPClient, bucket=BUCKET))
+            adattatore = HTTPAdapter(pool_connections=CONNESSIONI, pool_maxsize=CONNESSIONI)
+            gc.http_client.session.mount('https://', adattatore)
+            _client[percorso] = gc
+        return _client[percorso]
+
+
+def apri(spreadsheet_id: str = SPREADSHEET_ID, percorso: str = None) -> gspread.Spreadsheet:
+    """Lo spreadsheet `spreadsheet_id`, aperto una volta per processo"""
+    gc = client(percorso)
+    chiave = (trova_credenziali(percorso).resolve(), spreadsheet_id)
+    with _lock:
+        if chiave not in _spreadsheet:
+            _spreadsheet[chiave] = gc.open_by_key(spreadsheet_id)
+        return _spreadsheet[chiave]
@@ -0,0 +1,135 @@
+"""
+Chiamate alle API di Google Sheets dentro la quota al minuto, con retry.
+
+Sheets limita le richieste per minuto (60 per utente per progetto, in
+lettura e in scrittura): oltre risponde 429, e un 429 a metà upload lasciava
+lo spreadsheet scritto a metà. Qui ogni richiesta HTTP di gspread passa da:
+
+- TokenBucket: una raffica iniziale di pochi gettoni, poi una ricarica
+  continua calcolata perché in nessuna finestra di 60 secondi si superi
+  la quota (raffica + ricarica * 60 <= richieste al minuto). I thread
+  condividono il bucket e aspettano il proprio turno.
+- retry con backoff esponenziale e jitter pieno su 429, 408 e 5xx (e
+  su errori di connessione): attesa casuale fra 0 e min(ATTESA_MASSIMA,
+  ATTESA_BASE * 2^tentativo), o quella indicata da Retry-After. Le POST
+  non idempotenti (spreadsheets.batchUpdate, values.append) si ripetono
+  solo su 429 e 408, quando la richiesta non è stata eseguita: dopo un 5xx
+  o una connessione caduta potrebbe esserlo, e ripeterla aggiungerebbe
+  fogli o righe due volte.
+
+QuotaHTTPClient si passa a gspread.authorize come http_client (vedi
+http_client()); base_url dirotta le chiamate su un endpoint locale per le
+prove (verify_uploader.py). Con Batch.flush(workers=N) (sheets_batch.py) i
+valori dei fogli indipendenti partono in parallelo, sempre dentro la quota.
+"""
+
+import random
+import re
+import threading
+import time
+from functools import partial
+
+import requests
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+RICHIESTE_MINUTO = 60      # quota Sheets per utente per progetto
+RAFFICA = 10
+TENTATIVI = 6
+ATTESA_BASE = 1.0          # secondi
+ATTESA_MASSIMA = 64.0
+CODICI_RETRY = {408, 429, 500, 502, 503, 504}
+CODICI_RETRY_NON_IDEMPOTENTI = {408, 429}
+
+# spreadsheets/<id>:batchUpdate e values/<intervallo>:append (values:batchUpdate riscrive gli stessi valori)
+NON_IDEMPOTENTI = re.compile(r'(?<!/values):batchUpdate$|:append$')
+
+API_GOOGLE = ('https://sheets.googleapis.com', 'https://www.googleapis.com')
+
+
+class TokenBucket:
+    """Limitatore a gettoni, condiviso fra thread (quota di `richieste` ogni `periodo` secondi)"""
+
+    def __init__(self, richieste: int = RICHIESTE_MINUTO, raffica: int = RAFFICA, periodo: float = 60):
+        raffica = min(raffica, richieste - 1)
+        self.capacita = raffica
+        self.ricarica = (richieste - raffica) / periodo    # gettoni al secondo
+        self._gettoni = float(raffica)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquisisci(self) -> float:
+        """Prende un gettone, aspettando se serve; restituisce l'attesa in secondi"""
+        with self._lock:
+            adesso = time.monotonic()
+            self._gettoni = min(self.capacita, self._gettoni + (adesso - self._ultimo) * self.ricarica)
+            self._ultimo = adesso
+            # Il gettone si prenota subito (anche in debito): l'ordine fra thread è quello di arrivo
+            self._gettoni -= 1
+            attesa = max(0.0, -self._gettoni / self.ricarica)
+        if attesa:
+            time.sleep(attesa)
+        return attesa
+
+
+def attesa_backoff(tentativo: int, risposta=None) -> float:
+    """Retry-After se il server lo indica, altrimenti jitter pieno sull'esponenziale"""
+    if risposta is not None:
+        try:
+            return float(risposta.headers['Retry-After'])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return random.uniform(0, min(ATTESA_MASSIMA, ATTESA_BASE * 2 ** tentativo))
+
+
+class QuotaHTTPClient(HTTPClient):
+    """HTTPClient di gspread con TokenBucket e retry; statistiche in self.statistiche"""
+
+    def __init__(self, auth, session=None, bucket: TokenBucket = None, base_url: str = None,
+                 tentativi: int = TENTATIVI):
+        super().__init__(auth, session)
+        self.bucket = bucket or BUCKET
+        self.base_url = base_url
+        self.tentativi = tentativi
+        self.statistiche = {'richieste': 0, 'retry': 0, 'attesa_quota': 0.0}
+        self._lock = threading.Lock()
+
+    def _conta(self, campo: str, n=1):
+        with self._lock:
+            self.statistiche[campo] += n
+
+    def request(self, method, endpoint, *args, **kwargs):
+        if self.base_url:
+            for prefisso in API_GOOGLE:
+                if endpoint.startswith(prefisso):
+                    endpoint = self.base_url + endpoint[len(prefisso):]
+
+        idempotente = method.upper() != 'POST' or not NON_IDEMPOTENTI.search(endpoint)
+        codici = CODICI_RETRY if idempotente else CODICI_RETRY_NON_IDEMPOTENTI
+
+        for tentativo in range(self.tentativi):
+            self._conta('attesa_quota', self.bucket.acquisisci())
+            self._conta('richieste')
+            ultimo = tentativo == self.tentativi - 1
+            try:
+                return super().request(method, endpoint, *args, **kwargs)
+            except APIError as e:
+                # Lo status HTTP, non il codice nel JSON: un 502 da proxy non ha corpo JSON
+                if e.response.status_code not in codici or ultimo:
+                    raise
+                attesa = attesa_backoff(tentativo, e.response)
+            except (requests.ConnectionError, requests.Timeout):
+                if not idempotente or ultimo:
+                    raise
+                attesa = attesa_backoff(tentativo)
+            self._conta('retry')
+            time.sleep(attesa)
+
+
+# Un bucket per processo: tutti i client dello stesso account condividono la quota
+BUCKET = TokenBucket()
+
+
+def http_client(bucket: TokenBucket = None, base_url: str = None):
+    """Da passare a gspread.authorize(credentials, http_client=http_client())"""
+    return partial(QuotaHTTPClient, bucket=bucket or BUCKET, base_url=base_url)
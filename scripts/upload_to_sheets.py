@@ -3,20 +3,34 @@
 Upload Dashboard CSV to Google Sheets
 =====================================
 
-Carica i dati del dashboard ORTI/INTUR su Google Sheets con formattazione.
+Carica i dashboard delle società (mesepermese.SOCIETA) e il consolidato
+(consolidamento.py) su Google Sheets con formattazione. Dati, formati e
+Riepilogo partono insieme a fine upload (sheets_batch.py): due chiamate in
+scrittura per tutto lo spreadsheet. Ogni colonna di importi dei dashboard
+diventa un intervallo con nome (ORTI_TOT_RICAVI, CONSOLIDATO_EBITDA, ...,
+formule.py) sui mesi caricati: il Riepilogo e i fogli avanzati
+(create_advanced_dashboard.py) lo usano al posto di intervalli scritti a mano.
 
 SETUP:
 1. pip install gspread google-auth
 2. Scarica le credenziali del service account e salvale come:
-   ~/.config/gspread/service_account.json
+   config/hotelHops.json (o ~/.config/gspread/service_account.json,
+   vedi sheets_client.PERCORSI_CREDENZIALI)
 
    Oppure specifica il percorso con --credentials
 
 3. Assicurati che il service account abbia accesso al foglio:
    drive-audit@hotelops-suite.iam.gserviceaccount.com
 
+Con --sync i fogli non vengono svuotati e riscritti: si leggono i valori
+attuali in una sola chiamata e si scrivono solo le celle cambiate. Ogni
+chiamata resta dentro la quota al minuto di Sheets e i 429/5xx si ripetono
+(sheets_quota.py); con --workers i valori dei fogli partono in parallelo.
+
 USAGE:
     python upload_to_sheets.py
+    python upload_to_sheets.py --sync
+    python upload_to_sheets.py --workers 4
     python upload_to_sheets.py --credentials /path/to/credentials.json
 """
 
@@ -26,34 +40,31 @@ from pathlib import Path
 
 try:
     import gspread
-    from google.oauth2.service_account import Credentials
+    from google.auth.exceptions import GoogleAuthError
 except ImportError:
     print("ERROR: Installa le dipendenze con:")
     print("  pip install gspread google-auth")
     exit(1)
 
+import formule
+from consolidamento import CONSOLIDATO
+from mesepermese import SOCIETA
+from sheets_batch import Batch
+from sheets_client import SERVICE_ACCOUNT_EMAIL, SPREADSHEET_ID, apri, trova_credenziali
 
-# === CONFIGURAZIONE ===
-SPREADSHEET_ID = "1CAT_EN6DOXyT3vEbYmnwRQh1pWrdnrCXHFWR--JtFmQ"
-SERVICE_ACCOUNT_EMAIL = "drive-audit@hotelops-suite.iam.gserviceaccount.com"
 
+# === CONFIGURAZIONE ===
 # Percorsi relativi allo script
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_DIR = SCRIPT_DIR.parent
 OUTPUT_DIR = PROJECT_DIR / "output"
 
-# File da caricare
+# File da caricare: un foglio per società più il consolidato
 FILES_TO_UPLOAD = {
-    "ORTI_Dashboard": OUTPUT_DIR / "ORTI_dashboard_semplificato.csv",
-    "INTUR_Dashboard": OUTPUT_DIR / "INTUR_dashboard_semplificato.csv",
+    nome: OUTPUT_DIR / f"{nome}_dashboard_semplificato.csv"
+    for nome in [*SOCIETA, CONSOLIDATO]
 }
 
-# Scopes necessari
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
-
 
 def load_csv(filepath: Path) -> list[list[str]]:
     """Carica CSV e restituisce lista di righe."""
@@ -62,18 +73,23 @@ def load_csv(filepath: Path) -> list[list[str]]:
         return list(reader)
 
 
-def get_or_create_worksheet(spreadsheet, sheet_name: str, rows: int, cols: int):
-    """Ottiene o crea un foglio con il nome specificato."""
-    try:
-        worksheet = spreadsheet.worksheet(sheet_name)
+def valori_celle(data: list[list[str]]) -> list[list]:
+    """Numeri del CSV come numeri: scritti USER_ENTERED non dipendono dal locale del foglio"""
+    def valore(testo):
+        try:
+            return float(testo)
+        except ValueError:
+            return testo
+    return [[valore(c) for c in riga] for riga in data]
+
+
+def get_or_create_worksheet(batch: Batch, sheet_name: str, rows: int, cols: int):
+    """Ottiene o crea un foglio con il nome specificato (ridimensionato a rows x cols)."""
+    if batch.esiste(sheet_name):
         print(f"  Foglio '{sheet_name}' esistente, aggiornamento...")
-        # Ridimensiona se necessario
-        worksheet.resize(rows=rows, cols=cols)
-    except gspread.WorksheetNotFound:
+    else:
         print(f"  Creazione foglio '{sheet_name}'...")
-        worksheet = spreadsheet.add_worksheet(title=sheet_name, rows=rows, cols=cols)
-
-    return worksheet
+    return batch.foglio(sheet_name, rows=rows, cols=cols)
 
 
 def format_worksheet(worksheet, num_rows: int, num_cols: int):
@@ -106,11 +122,12 @@ def format_worksheet(worksheet, num_rows: int, num_cols: int):
     # Auto-resize columns (approssimativo)
     # gspread non supporta auto-resize diretto, usiamo larghezze fisse
 
-    print(f"  Formattazione applicata")
+    print(f"  Formattazione in coda")
 
 
-def upload_to_sheets(credentials_path: str = None, spreadsheet_id: str = None):
-    """Carica i CSV su Google Sheets."""
+def upload_to_sheets(credentials_path: str = None, spreadsheet_id: str = None, sync: bool = False,
+                     workers: int = 1):
+    """Carica i CSV su Google Sheets (sync: solo le celle cambiate; workers: fogli in parallelo)."""
 
     # Usa ID specificato o default
     sheet_id = spreadsheet_id or SPREADSHEET_ID
@@ -122,51 +139,26 @@ def upload_to_sheets(credentials_path: str = None, spreadsheet_id: str = None):
     # Autenticazione
     print("\n1. Autenticazione...")
 
-    if credentials_path:
-        creds_file = Path(credentials_path)
-    else:
-        # Cerca in posizioni standard
-        possible_paths = [
-            Path.home() / ".config" / "gspread" / "service_account.json",
-            Path.home() / ".gspread" / "service_account.json",
-            PROJECT_DIR / "credentials" / "service_account.json",
-            SCRIPT_DIR / "service_account.json",
-        ]
-
-        creds_file = None
-        for p in possible_paths:
-            if p.exists():
-                creds_file = p
-                break
-
-        if not creds_file:
-            print("\nERROR: File credenziali non trovato.")
-            print("Cercato in:")
-            for p in possible_paths:
-                print(f"  - {p}")
-            print("\nScarica le credenziali del service account da Google Cloud Console")
-            print("e salvale in una delle posizioni sopra, oppure usa --credentials")
-            return False
-
-    print(f"  Credenziali: {creds_file}")
-
     try:
-        credentials = Credentials.from_service_account_file(
-            str(creds_file),
-            scopes=SCOPES
-        )
-        gc = gspread.authorize(credentials)
-    except Exception as e:
-        print(f"\nERROR: Autenticazione fallita: {e}")
+        creds_file = trova_credenziali(credentials_path)
+    except FileNotFoundError as e:
+        print(f"\nERROR: {e}")
+        print("\nScarica le credenziali del service account da Google Cloud Console")
+        print("e salvale in una delle posizioni sopra, oppure usa --credentials")
         return False
 
-    # Apri spreadsheet
+    print(f"  Credenziali: {creds_file}")
+
+    # Apri spreadsheet (client e token condivisi, sheets_client.py)
     print("\n2. Apertura spreadsheet...")
     print(f"  ID: {sheet_id}")
 
     try:
-        spreadsheet = gc.open_by_key(sheet_id)
+        spreadsheet = apri(sheet_id, creds_file)
         print(f"  Nome: {spreadsheet.title}")
+    except GoogleAuthError as e:
+        print(f"\nERROR: Autenticazione fallita: {e}")
+        return False
     except gspread.SpreadsheetNotFound:
         print(f"\nERROR: Spreadsheet non trovato.")
         print(f"Verifica che il service account {SERVICE_ACCOUNT_EMAIL}")
@@ -178,8 +170,10 @@ def upload_to_sheets(credentials_path: str = None, spreadsheet_id: str = None):
 
     # Carica ogni file
     print("\n3. Caricamento dati...")
+    batch = Batch(spreadsheet, incrementale=sync)
 
-    for sheet_name, csv_path in FILES_TO_UPLOAD.items():
+    for entita, csv_path in FILES_TO_UPLOAD.items():
+        sheet_name = formule.foglio_dashboard(entita)
         print(f"\n  [{sheet_name}]")
 
         if not csv_path.exists():
@@ -197,19 +191,30 @@ def upload_to_sheets(credentials_path: str = None, spreadsheet_id: str = None):
         print(f"    Righe: {num_rows}, Colonne: {num_cols}")
 
         # Crea/aggiorna foglio
-        worksheet = get_or_create_worksheet(spreadsheet, sheet_name, num_rows + 5, num_cols)
+        worksheet = get_or_create_worksheet(batch, sheet_name, num_rows + 5, num_cols)
 
         # Pulisci e scrivi dati
         worksheet.clear()
-        worksheet.update(range_name="A1", values=data)
-        print(f"    Dati scritti")
+        worksheet.update(range_name="A1", values=valori_celle(data))
+        print(f"    Dati in coda")
 
         # Formattazione
         format_worksheet(worksheet, num_rows, num_cols)
 
+        # Intervalli con nome sui mesi caricati (riga 1 = intestazione)
+        formule.definisci_intervalli(batch, {entita: num_rows - 1})
+
     # Aggiungi foglio riepilogo
     print("\n4. Creazione foglio Riepilogo...")
-    create_summary_sheet(spreadsheet)
+    create_summary_sheet(batch)
+
+    print("\n5. Invio...")
+    try:
+        chiamate = batch.flush(workers=workers)
+    except gspread.exceptions.APIError as e:
+        print(f"\nERROR: {e}")
+        return False
+    print(f"  {chiamate} richieste" + (f", {batch.celle} celle modificate" if sync else ""))
 
     print("\n" + "=" * 60)
     print("COMPLETATO!")
@@ -219,41 +224,72 @@ def upload_to_sheets(credentials_path: str = None, spreadsheet_id: str = None):
     return True
 
 
-def create_summary_sheet(spreadsheet):
-    """Crea foglio riepilogo con formule che aggregano i dati."""
+def _colonna(indice: int) -> str:
+    """Lettera della colonna (0 -> A, 26 -> AA)"""
+    lettere = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        lettere = chr(65 + resto) + lettere
+    return lettere
+
+
+def create_summary_sheet(batch: Batch, entita: list = None):
+    """
+    Crea foglio riepilogo con formule che aggregano i dati: una colonna per
+    società e il consolidato (dal foglio CONSOLIDATO_Dashboard, al netto delle
+    elisioni intercompany). Ogni riga è una formula sugli intervalli con nome
+    dei dashboard (formule.somme), che Sheets distribuisce sulle colonne.
+    """
 
     sheet_name = "Riepilogo"
+    entita = list(SOCIETA) if entita is None else entita
+    colonne = entita + [CONSOLIDATO]
+    ultima = _colonna(len(colonne))
 
-    try:
-        ws = spreadsheet.worksheet(sheet_name)
-        ws.clear()
-    except gspread.WorksheetNotFound:
-        ws = spreadsheet.add_worksheet(title=sheet_name, rows=30, cols=10)
+    ws = batch.foglio(sheet_name, rows=30, cols=len(colonne) + 6, ridimensiona=False)
+    ws.clear()
+
+    # Una formula per riga, distribuita sulle colonne delle entità; tutte le
+    # righe larghe quanto l'intestazione (etichetta + una colonna per entità)
+    larghezza = len(colonne) + 1
+
+    def riga(etichetta="", formula=None):
+        if formula is None:
+            return [etichetta] + [""] * (larghezza - 1)
+        # Le celle a destra le riempie la formula: None le lascia come sono
+        # (con --sync non vengono confrontate né riscritte)
+        return [etichetta, formule.formula(formula)] + [None] * (larghezza - 2)
+
+    def somma(etichetta, colonna):
+        return riga(etichetta, formule.somme(colonna, colonne))
 
-    # Contenuto riepilogo - COLONNE AGGIORNATE:
-    # H=TOT_RICAVI, I=COSTI_FISSI, J=COSTI_VARIABILI, K=RETRIBUZIONI, L=ONERI, M=PERSONALE, N=TOT_COSTI, O=EBITDA
     summary_data = [
-        ["RIEPILOGO DASHBOARD 2025", "", "", ""],
-        ["", "", "", ""],
-        ["", "ORTI", "INTUR", "CONSOLIDATO"],
-        ["RICAVI TOTALI", "=SUM(ORTI_Dashboard!H2:H13)", "=SUM(INTUR_Dashboard!H2:H13)", "=B4+C4"],
-        ["- Hotel", "=SUM(ORTI_Dashboard!B2:B13)", "=SUM(INTUR_Dashboard!B2:B13)", "=B5+C5"],
-        ["- Angelina", "=SUM(ORTI_Dashboard!C2:C13)", "=SUM(INTUR_Dashboard!C2:C13)", "=B6+C6"],
-        ["- CVM", "=SUM(ORTI_Dashboard!D2:D13)", "=SUM(INTUR_Dashboard!D2:D13)", "=B7+C7"],
-        ["- F&B", "=SUM(ORTI_Dashboard!E2:E13)", "=SUM(INTUR_Dashboard!E2:E13)", "=B8+C8"],
-        ["- Spiaggia", "=SUM(ORTI_Dashboard!F2:F13)", "=SUM(INTUR_Dashboard!F2:F13)", "=B9+C9"],
-        ["- Altri", "=SUM(ORTI_Dashboard!G2:G13)", "=SUM(INTUR_Dashboard!G2:G13)", "=B10+C10"],
-        ["", "", "", ""],
-        ["COSTI TOTALI", "=SUM(ORTI_Dashboard!N2:N13)", "=SUM(INTUR_Dashboard!N2:N13)", "=B12+C12"],
-        ["- Fissi", "=SUM(ORTI_Dashboard!I2:I13)", "=SUM(INTUR_Dashboard!I2:I13)", "=B13+C13"],
-        ["- Variabili", "=SUM(ORTI_Dashboard!J2:J13)", "=SUM(INTUR_Dashboard!J2:J13)", "=B14+C14"],
-        ["- Personale", "=SUM(ORTI_Dashboard!M2:M13)", "=SUM(INTUR_Dashboard!M2:M13)", "=B15+C15"],
-        ["  (Retribuzioni)", "=SUM(ORTI_Dashboard!K2:K13)", "=SUM(INTUR_Dashboard!K2:K13)", "=B16+C16"],
-        ["  (Oneri)", "=SUM(ORTI_Dashboard!L2:L13)", "=SUM(INTUR_Dashboard!L2:L13)", "=B17+C17"],
-        ["", "", "", ""],
-        ["EBITDA", "=SUM(ORTI_Dashboard!O2:O13)", "=SUM(INTUR_Dashboard!O2:O13)", "=B19+C19"],
-        ["Margine %", "=IF(B4=0,0,B19/B4)", "=IF(C4=0,0,C19/C4)", "=IF(D4=0,0,D19/D4)"],
+        riga("RIEPILOGO DASHBOARD 2025"),
+        riga(),
+        [""] + entita + ["CONSOLIDATO"],
+        somma("RICAVI TOTALI", "TOT_RICAVI"),
+        somma("- Hotel", "HOTEL"),
+        somma("- Angelina", "ANGELINA"),
+        somma("- CVM", "CVM"),
+        somma("- F&B", "F&B"),
+        somma("- Spiaggia", "SPIAGGIA"),
+        somma("- Altri", "ALTRI_RICAVI"),
+        riga(),
+        somma("COSTI TOTALI", "TOT_COSTI"),
+        somma("- Fissi", "COSTI_FISSI"),
+        somma("- Variabili", "COSTI_VARIABILI"),
+        somma("- Personale", "PERSONALE"),
+        somma("  (Retribuzioni)", "RETRIBUZIONI"),
+        somma("  (Oneri)", "ONERI"),
+        riga(),
+        somma("EBITDA", "EBITDA"),
     ]
+    # Numero di riga (da 1) di ogni etichetta, per formule e formati
+    righe = {r[0]: i for i, r in enumerate(summary_data, 1) if r[0]}
+    ricavi, ebitda = righe["RICAVI TOTALI"], righe["EBITDA"]
+    summary_data.append(riga("Margine %", formule.rapporto(f"B{ebitda}:{ultima}{ebitda}", f"B{ricavi}:{ultima}{ricavi}")))
+    margine = len(summary_data)
 
     ws.update(range_name="A1", values=summary_data)
 
@@ -262,34 +298,34 @@ def create_summary_sheet(spreadsheet):
         "textFormat": {"bold": True, "fontSize": 14},
     })
 
-    ws.format("A3:D3", {
+    ws.format(f"A3:{ultima}3", {
         "backgroundColor": {"red": 0.27, "green": 0.45, "blue": 0.77},
         "textFormat": {"bold": True, "foregroundColor": {"red": 1, "green": 1, "blue": 1}},
         "horizontalAlignment": "CENTER",
     })
 
-    ws.format("B4:D19", {
+    ws.format(f"B{ricavi}:{ultima}{ebitda}", {
         "numberFormat": {"type": "NUMBER", "pattern": "#,##0.00"},
         "horizontalAlignment": "RIGHT",
     })
 
-    ws.format("B20:D20", {
+    ws.format(f"B{margine}:{ultima}{margine}", {
         "numberFormat": {"type": "PERCENT", "pattern": "0.0%"},
         "horizontalAlignment": "RIGHT",
     })
 
     # Evidenzia EBITDA
-    ws.format("A19:D19", {
+    ws.format(f"A{ebitda}:{ultima}{ebitda}", {
         "backgroundColor": {"red": 0.85, "green": 0.92, "blue": 0.83},
         "textFormat": {"bold": True},
     })
 
     # Evidenzia Personale (include breakdown)
-    ws.format("A15:D17", {
+    ws.format(f"A{righe['- Personale']}:{ultima}{righe['  (Oneri)']}", {
         "backgroundColor": {"red": 0.95, "green": 0.95, "blue": 0.85},
     })
 
-    print("  Foglio Riepilogo creato con formule")
+    print("  Foglio Riepilogo in coda, con formule")
 
 
 def main():
@@ -305,12 +341,22 @@ def main():
         default=SPREADSHEET_ID,
         help=f"ID dello spreadsheet (default: {SPREADSHEET_ID})"
     )
+    parser.add_argument(
+        "--sync", action="store_true",
+        help="Scrive solo le celle cambiate rispetto al foglio attuale"
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Fogli scritti in parallelo, dentro la quota al minuto (default: 1, una sola chiamata)"
+    )
 
     args = parser.parse_args()
 
     success = upload_to_sheets(
         credentials_path=args.credentials,
-        spreadsheet_id=args.spreadsheet_id
+        spreadsheet_id=args.spreadsheet_id,
+        sync=args.sync,
+        workers=args.workers
     )
     exit(0 if success else 1)
 
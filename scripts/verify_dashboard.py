@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Verifica che crea_dashboard.py riproduca i dashboard semplificati in output/
+(quelli prodotti dal notebook + aggiorna_personale_dashboard.py).
+
+Confronta cella per cella: importi al centesimo esatto (interi, vedi
+importi.py), Mese e NOTE identici. Esce con codice 1 se trova differenze.
+
+USAGE:
+    python scripts/verify_dashboard.py
+    python scripts/verify_dashboard.py --societa INTUR --anno 2025
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aggiorna_personale_dashboard import leggi_dashboard
+from crea_dashboard import carica_ledger, crea_dashboard
+from importi import euro
+from mesepermese import SOCIETA, leggi_fogli_paralleli, path_mesepermese
+
+OUTPUT_DIR = Path('output')
+
+
+def confronta(atteso: pd.DataFrame, calcolato: pd.DataFrame) -> list:
+    """Differenze come [(riga, colonna, atteso, calcolato)], importi in centesimi"""
+    differenze = []
+    if list(atteso.columns) != list(calcolato.columns):
+        return [('-', 'colonne', list(atteso.columns), list(calcolato.columns))]
+    if len(atteso) != len(calcolato):
+        return [('-', 'righe', len(atteso), len(calcolato))]
+
+    for col in atteso.columns:
+        a, c = atteso[col], calcolato[col]
+        if pd.api.types.is_numeric_dtype(a):
+            diversi = a.to_numpy() != c.to_numpy()
+        else:
+            diversi = a.fillna('').astype(str).ne(c.fillna('').astype(str))
+        for i in np.flatnonzero(diversi):
+            differenze.append((atteso['Mese'].iloc[i], col, a.iloc[i], c.iloc[i]))
+    return differenze
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parità crea_dashboard.py vs CSV in output/")
+    parser.add_argument("--societa", nargs="+", choices=list(SOCIETA), default=list(SOCIETA))
+    parser.add_argument("--anno", type=int, default=2025)
+    args = parser.parse_args()
+
+    # Lettura senza cache: la verifica copre anche il parsing dei workbook
+    fogli = leggi_fogli_paralleli({s: path_mesepermese(s) for s in args.societa})
+    dashboard = crea_dashboard({s: carica_ledger(f) for s, f in fogli.items()}, args.anno)
+
+    ok = True
+    print("\n" + "="*60)
+    for societa, calcolato in dashboard.items():
+        path = OUTPUT_DIR / f'{societa}_dashboard_semplificato.csv'
+        differenze = confronta(leggi_dashboard(path), calcolato)
+        if not differenze:
+            print(f"{societa}: OK ({len(calcolato)} mesi x {len(calcolato.columns)} colonne)")
+            continue
+        ok = False
+        print(f"{societa}: {len(differenze)} differenze rispetto a {path}")
+        for mese, col, atteso, valore in differenze:
+            if isinstance(atteso, (int, np.integer)):
+                atteso, valore = euro(atteso), euro(valore)
+            print(f"  {mese:<10} {col:<16} atteso {atteso!r:>16}  calcolato {valore!r:>16}")
+    print("="*60)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
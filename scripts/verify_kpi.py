@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Verifica offline dei fogli avanzati (create_advanced_dashboard.py): ogni
+cella calcolata in locale da kpi.py deve valere quanto la formula Sheets che
+la accompagna (pubblicata con --mode formulas, o come nota con --mode audit).
+
+Le formule si valutano qui sui CSV in output/, come li vedrebbe Sheets dopo
+upload_to_sheets.py (riga 1 intestazione, primo mese in riga 2, intervalli con
+nome di formule.py), con un valutatore per il sottoinsieme usato dai fogli:
+riferimenti e intervalli, nomi, matrici {a,b;c}, + - * /, SUM, IF,
+SUMPRODUCT, MATCH, TRANSPOSE, SCAN, BYCOL, LAMBDA. Le formule che
+restituiscono una matrice la distribuiscono nelle celle accanto, come fa
+Sheets, e anche quelle celle si confrontano col motore. Le altre formule dei
+fogli (le proiezioni di Scenario_2026) devono almeno essere valutabili.
+
+Così una colonna sbagliata nelle formule (es. TOT_COSTI letto da ONERI) o un
+errore nel motore si vedono senza aprire lo spreadsheet. Esce con codice 1 se
+trova differenze.
+
+USAGE:
+    python scripts/verify_kpi.py
+    python scripts/verify_kpi.py --dettaglio
+"""
+
+import argparse
+import re
+import sys
+
+import numpy as np
+from gspread.utils import a1_to_rowcol
+
+import create_advanced_dashboard as dashboard
+import formule
+import kpi
+from aggiorna_personale_dashboard import COLONNE_DASHBOARD
+from importi import euro
+
+FOGLI = {
+    "📊 KPI_2025": dashboard.kpi_rows,
+    "📈 Trends": dashboard.trends_rows,
+    "🔮 Scenario_2026": dashboard.scenario_rows,
+    "🏢 BU_Detail": dashboard.bu_rows,
+}
+
+TOLLERANZA = 0.005      # mezzo centesimo
+
+RIFERIMENTO = re.compile(
+    r"(?:(?P<foglio>[A-Za-z_]\w*)!)?"
+    r"\$?(?P<col>[A-Z]{1,3})\$?(?P<riga>\d+)(?::\$?(?P<col2>[A-Z]{1,3})\$?(?P<riga2>\d+))?"
+)
+UGUALE = re.compile(r"(?<![<>!=])=(?!=)")
+FUNZIONE = re.compile(r"\b(SUM|IF|SUMPRODUCT|ISNUMBER|MATCH|TRANSPOSE|ARRAYFORMULA|SCAN|BYCOL)\(")
+LAMBDA = re.compile(r"\bLAMBDA\(((?:[a-z]\w*,)+)")
+
+
+def _matrice(*righe):
+    """{a,b;c,d}: gli elementi di ogni riga affiancati, le righe impilate"""
+    return np.vstack([np.hstack([np.atleast_2d(v) for v in riga]) for riga in righe])
+
+
+def _match(valori, elenco, tipo=0):
+    """MATCH esatto elemento per elemento: posizione da 1, NaN se manca"""
+    elenco = list(np.ravel(elenco))
+    return np.vectorize(lambda v: elenco.index(v) + 1 if v in elenco else np.nan, otypes=[float])(valori)
+
+
+def _scan(iniziale, intervallo, funzione):
+    accumulato, risultato = iniziale, []
+    for x in np.ravel(intervallo):
+        accumulato = funzione(accumulato, x)
+        risultato.append(accumulato)
+    return np.reshape(risultato, np.shape(intervallo))
+
+
+FUNZIONI = {
+    '_SUM': lambda *valori: np.float64(sum(np.sum(v) for v in valori)),
+    '_IF': lambda condizione, vero, falso: np.where(condizione, vero, falso)[()],
+    '_SUMPRODUCT': lambda *valori: np.float64(np.sum(np.prod(np.broadcast_arrays(*valori), axis=0))),
+    '_ISNUMBER': lambda valori: ~np.isnan(valori),
+    '_MATCH': _match,
+    '_TRANSPOSE': lambda intervallo: np.transpose(np.atleast_2d(intervallo)),
+    '_ARRAYFORMULA': lambda valore: valore,
+    '_SCAN': _scan,
+    '_BYCOL': lambda intervallo, funzione: np.array([[funzione(c.reshape(-1, 1)) for c in np.atleast_2d(intervallo).T]]),
+    '_matrice': _matrice,
+}
+
+
+class Valutatore:
+    """Valori delle celle dei fogli avanzati, con le formule risolte sui dashboard"""
+
+    def __init__(self, dati: dict, righe: dict):
+        # Fogli *_Dashboard come li scrive upload_to_sheets.py, importi in euro, e i loro nomi
+        self.dashboard = {}
+        self.nomi = {}
+        for entita, df in dati.items():
+            df = df[COLONNE_DASHBOARD]
+            importi = [c for c in df.columns if c not in ('Mese', 'NOTE')]
+            griglia = [list(df.columns)] + df.assign(**{c: euro(df[c]) for c in importi}).values.tolist()
+            self.dashboard[formule.foglio_dashboard(entita)] = griglia
+            self.nomi.update(formule.intervalli({entita: len(df)}))
+        self.righe = righe
+        self._valori = {}
+        self._in_corso = set()
+
+    def _grezza(self, foglio: str, riga: int, col: int):
+        righe = self.righe[foglio]
+        return righe[riga - 1][col - 1] if riga <= len(righe) and col <= len(righe[riga - 1]) else ''
+
+    @staticmethod
+    def _testo_formula(valore):
+        if isinstance(valore, dashboard.Calc):
+            return valore.formula
+        return valore if isinstance(valore, str) and valore.startswith('=') else None
+
+    def _distribuisci(self, foglio: str, riga: int, col: int):
+        """Valuta le formule sopra e a sinistra di una cella vuota, che possono distribuirsi fin lì"""
+        for r in range(1, riga + 1):
+            for c in range(1, col + 1):
+                if (foglio, r, c) not in self._in_corso and self._testo_formula(self._grezza(foglio, r, c)):
+                    self.cella(foglio, r, c)
+
+    def cella(self, foglio: str, riga: int, col: int):
+        """Valore della cella (riga e colonna da 1) come Sheets la calcolerebbe"""
+        if foglio in self.dashboard:
+            griglia = self.dashboard[foglio]
+            valore = griglia[riga - 1][col - 1] if riga <= len(griglia) and col <= len(griglia[0]) else ''
+            if isinstance(valore, str) and valore:
+                return valore           # la colonna Mese (<ENTITA>_MESE)
+            return np.float64(valore) if isinstance(valore, (int, float)) else np.float64(0)
+
+        chiave = (foglio, riga, col)
+        if chiave in self._valori:
+            return self._valori[chiave]
+
+        valore = self._grezza(foglio, riga, col)
+        testo = self._testo_formula(valore)
+        if testo:
+            self._in_corso.add(chiave)
+            risultato = np.asarray(self.formula(testo, foglio), dtype=float)
+            self._in_corso.discard(chiave)
+            # Una matrice si distribuisce a destra e in basso dalla cella della formula
+            for (r, c), v in np.ndenumerate(np.atleast_2d(risultato)):
+                self._valori.setdefault((foglio, riga + r, col + c), np.float64(v))
+            self._valori[chiave] = np.float64(np.atleast_2d(risultato)[0, 0])
+        elif valore == '' or isinstance(valore, dashboard.Calc):
+            self._distribuisci(foglio, riga, col)
+            return self._valori.get(chiave, np.float64(0))
+        else:
+            self._valori[chiave] = np.float64(valore) if isinstance(valore, (int, float)) else np.float64(0)
+        return self._valori[chiave]
+
+    def _intervallo(self, foglio, col, riga, col2, riga2):
+        if col2 is None:
+            return self.cella(foglio, riga, a1_to_rowcol(f"{col}1")[1])
+        c1, c2 = a1_to_rowcol(f"{col}1")[1], a1_to_rowcol(f"{col2}1")[1]
+        return np.array([[self.cella(foglio, r, c) for c in range(c1, c2 + 1)] for r in range(riga, riga2 + 1)])
+
+    def formula(self, testo: str, foglio: str):
+        """Valuta una formula (con '=' iniziale) scritta sul foglio `foglio`"""
+        def riferimento(m):
+            return (f"_rif({(m['foglio'] or foglio)!r}, {m['col']!r}, {m['riga']}, "
+                    f"{m['col2']!r}, {m['riga2'] or 'None'})")
+
+        def nome(m):
+            foglio_nome, a1 = self.nomi[m[0]]
+            return riferimento(RIFERIMENTO.fullmatch(f"{foglio_nome}!{a1}"))
+
+        espressione = RIFERIMENTO.sub(riferimento, testo[1:])
+        if self.nomi:
+            espressione = re.sub(r"\b(?:" + "|".join(sorted(self.nomi, key=len, reverse=True)) + r")\b",
+                                 nome, espressione)
+        espressione = UGUALE.sub('==', espressione.replace('<>', '!='))
+        espressione = FUNZIONE.sub(r'_\1(', espressione)
+        espressione = LAMBDA.sub(lambda m: f"(lambda {m[1][:-1]}: ", espressione)
+        espressione = espressione.replace('{', '_matrice([').replace(';', '],[').replace('}', '])')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return eval(espressione, {**FUNZIONI, '_rif': self._intervallo})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Formule dei fogli avanzati contro i valori di kpi.py")
+    parser.add_argument("--dettaglio", action="store_true", help="Stampa ogni cella confrontata")
+    args = parser.parse_args()
+
+    dati = kpi.carica_dashboard(dashboard.ENTITIES)
+    tabelle = dashboard.compute(dati)
+    righe = {nome: costruisci(tabelle) for nome, costruisci in FOGLI.items()}
+    valutatore = Valutatore(dati, righe)
+
+    ok = True
+    print("=" * 70)
+    print(f"FORMULE vs MOTORE LOCALE ({', '.join(dashboard.ENTITIES)})")
+    print("=" * 70)
+    for nome, griglia in righe.items():
+        calcolate = scenario = 0
+        for r, riga in enumerate(griglia, 1):
+            for c, cella in enumerate(riga, 1):
+                a1 = dashboard.letter(c - 1) + str(r)
+                if isinstance(cella, dashboard.Calc):
+                    calcolate += 1
+                    valore = float(valutatore.cella(nome, r, c))
+                    testo = cella.formula or '(distribuita)'
+                    if not abs(valore - cella.value) <= TOLLERANZA + 1e-9 * abs(cella.value):
+                        ok = False
+                        print(f"  ERRORE {nome}!{a1}: {testo} = {valore!r}, motore {cella.value!r}")
+                    elif args.dettaglio:
+                        print(f"  {nome}!{a1:<4} {cella.value:>16.4f}  {testo}")
+                elif isinstance(cella, str) and cella.startswith('='):
+                    scenario += 1
+                    if not np.isfinite(valutatore.cella(nome, r, c)):
+                        ok = False
+                        print(f"  ERRORE {nome}!{a1}: {cella} non valutabile")
+        print(f"  {nome}: {calcolate} celle calcolate" + (f", {scenario} formule di scenario" if scenario else ""))
+
+    print("=" * 70)
+    print("✅ Formule e motore coincidono" if ok else "❌ Differenze fra formule e motore")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,9 @@
 #!/usr/bin/env python3
 """Verifica valori calcolati nel Riepilogo"""
 
-import gspread
-from google.oauth2.service_account import Credentials
+from sheets_client import apri
 
-SPREADSHEET_ID = "1CAT_EN6DOXyT3vEbYmnwRQh1pWrdnrCXHFWR--JtFmQ"
-
-credentials = Credentials.from_service_account_file(
-    "config/hotelHops.json",
-    scopes=["https://www.googleapis.com/auth/spreadsheets"]
-)
-gc = gspread.authorize(credentials)
-spreadsheet = gc.open_by_key(SPREADSHEET_ID)
+spreadsheet = apri()
 
 ws = spreadsheet.worksheet('Riepilogo')
 
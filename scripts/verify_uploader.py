@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Verifica dell'uploader (sheets_batch.py, sheets_quota.py, sheets_client.py)
+contro un endpoint Sheets finto in locale, senza credenziali né rete.
+
+Il server finto implementa le quattro chiamate usate dagli script
+(metadati, batchUpdate, values.batchUpdate, values.batchGet), più il token
+OAuth del service account, e:
+- rifiuta con 429 le richieste oltre QUOTA per FINESTRA secondi (come la
+  quota al minuto di Sheets, su una finestra corta per non aspettare minuti)
+- inietta un errore ogni --guasto-ogni richieste, alternando 429 e 503
+  (503 solo sulle richieste idempotenti: la batchUpdate non si ripete)
+- aggiunge una latenza fissa a ogni risposta
+
+Controlli:
+1. senza retry (HTTPClient di gspread) il primo errore interrompe l'upload
+2. con QuotaHTTPClient l'upload di --fogli fogli arriva intero, seriale e
+   con --workers in parallelo, e il bucket non supera mai la quota del server
+3. in modalità incrementale una cella cambiata = una cella scritta, e un
+   Riepilogo invariato (con le celle distribuite dalle formule) non
+   riscrive niente
+4. un 503 sulla batchUpdate non si ripete (potrebbe essere stata eseguita)
+5. client condiviso: il token si chiede una volta e si riprende dalla cache
+   su disco; i metadati si leggono una volta per quanti worksheet() e Batch,
+   e di nuovo solo dopo un batchUpdate
+
+Esce con codice 1 se un controllo fallisce.
+
+USAGE:
+    python scripts/verify_uploader.py
+    python scripts/verify_uploader.py --fogli 20 --workers 6 --guasto-ogni 5
+"""
+
+import argparse
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from functools import partial
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import gspread
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from gspread.utils import a1_to_rowcol
+
+import sheets_client
+from sheets_batch import Batch
+from sheets_quota import TokenBucket, http_client
+from upload_to_sheets import create_summary_sheet
+
+QUOTA = 20          # richieste per FINESTRA sul server finto
+FINESTRA = 2.0      # secondi
+RAFFICA = 4
+LATENZA = 0.05      # secondi per risposta
+SPREADSHEET_ID = 'finto'
+
+
+class StatoFinto:
+    """Contenuto dello spreadsheet finto e contatori, condivisi fra i thread del server"""
+
+    def __init__(self, guasto_ogni: int):
+        self.lock = threading.Lock()
+        self.fogli = {}             # {titolo: sheetId}
+        self.celle = {}             # {titolo: {(riga, colonna): valore}}
+        self.guasto_ogni = guasto_ogni
+        self.richieste = 0
+        self.recenti = deque()      # istanti delle richieste accettate, per la quota
+        self.oltre_quota = 0
+        self.chiamate = Counter()   # {(metodo, percorso): richieste servite}
+        self.guasti = 0
+        self.guasto_batch_update = None   # status con cui rispondere a ogni batchUpdate
+
+    def ammetti(self, idempotente: bool = True):
+        """None se la richiesta passa, altrimenti (status, messaggio)"""
+        with self.lock:
+            self.richieste += 1
+            adesso = time.monotonic()
+            while self.recenti and adesso - self.recenti[0] > FINESTRA:
+                self.recenti.popleft()
+            if len(self.recenti) >= QUOTA:
+                self.oltre_quota += 1
+                return 429, 'Quota exceeded'
+            self.recenti.append(adesso)
+            if self.guasto_batch_update and not idempotente:
+                self.guasti += 1
+                return self.guasto_batch_update, 'Injected outage'
+            if self.guasto_ogni and self.richieste % self.guasto_ogni == 0:
+                self.guasti += 1
+                if self.guasti % 2 or not idempotente:
+                    return 429, 'Injected throttle'
+                return 503, 'Injected outage'
+            return None
+
+    def scrivi(self, intervallo: str, valori: list):
+        titolo, cella = re.fullmatch(r"'(.*)'!([A-Z]+\d+)(?::.*)?", intervallo).groups()
+        r0, c0 = a1_to_rowcol(cella)
+        griglia = self.celle[titolo]
+        for i, riga in enumerate(valori):
+            for j, v in enumerate(riga):
+                if v is None:       # come l'API: la cella resta com'è
+                    continue
+                if v == '':
+                    griglia.pop((r0 + i - 1, c0 + j - 1), None)
+                else:
+                    griglia[(r0 + i - 1, c0 + j - 1)] = v
+
+    def distribuisci(self, titolo: str, larghezza: int):
+        """Come Sheets: ogni formula riempie le celle vuote alla sua destra, fino a `larghezza` colonne"""
+        celle = self.celle[titolo]
+        for (r, c), v in list(celle.items()):
+            if isinstance(v, str) and v.startswith('='):
+                for colonna in range(c + 1, larghezza):
+                    celle.setdefault((r, colonna), float(colonna))
+
+    def griglia(self, titolo: str) -> list:
+        celle = self.celle[titolo]
+        if not celle:
+            return []
+        righe = max(r for r, _ in celle) + 1
+        colonne = max(c for _, c in celle) + 1
+        griglia = [[celle.get((r, c), '') for c in range(colonne)] for r in range(righe)]
+        # Come l'API: niente celle vuote in coda alle righe
+        for riga in griglia:
+            while riga and riga[-1] == '':
+                riga.pop()
+        return griglia
+
+
+def _gestore(stato: StatoFinto):
+    class Gestore(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _rispondi(self, status: int, corpo: dict, intestazioni: dict = None):
+            dati = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(dati)))
+            for k, v in (intestazioni or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(dati)
+
+        def _gestisci(self, metodo: str):
+            time.sleep(LATENZA)
+            url = urlparse(self.path)
+            dati = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if url.path == '/token':
+                # Scambio JWT -> token del service account (corpo form, fuori quota)
+                with stato.lock:
+                    stato.chiamate[(metodo, '/token')] += 1
+                return self._rispondi(200, {'access_token': 'token-finto', 'expires_in': 3600,
+                                            'token_type': 'Bearer'})
+            corpo = json.loads(dati or '{}')
+            percorso = unquote(url.path).removeprefix(f'/v4/spreadsheets/{SPREADSHEET_ID}')
+            if errore := stato.ammetti(idempotente=(metodo, percorso) != ('POST', ':batchUpdate')):
+                status, messaggio = errore
+                # Retry-After corto: la verifica non deve aspettare il backoff di produzione
+                return self._rispondi(status, {'error': {'code': status, 'message': messaggio}},
+                                      {'Retry-After': '0.2'})
+
+            with stato.lock:
+                stato.chiamate[(metodo, percorso)] += 1
+                if metodo == 'GET' and percorso == '':
+                    return self._rispondi(200, {
+                        'spreadsheetId': SPREADSHEET_ID, 'properties': {'title': 'Spreadsheet finto'},
+                        'sheets': [{'properties': {'title': t, 'sheetId': i, 'index': n,
+                                                   'gridProperties': {'rowCount': 100, 'columnCount': 26}}}
+                                   for n, (t, i) in enumerate(stato.fogli.items())],
+                    })
+                if metodo == 'POST' and percorso == ':batchUpdate':
+                    for richiesta in corpo['requests']:
+                        if 'addSheet' in richiesta:
+                            p = richiesta['addSheet']['properties']
+                            stato.fogli[p['title']] = p['sheetId']
+                            stato.celle[p['title']] = {}
+                        elif 'updateCells' in richiesta:
+                            sheet_id = richiesta['updateCells']['range']['sheetId']
+                            titolo = next(t for t, i in stato.fogli.items() if i == sheet_id)
+                            stato.celle[titolo] = {}
+                    return self._rispondi(200, {'spreadsheetId': SPREADSHEET_ID, 'replies': []})
+                if metodo == 'POST' and percorso == '/values:batchUpdate':
+                    for vr in corpo['data']:
+                        stato.scrivi(vr['range'], vr['values'])
+                    return self._rispondi(200, {'spreadsheetId': SPREADSHEET_ID})
+                if metodo == 'GET' and percorso == '/values:batchGet':
+                    intervalli = parse_qs(url.query)['ranges']
+                    return self._rispondi(200, {'spreadsheetId': SPREADSHEET_ID, 'valueRanges': [
+                        {'range': r, 'values': stato.griglia(r.strip("'"))} for r in intervalli
+                    ]})
+            self._rispondi(404, {'error': {'code': 404, 'message': f'{metodo} {self.path}'}})
+
+        def do_GET(self):
+            self._gestisci('GET')
+
+        def do_POST(self):
+            self._gestisci('POST')
+
+    return Gestore
+
+
+def avvia_server(stato: StatoFinto) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _gestore(stato))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def dati_foglio(n: int, righe: int = 13, colonne: int = 16) -> list:
+    """Griglia tipo dashboard: intestazione e 12 mesi"""
+    return [[f'Col{c}' for c in range(colonne)]] + [
+        [f'Mese {r}'] + [float(n * 1000 + r * 10 + c) for c in range(1, colonne)] for r in range(1, righe)
+    ]
+
+
+def carica(spreadsheet, fogli: dict, workers: int = 1, incrementale: bool = False) -> Batch:
+    batch = Batch(spreadsheet, incrementale=incrementale)
+    for titolo, dati in fogli.items():
+        ws = batch.foglio(titolo, rows=len(dati) + 5, cols=len(dati[0]))
+        ws.clear()
+        ws.update(range_name='A1', values=dati)
+        ws.format('1:1', {'textFormat': {'bold': True}})
+        ws.freeze(rows=1)
+    batch.chiamate = batch.flush(workers=workers)
+    return batch
+
+
+def client(server, con_quota: bool = True) -> gspread.Client:
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    if not con_quota:
+        # HTTPClient di gspread, solo dirottato sul server finto
+        sessione = requests.Session()
+        gc = gspread.Client(None, session=sessione)
+        originale = gc.http_client.request
+        gc.http_client.request = lambda metodo, url, *a, **k: originale(
+            metodo, url.replace('https://sheets.googleapis.com', base_url), *a, **k)
+        return gc
+    bucket = TokenBucket(QUOTA, raffica=RAFFICA, periodo=FINESTRA)
+    return gspread.Client(None, session=requests.Session(), http_client=http_client(bucket, base_url))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uploader Sheets contro un endpoint finto con throttling")
+    parser.add_argument("--fogli", type=int, default=12, help="Fogli da caricare (default: 12)")
+    parser.add_argument("--workers", "-w", type=int, default=4, help="Fogli in parallelo (default: 4)")
+    parser.add_argument("--guasto-ogni", type=int, default=4, help="Un 429/503 ogni N richieste (default: 4)")
+    args = parser.parse_args()
+
+    fogli = {f'Foglio_{n:02d}': dati_foglio(n) for n in range(args.fogli)}
+    ok = True
+
+    def controlla(descrizione, esito, dettaglio=''):
+        nonlocal ok
+        ok &= bool(esito)
+        print(f"  {'OK    ' if esito else 'ERRORE'} {descrizione}{f' ({dettaglio})' if dettaglio else ''}")
+
+    print("=" * 70)
+    print(f"UPLOADER CONTRO ENDPOINT FINTO: quota {QUOTA} richieste / {FINESTRA:g}s, "
+          f"guasto ogni {args.guasto_ogni}, latenza {LATENZA * 1000:.0f} ms")
+    print("=" * 70)
+
+    # 1. Senza retry: il primo 429/503 interrompe
+    stato = StatoFinto(guasto_ogni=2)
+    server = avvia_server(stato)
+    try:
+        carica(client(server, con_quota=False).open_by_key(SPREADSHEET_ID), fogli)
+        interrotto = False
+    except gspread.exceptions.APIError:
+        interrotto = True
+    server.shutdown()
+    controlla("senza retry l'upload si interrompe al primo errore", interrotto)
+
+    # 2. Con quota e retry: seriale e in parallelo, e tanti fogli quanti --fogli con una chiamata per foglio
+    for workers in (1, args.workers):
+        stato = StatoFinto(guasto_ogni=args.guasto_ogni)
+        server = avvia_server(stato)
+        gc = client(server)
+        t0 = time.perf_counter()
+        batch = carica(gc.open_by_key(SPREADSHEET_ID), fogli, workers=workers)
+        tempo = time.perf_counter() - t0
+        server.shutdown()
+
+        st = gc.http_client.statistiche
+        print(f"\n  workers={workers}: {batch.chiamate} chiamate, {st['richieste']} richieste HTTP, "
+              f"{st['retry']} retry, {tempo:.2f}s (attesa quota {st['attesa_quota']:.2f}s)")
+        controlla("tutti i fogli scritti e identici", all(
+            stato.griglia(t) == [[v for v in r] for r in d] for t, d in fogli.items()
+        ) and set(stato.fogli) == set(fogli))
+        controlla("errori iniettati superati con retry", stato.guasti > 0 and st['retry'] >= stato.guasti,
+                  f"{stato.guasti} iniettati")
+        controlla("mai oltre la quota del server", stato.oltre_quota == 0, f"{stato.oltre_quota} rifiuti")
+        if workers > 1:
+            controlla("una values.batchUpdate per foglio", batch.chiamate == 1 + len(fogli))
+
+        if workers > 1:
+            # 3. Incrementale: una cella cambiata
+            fogli_mod = {t: [r[:] for r in d] for t, d in fogli.items()}
+            primo = next(iter(fogli_mod))
+            fogli_mod[primo][5][3] = -1.0
+            server = avvia_server(stato)
+            gc = client(server)
+            batch = carica(gc.open_by_key(SPREADSHEET_ID), fogli_mod, workers=workers, incrementale=True)
+            server.shutdown()
+            controlla("incrementale: una cella cambiata, una cella scritta", batch.celle == 1,
+                      f"{batch.celle} celle, {batch.chiamate} chiamate")
+            controlla("incrementale: contenuto aggiornato", stato.griglia(primo)[5][3] == -1.0)
+
+            # Riepilogo due volte: le celle distribuite non si confrontano
+            entita = ['ORTI', 'INTUR']
+            server = avvia_server(stato)
+            spreadsheet = client(server).open_by_key(SPREADSHEET_ID)
+            for giro in range(2):
+                batch = Batch(spreadsheet, incrementale=True)
+                create_summary_sheet(batch, entita)
+                batch.flush()
+                stato.distribuisci('Riepilogo', len(entita) + 2)
+            server.shutdown()
+            controlla("incrementale: Riepilogo invariato, nessuna cella scritta", batch.celle == 0,
+                      f"{batch.celle} celle")
+
+    # 4. batchUpdate non idempotente: un 503 non si ripete
+    print()
+    stato = StatoFinto(guasto_ogni=0)
+    stato.guasto_batch_update = 503
+    server = avvia_server(stato)
+    gc = client(server)
+    try:
+        carica(gc.open_by_key(SPREADSHEET_ID), dict(list(fogli.items())[:1]))
+        interrotto = False
+    except gspread.exceptions.APIError:
+        interrotto = True
+    server.shutdown()
+    controlla("un 503 sulla batchUpdate non si ripete", interrotto and stato.guasti == 1
+              and gc.http_client.statistiche['retry'] == 0, f"{stato.guasti} batchUpdate")
+
+    # 5. Client condiviso: token in cache su disco e metadati in memoria
+    stato = StatoFinto(guasto_ogni=0)
+    server = avvia_server(stato)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    chiave = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    with tempfile.TemporaryDirectory() as cartella:
+        credenziali = Path(cartella) / 'service_account.json'
+        credenziali.write_text(json.dumps({
+            'type': 'service_account', 'client_email': 'verifica@finto.iam.gserviceaccount.com',
+            'private_key': chiave, 'private_key_id': 'finto', 'token_uri': f'{base_url}/token',
+        }))
+        sheets_client.TOKEN_CACHE = Path(cartella) / 'sheets_token.json'
+        primo = sheets_client._credenziali(credenziali)
+        secondo = sheets_client._credenziali(credenziali)
+        controlla("token chiesto una volta, poi dalla cache su disco",
+                  stato.chiamate[('POST', '/token')] == 1 and secondo.token == primo.token == 'token-finto')
+
+        gc = gspread.Client(secondo, http_client=partial(
+            sheets_client.CacheHTTPClient, bucket=TokenBucket(1000, raffica=100), base_url=base_url))
+        spreadsheet = gc.open_by_key(SPREADSHEET_ID)
+        batch = Batch(spreadsheet)
+        for titolo in list(fogli)[:3]:
+            batch.foglio(titolo).update(fogli[titolo])
+        controlla("una lettura dei metadati per apertura e Batch", stato.chiamate[('GET', '')] == 1)
+        batch.flush()
+        for titolo in list(fogli)[:3]:
+            spreadsheet.worksheet(titolo)
+        Batch(spreadsheet).esiste(titolo)
+        controlla("dopo il flush una sola rilettura per tre worksheet() e un Batch",
+                  stato.chiamate[('GET', '')] == 2, f"{stato.chiamate[('GET', '')]} letture")
+        spreadsheet.worksheet(titolo).resize(rows=30)
+        spreadsheet.worksheet(titolo)
+        controlla("un batchUpdate di gspread invalida i metadati", stato.chiamate[('GET', '')] == 3)
+    server.shutdown()
+
+    print("=" * 70)
+    print("✅ Uploader OK" if ok else "❌ Verifica fallita")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()